@@ -0,0 +1,24 @@
+"""
+ASGI config for assessment project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+to be run by an ASGI server, e.g.:
+
+    uvicorn assessment.asgi:application
+
+Views still run on threads, see ``assessment.handlers``.
+"""
+
+import os
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+from assessment.handlers import ASGIHandler
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "assessment.settings")
+
+application = ASGIHandler(
+    get_wsgi_application(),
+    max_workers=getattr(settings, 'ASGI_MAX_WORKERS', 8),
+)
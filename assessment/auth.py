@@ -1,5 +1,107 @@
 # -*- coding: utf-8 -*-
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class TokenCache:
+
+    """
+    A bounded LRU cache of token key to ``(user, token)`` with a TTL, so that
+    an authenticated request doesn't need a database lookup.
+
+    Entries are dropped as soon as their token is changed or deleted, or their
+    user is changed or deleted, in this process. Other processes only notice
+    once the TTL runs out.
+    """
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            # {key: (expires, user, token)}, oldest first.
+            self._entries = OrderedDict()
+            # {user_id: {key: None}}
+            self._keys_by_user = {}
+
+    def get(self, key):
+        """
+        Returns:
+            tuple: (user, token) or ``None`` if the key isn't cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            if entry[0] <= time.monotonic():
+                self._drop(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def set(self, key, user, token):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+            self._entries[key] = (time.monotonic() + self.ttl, user, token)
+            self._keys_by_user.setdefault(user.pk, {})[key] = None
+
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_key(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._drop(key)
+
+    def _drop(self, key):
+        __, user, __ = self._entries.pop(key)
+        keys = self._keys_by_user[user.pk]
+        del keys[key]
+        if not keys:
+            del self._keys_by_user[user.pk]
+
+
+token_cache = TokenCache(
+    max_size=getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 60),
+)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    # pylint: disable=unused-argument
+    # A token's key can be changed, so drop anything cached for its user.
+    token_cache.invalidate_key(instance.key)
+    token_cache.invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_user(sender, instance, **kwargs):
+    # pylint: disable=unused-argument
+    # Covers users being deactivated as well as deleted.
+    token_cache.invalidate_user(instance.pk)
 
 
 class TokenAuthSupportQueryString(TokenAuthentication):
@@ -7,6 +109,8 @@ class TokenAuthSupportQueryString(TokenAuthentication):
     """
     Extend the TokenAuthentication class to support querystring authentication
     in the form of "http://www.example.com/?auth_token=<token_key>"
+
+    Successful lookups are kept in ``token_cache``.
     """
 
     def authenticate(self, request):
@@ -22,3 +126,13 @@ class TokenAuthSupportQueryString(TokenAuthentication):
 
         else:
             return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        # Failed lookups raise and are never cached.
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+An SQLite backend tuned for concurrent requests, used by the ``production``
+SQLite profile in ``assessment.settings``. On top of Django's backend it
+reads from the database settings:
+
+* ``PRAGMAS``: pairs of pragma names and values run on every new
+  connection, e.g. ``(('journal_mode', 'WAL'),)``.
+* ``IMMEDIATE_TRANSACTIONS``: start transactions with ``BEGIN IMMEDIATE``,
+  so a transaction takes the write lock up front. Otherwise two
+  transactions which read then write can deadlock, and one of them fails
+  at once whatever the busy timeout.
+* ``LOCKED_RETRIES``: how many times a statement run outside a transaction,
+  ``BEGIN`` included, is retried once the busy timeout (the ``timeout`` in
+  ``OPTIONS``) ran out on a locked database. Retries back off from
+  ``LOCKED_BACKOFF`` seconds.
+"""
+import random
+import time
+
+from django.db.backends.sqlite3 import base
+
+
+class LockRetryCursorWrapper(base.SQLiteCursorWrapper):
+
+    retries = 0
+    backoff = 0.01
+
+    def _retry(self, method, *args):
+        for attempt in range(self.retries + 1):
+            try:
+                return method(self, *args)
+            except base.Database.OperationalError as err:
+                # A statement in a transaction can't be retried on its own.
+                if (
+                        attempt == self.retries or
+                        self.connection.in_transaction or
+                        'database is locked' not in str(err)
+                ):
+                    raise
+            time.sleep(self.backoff * 2 ** attempt * random.uniform(1, 2))
+
+    def execute(self, query, params=None):
+        return self._retry(base.SQLiteCursorWrapper.execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self._retry(
+            base.SQLiteCursorWrapper.executemany, query, param_list,
+        )
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict.get('PRAGMAS', ()):
+            connection.execute('PRAGMA {} = {}'.format(name, value))
+        return connection
+
+    def create_cursor(self, *args, **kwargs):
+        # pylint: disable=unused-argument
+        cursor = self.connection.cursor(factory=LockRetryCursorWrapper)
+        cursor.retries = self.settings_dict.get('LOCKED_RETRIES', 0)
+        cursor.backoff = self.settings_dict.get(
+            'LOCKED_BACKOFF', LockRetryCursorWrapper.backoff
+        )
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        if self.settings_dict.get('IMMEDIATE_TRANSACTIONS'):
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Django 1.10 has no ASGI support of its own, ``ASGIHandler`` serves a WSGI
+application to an ASGI server instead.
+
+The request body is read and the response body written on the event loop,
+only running the view takes one of a bounded pool of threads. A client which
+is slow to send its request or to read its response doesn't hold a thread,
+so many of them can be served at once.
+"""
+import asyncio
+import io
+import itertools
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ASGIHandler:
+
+    """
+    An ASGI 3 application running ``wsgi_application`` on ``max_workers``
+    threads.
+
+    A streamed response, i.e. one with a true ``streaming`` attribute like
+    Django's ``StreamingHttpResponse``, is produced on its worker thread and
+    sent chunk by chunk, as its content may only exist while it is sent.
+    """
+
+    def __init__(self, wsgi_application, max_workers=8):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(max_workers)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+
+        if scope['type'] != 'http':
+            raise ValueError(
+                'Unsupported ASGI scope type: {}'.format(scope['type'])
+            )
+
+        body = await self.read_body(receive)
+        if body is None:
+            # The client went away before sending its whole request.
+            return
+
+        loop = asyncio.get_event_loop()
+        response = await loop.run_in_executor(
+            self.executor,
+            self.run_wsgi,
+            self.get_environ(scope, body),
+            loop,
+            send,
+        )
+        if response is None:
+            # Already sent from the worker thread.
+            return
+
+        start, chunks = response
+        await send(start)
+        for chunk in chunks:
+            await send({
+                'type': 'http.response.body',
+                'body': chunk,
+                'more_body': True,
+            })
+        await send({'type': 'http.response.body'})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def read_body(receive):
+        """
+        Returns:
+            bytes: The request body, or ``None`` if the client disconnected.
+        """
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    @staticmethod
+    def get_environ(scope, body):
+        """ Build the WSGI environ of an ASGI HTTP request. """
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+
+        script_name = scope.get('root_path', '')
+        path = scope['path']
+        if script_name and path.startswith(script_name):
+            path = path[len(script_name):]
+
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            # WSGI strings hold the raw bytes of the request.
+            'SCRIPT_NAME': script_name.encode('utf-8').decode('latin-1'),
+            'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'REMOTE_ADDR': client[0],
+            'SERVER_PROTOCOL': 'HTTP/{}'.format(
+                scope.get('http_version', '1.1')
+            ),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+
+        for name, value in scope.get('headers', ()):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = 'HTTP_' + name
+
+            value = value.decode('latin-1')
+            if name in environ:
+                value = environ[name] + ',' + value
+            environ[name] = value
+
+        return environ
+
+    def run_wsgi(self, environ, loop, send):
+        """ Call the WSGI application, on a worker thread.
+
+        Returns:
+            tuple: (dict, list) - The ``http.response.start`` message and the
+                chunks of the body, or ``None`` for a streamed response which
+                was sent from here.
+        """
+        start = {}
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info is not None and start:
+                raise exc_info[1].with_traceback(exc_info[2])
+
+            start.update({
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [
+                    (name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in headers
+                ],
+            })
+            return written.append
+
+        result = self.wsgi_application(environ, start_response)
+        try:
+            if not getattr(result, 'streaming', False):
+                return start, written + [chunk for chunk in result if chunk]
+
+            def send_from_thread(message):
+                asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+            send_from_thread(start)
+            for chunk in itertools.chain(written, result):
+                if chunk:
+                    send_from_thread({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            send_from_thread({'type': 'http.response.body'})
+            return None
+
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
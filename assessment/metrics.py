@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+In-process metrics, served in the Prometheus text format by ``metrics_view``:
+
+    REQUESTS = registry.counter(
+        'requests_total', 'Requests served.', ('method',),
+    )
+    REQUESTS.inc(('GET',))
+
+Every process keeps its own metrics, so each worker has to be scraped, and
+they start from zero when it restarts.
+"""
+import bisect
+import threading
+import time
+from collections import OrderedDict
+
+from django.http import HttpResponse
+
+
+# Upper bounds in seconds, from a memory lookup to a slow request.
+DEFAULT_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _escape(value):
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, _escape(value)) for name, value in pairs
+    ) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+
+    """
+    A metric with one value per combination of its labels. Label values are
+    passed as a tuple in the order of ``labelnames``.
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        """
+        Yields:
+            tuple: (str, str, float) - The name, formatted labels and value
+                of every sample.
+        """
+        raise NotImplementedError
+
+    def render(self):
+        lines = [
+            '# HELP {} {}'.format(self.name, self.documentation),
+            '# TYPE {} {}'.format(self.name, self.type),
+        ]
+        lines.extend(
+            '{}{} {}'.format(name, labels, _format_value(value))
+            for name, labels, value in self.samples()
+        )
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+
+    type = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Histogram(Metric):
+
+    """
+    Counts observations into buckets by their upper bound, along with their
+    sum and count.
+    """
+
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name,
+        documentation,
+        labelnames=(),
+        buckets=DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # Counts per bucket and past the last one, sum.
+                entry = self._values[labels] = [
+                    [0] * (len(self.buckets) + 1), 0.0,
+                ]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def time(self, labels=()):
+        """ Time a block of code, e.g. ``with histogram.time(('list',)):``.
+        """
+        return Timer(self, labels)
+
+    def count(self, labels=()):
+        entry = self._values.get(labels)
+        return sum(entry[0]) if entry else 0
+
+    def samples(self):
+        with self._lock:
+            values = sorted(
+                (labels, (list(counts), total))
+                for labels, (counts, total) in self._values.items()
+            )
+
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield (
+                    self.name + '_bucket',
+                    _format_labels(
+                        self.labelnames, labels,
+                        [('le', _format_value(float(bound)))],
+                    ),
+                    cumulative,
+                )
+            formatted = _format_labels(self.labelnames, labels)
+            yield self.name + '_sum', formatted, total
+            yield self.name + '_count', formatted, cumulative
+
+
+class Timer:
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, self.labels)
+
+
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.metrics = OrderedDict()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self.metrics:
+                raise ValueError(
+                    'Metric {} is already registered.'.format(metric.name)
+                )
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def clear(self):
+        """ Used during testing to reset every metric. """
+        for metric in self.metrics.values():
+            metric.clear()
+
+    def render(self):
+        """
+        Returns:
+            str: Every metric in the Prometheus text exposition format.
+        """
+        return ''.join(
+            metric.render() + '\n' for metric in self.metrics.values()
+        )
+
+
+registry = Registry()
+
+
+class Instrumented:
+
+    """
+    Stands in for ``target``, timing every call of its ``methods`` in
+    ``histogram``, labelled with the method name and ``labels``. Calls which
+    raise are also counted in ``errors``, labelled with the exception class.
+
+    The methods in ``iterators`` return an iterator, and are timed until it
+    is exhausted or closed.
+
+    Any other attribute is the target's own.
+    """
+
+    def __init__(
+        self,
+        target,
+        methods,
+        histogram,
+        errors,
+        labels=(),
+        iterators=(),
+    ):
+        self.target = target
+        self.methods = frozenset(methods).union(iterators)
+        self.iterators = frozenset(iterators)
+        self.histogram = histogram
+        self.errors = errors
+        self.labels = tuple(labels)
+
+    def _consume(self, iterator, start, labels):
+        try:
+            yield from iterator
+        except Exception as err:
+            self.errors.inc(labels + (type(err).__name__,))
+            raise
+        finally:
+            self.histogram.observe(time.perf_counter() - start, labels)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.target, name)
+        if name not in self.methods:
+            return attribute
+
+        labels = (name,) + self.labels
+        observe = self.histogram.observe
+        errors = self.errors
+        perf_counter = time.perf_counter
+
+        if name in self.iterators:
+            # Timed until the iterator is used up.
+            def timed(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    iterator = attribute(*args, **kwargs)
+                except Exception as err:
+                    errors.inc(labels + (type(err).__name__,))
+                    observe(perf_counter() - start, labels)
+                    raise
+                return self._consume(iterator, start, labels)
+        else:
+            def timed(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    return attribute(*args, **kwargs)
+                except Exception as err:
+                    errors.inc(labels + (type(err).__name__,))
+                    raise
+                finally:
+                    observe(perf_counter() - start, labels)
+
+        # Later lookups find the wrapper without coming back here.
+        setattr(self, name, timed)
+        return timed
+
+    def __repr__(self):
+        return 'Instrumented({!r})'.format(self.target)
+
+
+def metrics_view(request):  # pylint: disable=unused-argument
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4',
+    )
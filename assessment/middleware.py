@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Accounting of the SQL queries made while serving each request, checked
+against a budget per endpoint set in the ``QUERY_BUDGETS`` setting, e.g.:
+
+    QUERY_BUDGETS = {'ship-list': 3, 'POST ship-list': 4}
+
+Endpoints are named after their URL pattern, a budget for a method of an
+endpoint comes before one for the whole endpoint. A request over its budget is
+logged, or fails with ``QueryBudgetExceeded`` when ``QUERY_BUDGETS_ENFORCE``
+is set, as it is in the tests. Requests to other endpoints are only counted
+when ``DEBUG`` is on.
+"""
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+# Statements of ``transaction.atomic``, which aren't queries of their own.
+TRANSACTION_STATEMENTS = (
+    'BEGIN', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT',
+)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryStats:
+
+    """
+    The queries made on every database while serving a request.
+
+    Args:
+        queries (list): ``(alias, sql, seconds)`` of every query, in order.
+    """
+
+    def __init__(self, queries):
+        self.queries = queries
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def seconds(self):
+        return sum(seconds for __, __, seconds in self.queries)
+
+    @property
+    def duplicates(self):
+        """
+        Returns:
+            dict: How many times each statement made more than once was
+                made, the mark of an N+1.
+        """
+        counts = Counter((alias, sql) for alias, sql, __ in self.queries)
+        return {key: count for key, count in counts.items() if count > 1}
+
+    def describe(self):
+        return '\n'.join(
+            '{} ({:.1f} ms): {}'.format(alias, seconds * 1e3, sql)
+            for alias, sql, seconds in self.queries
+        )
+
+
+class QueryCapture:
+
+    """
+    Records every query made on every database connection of the current
+    thread between ``start`` and ``stop``, through Django's debug cursor.
+    Transaction statements are left out.
+    """
+
+    def start(self):
+        self.connections = list(connections.all())
+        self.forced = [
+            connection.force_debug_cursor for connection in self.connections
+        ]
+        for connection in self.connections:
+            # Django clears the log at the start of each request anyway
+            # when ``DEBUG`` is on.
+            connection.queries_log.clear()
+            connection.force_debug_cursor = True
+        return self
+
+    def stop(self):
+        """
+        Returns:
+            QueryStats: The queries made since ``start``.
+        """
+        queries = []
+        for connection, forced in zip(self.connections, self.forced):
+            connection.force_debug_cursor = forced
+            queries.extend(
+                (connection.alias, query['sql'], float(query['time']))
+                for query in connection.queries_log
+                if not query['sql'].startswith(TRANSACTION_STATEMENTS)
+            )
+        return QueryStats(queries)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stats = self.stop()
+
+
+class QueryAccountingMiddleware:
+
+    """
+    Counts and times the SQL queries of requests into
+    ``response.query_stats``, and checks them against the request's budget.
+
+    The debug cursor keeps a copy of every query, so only the requests to an
+    endpoint with a budget are counted, or every request when ``DEBUG`` is
+    on. Queries made by a streamed response while it is sent aren't counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        endpoint, budget = self.get_budget(request)
+        if budget is None and not settings.DEBUG:
+            return self.get_response(request)
+
+        capture = QueryCapture().start()
+        try:
+            response = self.get_response(request)
+        finally:
+            stats = capture.stop()
+
+        response.query_stats = stats
+        self.check_budget(request, endpoint, budget, stats)
+        return response
+
+    @staticmethod
+    def get_budget(request):
+        """ Look the budget of the request up before it is served, which
+        resolves its URL ahead of the handler.
+
+        Returns:
+            tuple: (str, int) - The endpoint and its budget, which is
+                ``None`` if it has none.
+        """
+        try:
+            match = resolve(
+                request.path_info, getattr(request, 'urlconf', None),
+            )
+        except Resolver404:
+            return None, None
+
+        budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        for endpoint in (
+                '{} {}'.format(request.method, match.url_name),
+                match.url_name,
+        ):
+            if endpoint in budgets:
+                return endpoint, budgets[endpoint]
+        return match.url_name, None
+
+    @staticmethod
+    def check_budget(request, endpoint, budget, stats):
+        if budget is None or stats.count <= budget:
+            return
+
+        message = (
+            '{method} {path} ({endpoint}) made {count} queries in {ms:.1f} '
+            'ms, over its budget of {budget}.'
+        ).format(
+            method=request.method,
+            path=request.path,
+            endpoint=endpoint,
+            count=stats.count,
+            ms=stats.seconds * 1e3,
+            budget=budget,
+        )
+        if getattr(settings, 'QUERY_BUDGETS_ENFORCE', False):
+            raise QueryBudgetExceeded(message + '\n' + stats.describe())
+
+        logger.warning(message, extra={'queries': stats.describe()})
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import copy
 import os
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -36,6 +37,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so that it sees the queries of every other middleware.
+    'assessment.middleware.QueryAccountingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,12 +72,78 @@ WSGI_APPLICATION = 'assessment.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/1.10/ref/settings/#databases
 
-DATABASES = {
+# Settings shared by every SQLite database, picked with the SQLITE_PROFILE
+# environment variable. ``production`` serves concurrent requests: the WAL
+# journal lets reads carry on during a write, connections are kept open by
+# each worker and writers queue for the lock rather than failing, see
+# ``assessment.backends.sqlite3``.
+SQLITE_PROFILES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
+    'production': {
+        'ENGINE': 'assessment.backends.sqlite3',
+        'CONN_MAX_AGE': None,
+        'OPTIONS': {'timeout': 5},
+        'PRAGMAS': (
+            ('journal_mode', 'WAL'),
+            # Durable up to the last checkpoint, which is safe with WAL.
+            ('synchronous', 'NORMAL'),
+            # In KiB when negative, i.e. 64 MiB.
+            ('cache_size', -65536),
+            ('mmap_size', 268435456),
+            ('temp_store', 'MEMORY'),
+        ),
+        'IMMEDIATE_TRANSACTIONS': True,
+        'LOCKED_RETRIES': 3,
+        'LOCKED_BACKOFF': 0.05,
+    },
+}
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'default')
+
+
+def sqlite_database(name, **kwargs):
+    database = copy.deepcopy(SQLITE_PROFILES[SQLITE_PROFILE])
+    database.update(kwargs)
+    database['NAME'] = os.path.join(BASE_DIR, name)
+    return database
+
+
+# Databases ``ship.storage.ShardedShipStorage`` spreads ships across by their
+# owner. There are none unless the SHIP_SHARDS environment variable says how
+# many, e.g. ``SHIP_SHARDS=2`` for ``ships_0`` and ``ships_1``. Each needs
+# migrating, e.g. ``./manage.py migrate --database ships_0``.
+SHIP_SHARDS = tuple(
+    'ships_{}'.format(index)
+    for index in range(int(os.environ.get('SHIP_SHARDS', 0)))
+)
+
+# Read replicas of ``default`` ``ship.storage.ReplicatedShipStorage`` reads
+# ships from, as many as the SHIP_REPLICAS environment variable says. Each is
+# a file copy of ``default``, kept up to date with a delay by
+# ``./manage.py replicate_ships``.
+SHIP_REPLICAS = tuple(
+    'replica_{}'.format(index)
+    for index in range(int(os.environ.get('SHIP_REPLICAS', 0)))
+)
+# A user's reads stay on ``default`` for this many seconds after they wrote a
+# ship, so that they see their own writes.
+SHIP_REPLICA_STICKY_SECONDS = 5
+
+DATABASES = {
+    'default': sqlite_database('db.sqlite3'),
 }
+for alias in SHIP_SHARDS:
+    DATABASES[alias] = sqlite_database(alias + '.sqlite3')
+for alias in SHIP_REPLICAS:
+    DATABASES[alias] = sqlite_database(
+        alias + '.sqlite3', TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = [
+    'ship.routers.ShipShardRouter',
+    'ship.routers.ShipReplicaRouter',
+]
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -86,6 +155,36 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
 }
 
+# Most SQL queries a request to each endpoint, by URL name, should make. Going
+# over is logged, or fails when enforced as in the tests. Endpoints backed by
+# ``ShipDjangoStorage`` cost a token lookup on top of their storage queries.
+QUERY_BUDGETS = {
+    # Reads check the version of the ships before retrieving them, see
+    # ``ship.conditional``. A ``304`` costs only the token and the version.
+    # Lists count the ships unless the page tells how many there are.
+    'ship-list': 4,
+    # Batches of ships are checked for duplicates and read back. Writes also
+    # count the ships of each user and status they add or move, see
+    # ``ShipStatusCount``: an update for each, and an insert for the first
+    # ship of a user in a status.
+    'POST ship-list': 6,
+    'ship-detail': 3,
+    'ship-bulk-update': 6,
+    'ship-bulk-delete': 6,
+    'ship-stats': 2,
+}
+QUERY_BUDGETS_ENFORCE = False
+
+# Authenticated tokens are cached in each process, see ``assessment.auth``.
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TTL = 60
+
+# Threads running blocking storage calls for ``ship.async_storage``.
+SHIP_STORAGE_MAX_WORKERS = 8
+
+# Threads running Django views for ``assessment.asgi``.
+ASGI_MAX_WORKERS = 8
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.10/ref/settings/#auth-password-validators
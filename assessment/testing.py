@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers for test cases.
+"""
+from contextlib import contextmanager
+
+from .middleware import QueryCapture
+
+
+class QueryBudgetMixin:
+
+    """
+    Mixin for test cases to check the SQL queries a block of code makes, on
+    every database, e.g.:
+
+        with self.assertQueryBudget(2) as capture:
+            storage.retrieve_ships(user_ids=[1])
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, budget, allow_duplicates=False):
+        capture = QueryCapture()
+        with capture:
+            yield capture
+
+        stats = capture.stats
+        self.assertLessEqual(
+            stats.count,
+            budget,
+            'Made {} queries, over the budget of {}:\n{}'.format(
+                stats.count, budget, stats.describe(),
+            ),
+        )
+        if not allow_duplicates:
+            self.assertFalse(
+                stats.duplicates,
+                'Made the same queries more than once:\n{}'.format(
+                    stats.describe()
+                ),
+            )
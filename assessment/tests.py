@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import OperationalError
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase, TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from assessment.asgi import application
+from assessment.auth import TokenAuthSupportQueryString, token_cache
+from assessment.handlers import ASGIHandler
+from assessment.metrics import Counter, Histogram, Instrumented, registry
+
+
+class TestTokenAuthSupportQueryString(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.auth = TokenAuthSupportQueryString()
+        self.user = User.objects.create_user('assessor')
+        self.token = Token.objects.create(user=self.user)
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def test_credentials_are_cached(self):
+        self.assertEqual(
+            self.auth.authenticate_credentials(self.token.key),
+            (self.user, self.token),
+        )
+
+        with self.assertNumQueries(0):
+            user, __ = self.auth.authenticate_credentials(self.token.key)
+
+        self.assertEqual(user, self.user)
+
+    def test_invalid_token_is_not_cached(self):
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials('not-a-token')
+
+        self.assertIsNone(token_cache.get('not-a-token'))
+
+    def test_deleted_token_is_invalidated(self):
+        self.auth.authenticate_credentials(self.token.key)
+        self.token.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_deactivated_user_is_invalidated(self):
+        self.auth.authenticate_credentials(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_lru_eviction(self):
+        other = Token.objects.create(
+            user=User.objects.create_user('user2')
+        )
+        token_cache.max_size = 1
+        try:
+            self.auth.authenticate_credentials(self.token.key)
+            self.auth.authenticate_credentials(other.key)
+        finally:
+            token_cache.max_size = 10000
+
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.assertIsNotNone(token_cache.get(other.key))
+
+
+def echo_application(environ, start_response):
+    body = environ['wsgi.input'].read()
+    start_response('201 Created', [('Content-Type', 'application/json')])
+    return [json.dumps({
+        'body': body.decode(),
+        'path': environ['PATH_INFO'],
+        'query': environ['QUERY_STRING'],
+        'content_type': environ.get('CONTENT_TYPE'),
+        'accept': environ.get('HTTP_ACCEPT'),
+    }).encode()]
+
+
+class StreamedResponse(list):
+
+    streaming = True
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestASGIHandler(SimpleTestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def request(self, handler, path='/', body=(b'',), headers=(), **scope):
+        """ Send a request to ``handler`` in ``body`` chunks.
+
+        Returns:
+            list: The messages sent back by the handler.
+        """
+        scope = dict(
+            {'type': 'http', 'method': 'GET'},
+            path=path, headers=list(headers), **scope
+        )
+        messages = [
+            {'type': 'http.request', 'body': chunk, 'more_body': True}
+            for chunk in body
+        ]
+        messages[-1]['more_body'] = False
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        self.loop.run_until_complete(handler(scope, receive, send))
+        return sent
+
+    def test_request(self):
+        sent = self.request(
+            ASGIHandler(echo_application, max_workers=1),
+            path='/ships/',
+            body=(b'{"name": ', b'"SHIP"}'),
+            headers=[
+                (b'content-type', b'application/json'),
+                (b'accept', b'application/json'),
+            ],
+            method='POST',
+            query_string=b'limit=2',
+        )
+
+        self.assertEqual(sent[0], {
+            'type': 'http.response.start',
+            'status': 201,
+            'headers': [(b'content-type', b'application/json')],
+        })
+        self.assertEqual(json.loads(sent[1]['body'].decode()), {
+            'body': '{"name": "SHIP"}',
+            'path': '/ships/',
+            'query': 'limit=2',
+            'content_type': 'application/json',
+            'accept': 'application/json',
+        })
+        self.assertEqual(sent[-1], {'type': 'http.response.body'})
+
+    def test_streamed_response(self):
+        response = StreamedResponse([b'one\n', b'', b'two\n'])
+
+        def application(environ, start_response):
+            start_response('200 OK', [])
+            return response
+
+        sent = self.request(ASGIHandler(application, max_workers=1))
+
+        self.assertEqual(
+            [message.get('body') for message in sent[1:]],
+            [b'one\n', b'two\n', None],
+        )
+        self.assertTrue(response.closed)
+
+    def test_disconnect_before_body(self):
+        def application(environ, start_response):
+            raise AssertionError('The application should not be called.')
+
+        handler = ASGIHandler(application, max_workers=1)
+        scope = {'type': 'http', 'method': 'POST', 'path': '/'}
+
+        async def receive():
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            raise AssertionError(message)
+
+        self.loop.run_until_complete(handler(scope, receive, send))
+
+    def test_slow_clients_do_not_hold_threads(self):
+        handler = ASGIHandler(echo_application, max_workers=1)
+        uploaded = asyncio.Event()
+        sent = []
+
+        async def slow_receive():
+            await uploaded.wait()
+            return {'type': 'http.request', 'body': b'slow'}
+
+        async def fast_receive():
+            return {'type': 'http.request', 'body': b'fast'}
+
+        async def send(message):
+            if message.get('body'):
+                sent.append(json.loads(message['body'].decode())['body'])
+
+        async def clients():
+            scope = {'type': 'http', 'method': 'POST', 'path': '/'}
+            slow = [
+                asyncio.ensure_future(handler(scope, slow_receive, send))
+                for __ in range(5)
+            ]
+            # Only one thread, yet the fast client isn't held up by the
+            # slow ones still uploading.
+            await asyncio.wait_for(handler(scope, fast_receive, send), 5)
+            uploaded.set()
+            await asyncio.gather(*slow)
+
+        self.loop.run_until_complete(clients())
+        self.assertEqual(sent, ['fast'] + ['slow'] * 5)
+
+    def test_lifespan(self):
+        handler = ASGIHandler(echo_application, max_workers=1)
+        messages = [
+            {'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'},
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        self.loop.run_until_complete(
+            handler({'type': 'lifespan'}, receive, send)
+        )
+        self.assertEqual(
+            sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+        )
+
+    def test_django_application(self):
+        sent = self.request(
+            application,
+            path='/api/v1/ships/',
+            headers=[(b'host', b'testserver')],
+        )
+
+        self.assertEqual(sent[0]['status'], 401)
+
+
+class TestProductionSQLiteBackend(SimpleTestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.data_dir, 'db.sqlite3')
+        self.addCleanup(shutil.rmtree, self.data_dir)
+
+        with sqlite3.connect(self.path) as connection:
+            connection.execute('CREATE TABLE ship (name TEXT)')
+
+    def connect(self, **kwargs):
+        database = dict(
+            settings.SQLITE_PROFILES['production'], NAME=self.path, **kwargs
+        )
+        connection = ConnectionHandler({'default': database})['default']
+        # Switching to WAL takes a lock of its own, so do it up front.
+        connection.ensure_connection()
+        self.addCleanup(connection.close)
+        return connection
+
+    def lock(self, seconds):
+        """ Hold the write lock from another connection for a while. """
+        other = sqlite3.connect(
+            self.path, isolation_level=None, check_same_thread=False,
+        )
+        other.execute('BEGIN IMMEDIATE')
+        timer = threading.Timer(seconds, other.rollback)
+        timer.start()
+        self.addCleanup(other.close)
+        self.addCleanup(timer.join)
+
+    def test_pragmas(self):
+        with self.connect().cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            # NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_transactions_take_the_write_lock(self):
+        connection = self.connect()
+        connection._start_transaction_under_autocommit()
+        self.addCleanup(connection.connection.rollback)
+
+        other = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        self.addCleanup(other.close)
+        with self.assertRaises(sqlite3.OperationalError):
+            other.execute('BEGIN IMMEDIATE')
+
+    def test_locked_writes_are_retried(self):
+        connection = self.connect(
+            OPTIONS={'timeout': 0.01}, LOCKED_RETRIES=5, LOCKED_BACKOFF=0.05,
+        )
+        self.lock(0.2)
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO ship VALUES ('GOODSHIP')")
+
+    def test_locked_writes_fail_without_retries(self):
+        connection = self.connect(OPTIONS={'timeout': 0.01}, LOCKED_RETRIES=0)
+        self.lock(0.2)
+        with self.assertRaises(OperationalError):
+            with connection.cursor() as cursor:
+                cursor.execute("INSERT INTO ship VALUES ('GOODSHIP')")
+
+
+class TestMetrics(SimpleTestCase):
+
+    def setUp(self):
+        self.histogram = Histogram(
+            'test_seconds', 'Test timings.', ('operation',), buckets=(0.1, 1),
+        )
+        self.errors = Counter(
+            'test_errors_total', 'Test errors.', ('operation', 'error'),
+        )
+
+    def test_render_histogram(self):
+        self.histogram.observe(0.05, ('read',))
+        self.histogram.observe(0.5, ('read',))
+        self.histogram.observe(5, ('read',))
+
+        self.assertEqual(self.histogram.render().splitlines(), [
+            '# HELP test_seconds Test timings.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{operation="read",le="0.1"} 1',
+            'test_seconds_bucket{operation="read",le="1.0"} 2',
+            'test_seconds_bucket{operation="read",le="+Inf"} 3',
+            'test_seconds_sum{operation="read"} 5.55',
+            'test_seconds_count{operation="read"} 3',
+        ])
+
+    def test_render_counter(self):
+        self.errors.inc(('write', 'Say "no"\n'))
+        self.errors.inc(('write', 'Say "no"\n'), amount=2)
+
+        self.assertEqual(
+            self.errors.render().splitlines()[-1],
+            'test_errors_total{operation="write",error="Say \\"no\\"\\n"} 3',
+        )
+
+    def test_instrumented(self):
+        target = {'ships': [1, 2]}
+        instrumented = Instrumented(
+            target, ['get', 'pop'], self.histogram, self.errors,
+            iterators=['values'],
+        )
+
+        self.assertEqual(instrumented.get('ships'), [1, 2])
+        with self.assertRaises(KeyError):
+            instrumented.pop('boats')
+        self.assertEqual(instrumented.copy(), target)
+
+        values = instrumented.values()
+        self.assertEqual(self.histogram.count(('values',)), 0)
+        self.assertEqual(list(values), [[1, 2]])
+
+        self.assertEqual(self.histogram.count(('get',)), 1)
+        self.assertEqual(self.histogram.count(('pop',)), 1)
+        self.assertEqual(self.histogram.count(('values',)), 1)
+        self.assertEqual(self.errors.value(('pop', 'KeyError')), 1)
+        self.assertEqual(self.histogram.count(('copy',)), 0)
+
+    def test_metrics_view(self):
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertEqual(response.content.decode(), registry.render())
+        self.assertIn(
+            '# TYPE ship_storage_duration_seconds histogram',
+            response.content.decode(),
+        )
@@ -3,6 +3,7 @@ from django.conf.urls import url, include
 from django.contrib import admin
 from rest_framework import routers
 
+from assessment.metrics import metrics_view
 from ship.api import ShipViewSet
 
 
@@ -12,4 +13,5 @@ router.register(r'ships', ShipViewSet, base_name='ship')
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
     url(r'^api/v1/', include(router.urls)),
+    url(r'^metrics$', metrics_view, name='metrics'),
 ]
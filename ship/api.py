@@ -1,15 +1,29 @@
 # -*- coding: utf-8 -*-
+import json
+
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, mixins, status
-from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.decorators import list_route
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 
 from assessment.auth import TokenAuthSupportQueryString
+from .conditional import ConditionalGetMixin
+from .exceptions import DuplicateError, UnknownFieldError
 from .injection_setup import logic
-from .serializers import ShipSerializer
+from .metrics import TimedViewMixin
+from .pagination import ShipPagination
+from .renderers import ShipJSONRenderer, prepare_ship
+from .serializers import (
+    ShipIdsSerializer, ShipQuerySerializer, ShipSerializer,
+)
 
 
 class ShipViewSet(
+    TimedViewMixin,
+    ConditionalGetMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
@@ -19,32 +33,161 @@ class ShipViewSet(
 
     authentication_classes = (TokenAuthSupportQueryString,)
     permission_classes = (IsAuthenticated,)
-    pagination_class = LimitOffsetPagination
+    renderer_classes = (ShipJSONRenderer, BrowsableAPIRenderer)
+    pagination_class = ShipPagination
     serializer_class = ShipSerializer
     default_limit = 20
 
-    def list(self, request):  # pylint: disable=unused-argument
-        ships = self.get_queryset()
+    # Number of ships written to a streamed response in one go.
+    stream_chunk_size = 100
 
-        page = self.paginate_queryset(ships)
-        return self.get_paginated_response(page)
+    duplicate_message = 'You already have a ship with this IMO number.'
+
+    def list(self, request):
+        query_kwargs = self.get_query_kwargs()
+
+        # Nothing is retrieved when the client's page is still current.
+        # Ships are only ever set to ``DELETED``, so ``status`` is the one
+        # filter a ship can leave.
+        validators = self.get_validators(
+            logic.get_version(
+                **{
+                    key: query_kwargs[key]
+                    for key in ('id', 'ids', 'user_ids', 'status')
+                }
+            ),
+            dated=not query_kwargs['status'],
+        )
+        not_modified = self.check_not_modified(*validators)
+        if not_modified is not None:
+            return not_modified
+
+        query_kwargs['fields'] = self.get_fields(query_kwargs['order_by'])
+
+        try:
+            if request.query_params.get('stream'):
+                return self.set_validators(
+                    self.stream(query_kwargs), *validators
+                )
+
+            if self.paginator.changes_query_param in request.query_params:
+                return self.set_validators(
+                    self.changes(query_kwargs), *validators
+                )
+
+            # Only the requested page is fetched from storage.
+            query_kwargs.update(
+                self.paginator.get_storage_kwargs(
+                    request, order_by=query_kwargs['order_by'],
+                )
+            )
+            ships, total_count = logic.get_ships(**query_kwargs)
+
+        except UnknownFieldError as err:
+            return Response(
+                {'fields': [str(err)]}, status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        with self.timed('pagination'):
+            page = self.paginator.paginate_ships(ships, total_count)
+            return self.set_validators(
+                self.get_paginated_response(page), *validators
+            )
+
+    def changes(self, query_kwargs):
+        """ List the user's ships written since the ``since`` cursor, ships
+        which were deleted included, for clients keeping a copy in sync. Only
+        the ``user_id`` and ``fields`` parameters apply.
+        """
+        ships, cursor = logic.get_ship_changes(
+            user_ids=query_kwargs['user_ids'],
+            fields=query_kwargs['fields'],
+            **self.paginator.get_changes_kwargs(self.request)
+        )
+        with self.timed('pagination'):
+            return self.paginator.get_changes_response(ships, cursor)
+
+    def stream(self, query_kwargs):
+        """ Stream every matching ship as newline delimited JSON.
+
+        Ships are read from storage and encoded as the response is consumed,
+        so neither the list of ships nor the response body is ever held in
+        memory as a whole.
+        """
+        ships = logic.stream_ships(**query_kwargs)
+
+        def lines():
+            chunk = []
+            for ship in ships:
+                chunk.append(json.dumps(
+                    prepare_ship(ship),
+                    cls=JSONEncoder,
+                    ensure_ascii=False,
+                    separators=(',', ':'),
+                ))
+                if len(chunk) == self.stream_chunk_size:
+                    yield '\n'.join(chunk) + '\n'
+                    chunk = []
+
+            if chunk:
+                yield '\n'.join(chunk) + '\n'
+
+        return StreamingHttpResponse(
+            lines(), content_type='application/x-ndjson',
+        )
+
+    def get_fields(self, order_by=None):
+        """ Read the fields to return from ``?fields=name,imo_number``.
+
+        The ``id`` and the ``order_by`` field are always returned, as pages
+        are built on them.
+
+        Returns:
+            list: The field names, or ``None`` for every field.
+        """
+        fields = [
+            field
+            for value in self.request.query_params.getlist('fields')
+            for field in value.split(',')
+            if field
+        ]
+        if not fields:
+            return None
+
+        return fields + ['id', (order_by or 'id').lstrip('-')]
+
+    def get_query_kwargs(self):
+        """ Read the ship query out of the query parameters.
+
+        Raises:
+            ValidationError: If a parameter is not valid, which is answered
+                with a 400.
+        """
+        query = ShipQuerySerializer(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
 
-    def get_queryset(self):
         user = self.request.user
-        user_ids = [user.id] + self.request.query_params.getlist('user_id')
+        user_ids = [user.id] + query.validated_data.get('user_id', [])
 
-        query_kwargs = {
+        return {
             'user_ids': user_ids,
             'id': self.request.query_params.get('id'),
             'ids': self.request.query_params.getlist('ids'),
             'status': self.request.query_params.get('status'),
-            'order_by': self.request.query_params.get('order_by'),
+            'search': self.request.query_params.get('search'),
+            'order_by': query.validated_data.get('order_by'),
         }
 
-        ships, __ = logic.get_ships(**query_kwargs)
+    def get_queryset(self):
+        ships, __ = logic.get_ships(
+            include_count=False, **self.get_query_kwargs()
+        )
         return ships
 
     def create(self, request):
+        if isinstance(self.request.data, list):
+            return self.create_many(request)
+
         data = self.request.data.copy()
 
         # We want to override the user ID to be the authenticated user.
@@ -52,7 +195,13 @@ class ShipViewSet(
 
         serializer = self.serializer_class(data=data)
         if serializer.is_valid():
-            serializer.save()
+            try:
+                serializer.save()
+            except DuplicateError:
+                return Response(
+                    {'imo_number': [self.duplicate_message]},
+                    status=status.HTTP_409_CONFLICT,
+                )
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         else:
@@ -61,12 +210,129 @@ class ShipViewSet(
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    def create_many(self, request):
+        """ Create a JSON list of ships in one batch.
+
+        The response holds an outcome for every ship, in the same order as
+        the request: the created ship or why it could not be created.
+        """
+        # We want to override the user ID to be the authenticated user. Rows
+        # which aren't objects are left for the serializer to reject.
+        data = [
+            dict(ship, user_id=self.request.user.id)
+            if isinstance(ship, dict) else ship
+            for ship in self.request.data
+        ]
+
+        serializer = self.serializer_class(data=data, many=True)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = []
+        for result in serializer.save():
+            if isinstance(result, DuplicateError):
+                results.append({
+                    'status': status.HTTP_409_CONFLICT,
+                    'errors': {'imo_number': [self.duplicate_message]},
+                })
+            else:
+                results.append({
+                    'status': status.HTTP_201_CREATED,
+                    'ship': result,
+                })
+
+        return Response(results, status=status.HTTP_207_MULTI_STATUS)
+
+    @list_route(methods=['post'])
+    def bulk_update(self, request):
+        """ Apply the same changes to many of the user's ships.
+
+        Expects ``{"ids": [...], "changes": {...}}``, where the changes are
+        validated as a partial ship.
+        """
+        ids = ShipIdsSerializer(data=request.data)
+        # A body which isn't an object is rejected by ``ids``.
+        changes = self.serializer_class(
+            data=(
+                request.data.get('changes', {})
+                if isinstance(request.data, dict) else {}
+            ),
+            partial=True,
+        )
+        ids_valid, changes_valid = ids.is_valid(), changes.is_valid()
+        if not (ids_valid and changes_valid):
+            errors = dict(ids.errors)
+            if changes.errors:
+                errors['changes'] = changes.errors
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            updated = logic.update_ships(
+                ids.validated_data['ids'],
+                user_ids=[request.user.id],
+                **changes.validated_data
+            )
+        except DuplicateError:
+            return Response(
+                {'changes': {'imo_number': [self.duplicate_message]}},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        return Response({'updated': updated})
+
+    @list_route(methods=['post'])
+    def bulk_delete(self, request):
+        """ Set the status of many of the user's ships to ``DELETED``.
+
+        Expects ``{"ids": [...]}``.
+        """
+        ids = ShipIdsSerializer(data=request.data)
+        if not ids.is_valid():
+            return Response(ids.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        deleted = logic.delete_ships(
+            ids.validated_data['ids'], user_ids=[request.user.id],
+        )
+        return Response({'deleted': deleted})
+
+    @list_route(methods=['get'])
+    def stats(self, request):
+        """ Count the user's ships by status, and those of the users of any
+        ``user_id`` parameters. The counts are kept up to date by the writes,
+        no ship is counted here.
+        """
+        user_ids = self.get_query_kwargs()['user_ids']
+        fleet_stats = logic.get_fleet_stats(user_ids=user_ids)
+
+        results = []
+        for user_id in user_ids:
+            statuses = fleet_stats.get(user_id, {})
+            results.append({
+                'user_id': user_id,
+                'total': sum(statuses.values()),
+                'statuses': statuses,
+            })
+        return Response({'results': results})
+
     def retrieve(self, request, pk=None):
+        validators = self.get_validators(
+            logic.get_version(id=pk, user_ids=[request.user.id])
+        )
+        not_modified = self.check_not_modified(*validators)
+        if not_modified is not None:
+            return not_modified
+
         ships, __ = logic.get_ships(
             id=pk,
             user_ids=[request.user.id],
+            include_count=False,
+        )
+        return self.set_validators(
+            Response(self.serializer_class(ships[0]).data), *validators
         )
-        return Response(self.serializer_class(ships[0]).data)
 
     def update(self, request, pk=None):
         raise NotImplementedError(
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=redefined-builtin
+"""
+Async variants of the storages, for use with ``AsyncShipLogic``.
+
+An async storage wraps one of the storages in ``ship.storage`` and offers the
+same methods as coroutines:
+
+    storage = AsyncShipDjangoStorage(ShipDjangoStorage())
+    ships, total_count = await storage.retrieve_ships(user_ids=[1])
+
+``stream_ships`` is the exception, it returns an async iterator:
+
+    async for ship in storage.stream_ships(user_ids=[1]):
+        ...
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .storage import (
+    NULLABLE_FIELDS,
+    ShipDjangoStorage,
+    ShipPureMemoryStorage,
+    select_fields,
+    select_order,
+)
+
+
+class AsyncShipStream:
+
+    """
+    Async iterator over the ships matching a ``stream_ships`` call, read from
+    an async storage one keyset page of ``chunk_size`` ships at a time.
+    """
+
+    def __init__(
+        self,
+        storage,
+        chunk_size,
+        order_by=None,
+        fields=None,
+        **filters
+    ):
+        self.storage = storage
+        self.chunk_size = chunk_size
+        self.order_by = order_by or 'id'
+        self.field, __ = select_order(self.order_by)
+        self.filters = filters
+
+        # Pages are chained on the ordering field and ID of their last ship,
+        # so those are read even when they weren't asked for. A field which
+        # may be null can't make a cursor, those pages follow on by offset.
+        self.fields = select_fields(fields)
+        self.extra_fields = ()
+        if self.fields is not None:
+            self.extra_fields = tuple(
+                {'id', self.field}.difference(self.fields)
+            )
+            self.fields += self.extra_fields
+
+        self.cursor = None
+        self.offset = 0 if self.field in NULLABLE_FIELDS else None
+        self.page = []
+        self.done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.page and not self.done:
+            await self.fetch_page()
+
+        if not self.page:
+            raise StopAsyncIteration
+
+        ship = self.page.pop()
+        for field in self.extra_fields:
+            del ship[field]
+        return ship
+
+    async def fetch_page(self):
+        page, __ = await self.storage.retrieve_ships(
+            order_by=self.order_by,
+            limit=self.chunk_size,
+            offset=self.offset,
+            cursor=self.cursor,
+            fields=self.fields,
+            **self.filters
+        )
+
+        self.done = len(page) < self.chunk_size
+        if self.offset is not None:
+            self.offset += len(page)
+        elif page:
+            last = page[-1]
+            self.cursor = (last[self.field], last['id'])
+
+        # Ships are popped off the end.
+        page.reverse()
+        self.page = page
+
+
+class AsyncShipStorage:
+
+    """
+    Runs the methods of a blocking storage on a bounded pool of threads, so
+    the event loop carries on while they wait on the database.
+
+    Args:
+        storage (`obj`): The storage to wrap.
+        max_workers (`obj`:int, optional): The number of threads, and so the
+            number of storage calls which can run at once. Defaults to the
+            ``SHIP_STORAGE_MAX_WORKERS`` setting.
+    """
+
+    # Number of ships read from the storage at a time by ``stream_ships``.
+    stream_chunk_size = 500
+
+    def __init__(self, storage, max_workers=None):
+        self.storage = storage
+        self.executor = ThreadPoolExecutor(
+            max_workers or getattr(settings, 'SHIP_STORAGE_MAX_WORKERS', 8)
+        )
+
+    @staticmethod
+    def _run(method, args, kwargs):
+        # Pool threads outlive any request, so they look after their own
+        # database connections the way Django does around a request.
+        close_old_connections()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    async def _call(self, method, *args, **kwargs):
+        return await asyncio.get_event_loop().run_in_executor(
+            self.executor,
+            functools.partial(self._run, method, args, kwargs),
+        )
+
+    async def wipe(self):
+        return await self._call(self.storage.wipe)
+
+    async def persist_ship(self, **kwargs):
+        return await self._call(self.storage.persist_ship, **kwargs)
+
+    async def persist_ships(self, ships):
+        return await self._call(self.storage.persist_ships, ships)
+
+    async def retrieve_ships(self, **kwargs):
+        return await self._call(self.storage.retrieve_ships, **kwargs)
+
+    async def retrieve_version(self, **kwargs):
+        return await self._call(self.storage.retrieve_version, **kwargs)
+
+    async def retrieve_changes(self, **kwargs):
+        return await self._call(self.storage.retrieve_changes, **kwargs)
+
+    async def retrieve_fleet_stats(self, **kwargs):
+        return await self._call(self.storage.retrieve_fleet_stats, **kwargs)
+
+    def stream_ships(self, **kwargs):
+        """ Stream ships as for the ``stream_ships`` of the wrapped storage.
+
+        Unlike a blocking stream the ships are read in pages, each of them
+        a separate storage call, so no thread is held while the stream is
+        consumed. Ships written while streaming may or may not be seen.
+
+        Returns:
+            AsyncShipStream: An async iterator of serialized ships.
+        """
+        return AsyncShipStream(self, self.stream_chunk_size, **kwargs)
+
+    async def update_ship(self, id, **kwargs):
+        return await self._call(self.storage.update_ship, id, **kwargs)
+
+    async def update_ships(self, ids, user_ids=None, **kwargs):
+        return await self._call(
+            self.storage.update_ships, ids, user_ids=user_ids, **kwargs
+        )
+
+    async def delete_ship(self, id):
+        return await self._call(self.storage.delete_ship, id)
+
+    async def delete_ships(self, ids, user_ids=None):
+        return await self._call(
+            self.storage.delete_ships, ids, user_ids=user_ids,
+        )
+
+    def close(self):
+        """ Wait for running calls and stop the threads. """
+        self.executor.shutdown()
+
+
+class AsyncShipDjangoStorage(AsyncShipStorage):
+
+    """
+    ``ShipDjangoStorage`` run on a bounded pool of threads, see
+    ``AsyncShipStorage``.
+    """
+
+    def __init__(self, storage=None, max_workers=None):
+        super().__init__(storage or ShipDjangoStorage(), max_workers)
+
+
+class AsyncShipMemoryStream:
+
+    """
+    Async iterator over a blocking ``stream_ships`` generator of the memory
+    storage, which hands control back to the event loop every ``chunk_size``
+    ships so that a long stream doesn't starve other tasks.
+    """
+
+    def __init__(self, ships, chunk_size):
+        self.ships = ships
+        self.chunk_size = chunk_size
+        self.count = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        self.count += 1
+        if self.count % self.chunk_size == 0:
+            await asyncio.sleep(0)
+
+        try:
+            return next(self.ships)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class AsyncShipPureMemoryStorage(AsyncShipStorage):
+
+    """
+    ``ShipPureMemoryStorage`` is natively async: none of its calls wait on
+    anything but its own lock, which is only held for in-memory work, so they
+    run straight on the event loop rather than on a thread.
+
+    A journal with ``fsync`` turned on does wait on the disk, wrap such a
+    storage in an ``AsyncShipStorage`` instead.
+    """
+
+    def __init__(self, storage=None):
+        # pylint: disable=super-init-not-called
+        self.storage = storage or ShipPureMemoryStorage()
+
+    async def _call(self, method, *args, **kwargs):
+        return method(*args, **kwargs)
+
+    def stream_ships(self, **kwargs):
+        return AsyncShipMemoryStream(
+            self.storage.stream_ships(**kwargs), self.stream_chunk_size,
+        )
+
+    def close(self):
+        pass
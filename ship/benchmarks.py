@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+"""
+The performance counterpart of ``ShipStorageInterface``: the same storage
+operations timed against every storage at a range of fleet sizes, e.g.:
+
+    benchmark = StorageBenchmark(repeat=200)
+    results = benchmark.run({'memory': ShipPureMemoryStorage}, [1000])
+    regressions = compare(results, load_results('baseline.json'))
+
+``./manage.py benchmark_storages`` runs it from the command line.
+"""
+import copy
+import json
+import platform
+import random
+import time
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+
+from .storage import (
+    COUNT_CACHED,
+    CachedShipStorage,
+    ReplicatedShipStorage,
+    ShardedShipStorage,
+    ShipDjangoStorage,
+    ShipPureMemoryStorage,
+)
+
+
+def add_sqlite_database(alias, path, profile=None):
+    """ Add an SQLite database at ``path`` with the settings of one of the
+    ``SQLITE_PROFILES``, and create the ship tables in it.
+
+    Returns:
+        str: The alias of the database.
+    """
+    database = copy.deepcopy(
+        settings.SQLITE_PROFILES[profile or settings.SQLITE_PROFILE]
+    )
+    database['NAME'] = path
+    connections.databases[alias] = database
+    call_command('migrate', 'ship', database=alias, verbosity=0)
+    return alias
+
+
+def add_sqlite_replica(alias, primary):
+    """ Add a read replica of the SQLite database ``primary``. On a single
+    machine it is the same file, read through connections of its own.
+
+    Returns:
+        str: The alias of the replica.
+    """
+    connections.databases[alias] = copy.deepcopy(
+        connections.databases[primary]
+    )
+    return alias
+
+
+def django_storages(alias, shards=(), replicas=()):
+    """
+    Args:
+        alias (str): The database of the Django storages, and the primary
+            of ``django_replicated``.
+        shards (`obj`:tuple, optional): The databases of
+            ``django_sharded``, which runs with them as the ``SHIP_SHARDS``
+            setting.
+        replicas (`obj`:tuple, optional): The replicas of ``alias``
+            ``django_replicated`` reads from, which runs with them as the
+            ``SHIP_REPLICAS`` setting.
+
+    Returns:
+        dict: Functions making the Django storages on ``alias`` by name.
+    """
+    storages = {
+        'django': lambda: ShipDjangoStorage(using=alias),
+        'django_cached': lambda: CachedShipStorage(
+            ShipDjangoStorage(using=alias)
+        ),
+    }
+    if shards:
+        storages['django_sharded'] = ShardedShipStorage
+    if replicas:
+        storages['django_replicated'] = lambda: ReplicatedShipStorage(
+            using=alias,
+        )
+    return storages
+
+
+MEMORY_STORAGES = {
+    'memory': ShipPureMemoryStorage,
+    'memory_cached': lambda: CachedShipStorage(ShipPureMemoryStorage()),
+}
+
+
+def memory_storages(data_dir):
+    """
+    Args:
+        data_dir (str): The directory ``memory_durable`` logs its writes to.
+
+    Returns:
+        dict: Functions making the memory storages by name.
+    """
+    return dict(
+        MEMORY_STORAGES,
+        memory_durable=lambda: ShipPureMemoryStorage(data_dir=data_dir),
+    )
+
+
+class StorageBenchmark:
+
+    """
+    Times every operation in ``operations`` ``repeat`` times against a
+    storage holding a fleet of ``size`` ships, one call at a time.
+
+    Args:
+        repeat (`obj`:int, optional): Number of timed calls per operation.
+        ships_per_user (`obj`:int, optional): Every user owns this many
+            ships, so a single user's fleet stays the same size as the whole
+            fleet grows. As many as the fleet's size gives a single user
+            owning every ship.
+        seed (`obj`:int, optional): Seed of the random users and ships the
+            operations pick.
+    """
+
+    operations = (
+        'persist_ship',
+        'retrieve_ships_by_user',
+        'retrieve_ships_by_status',
+        'retrieve_ships_by_status_uncounted',
+        'retrieve_ships_by_status_cached',
+        'search_ships',
+        'search_ships_by_user',
+        'search_ships_by_user_number',
+        'update_ship',
+        'delete_ship',
+    )
+
+    batch_size = 1000
+
+    def __init__(self, repeat=200, ships_per_user=20, seed=0):
+        self.repeat = repeat
+        self.ships_per_user = ships_per_user
+        self.seed = seed
+
+    def populate(self, storage, size):
+        """
+        Returns:
+            list: The IDs of the ships stored.
+        """
+        ids = []
+        for start in range(0, size, self.batch_size):
+            ships = storage.persist_ships([
+                {
+                    'name': 'SHIP {index}'.format(index=index),
+                    'imo_number': '{index:07d}'.format(index=index),
+                    'user_id': index // self.ships_per_user,
+                }
+                for index in range(start, min(start + self.batch_size, size))
+            ])
+            ids.extend(ship['id'] for ship in ships)
+        return ids
+
+    def calls(self, storage, operation, size, ids, rng):
+        """ Build the calls to time for one operation.
+
+        Returns:
+            list: ``repeat`` functions taking no arguments.
+        """
+        users = max(size // self.ships_per_user, 1)
+
+        if operation == 'persist_ship':
+            return [
+                lambda index=index: storage.persist_ship(
+                    name='NEW SHIP',
+                    # Clear of the populated IMO numbers.
+                    imo_number='N{index:06d}'.format(index=index),
+                    user_id=rng.randrange(users),
+                )
+                for index in range(self.repeat)
+            ]
+
+        if operation == 'retrieve_ships_by_user':
+            return [
+                lambda user_id=rng.randrange(users): storage.retrieve_ships(
+                    user_ids=[user_id], order_by='-created', limit=20,
+                )
+                for __ in range(self.repeat)
+            ]
+
+        if operation.startswith('retrieve_ships_by_status'):
+            # Counting every ship of a status costs the most.
+            include_count = {
+                'retrieve_ships_by_status': True,
+                'retrieve_ships_by_status_uncounted': False,
+                'retrieve_ships_by_status_cached': COUNT_CACHED,
+            }[operation]
+            return [
+                lambda offset=rng.randrange(100): storage.retrieve_ships(
+                    status='ACTIVE', order_by='-modified', limit=20,
+                    offset=offset, include_count=include_count,
+                )
+                for __ in range(self.repeat)
+            ]
+
+        if operation == 'search_ships':
+            # Operators search the whole fleet, e.g. for part of a number.
+            return [
+                lambda search='{:04d}'.format(rng.randrange(10000)): (
+                    storage.retrieve_ships(search=search, limit=20)
+                )
+                for __ in range(self.repeat)
+            ]
+
+        if operation == 'search_ships_by_user':
+            return [
+                lambda user_id=rng.randrange(users): storage.retrieve_ships(
+                    user_ids=[user_id], search='ship 1', limit=20,
+                )
+                for __ in range(self.repeat)
+            ]
+
+        if operation == 'search_ships_by_user_number':
+            # A user looking up one of their own ships, which an index
+            # finds in a large fleet without scanning it.
+            return [
+                lambda index=rng.randrange(size): storage.retrieve_ships(
+                    user_ids=[index // self.ships_per_user],
+                    search='{:07d}'.format(index), limit=20,
+                )
+                for __ in range(self.repeat)
+            ]
+
+        if operation == 'update_ship':
+            return [
+                lambda id=rng.choice(ids): storage.update_ship(
+                    id, notes='Updated',
+                )
+                for __ in range(self.repeat)
+            ]
+
+        if operation == 'delete_ship':
+            # Every ship is deleted once, so each call does the same work.
+            return [
+                lambda id=id: storage.delete_ship(id)
+                for id in rng.sample(ids, min(self.repeat, len(ids)))
+            ]
+
+        raise ValueError('Unknown operation: {}'.format(operation))
+
+    @staticmethod
+    def summarize(timings):
+        timings = sorted(timings)
+        total = sum(timings)
+        return {
+            'samples': len(timings),
+            'ops_per_sec': len(timings) / total if total else None,
+            'p50_ms': timings[(len(timings) - 1) // 2] * 1e3,
+            'p99_ms': timings[int((len(timings) - 1) * 0.99)] * 1e3,
+        }
+
+    def measure(self, storage, size):
+        """ Time every operation against ``storage`` with ``size`` ships.
+
+        Returns:
+            dict: Timing summaries by operation.
+        """
+        storage.wipe()
+        ids = self.populate(storage, size)
+        rng = random.Random(self.seed)
+
+        summaries = {}
+        for operation in self.operations:
+            timings = []
+            for call in self.calls(storage, operation, size, ids, rng):
+                start = time.perf_counter()
+                call()
+                timings.append(time.perf_counter() - start)
+            summaries[operation] = self.summarize(timings)
+
+        storage.wipe()
+        return summaries
+
+    def run(self, storages, sizes, progress=None):
+        """ Time every storage at every fleet size.
+
+        Args:
+            storages (dict): Functions making each storage by name.
+            sizes (list): Fleet sizes.
+            progress (`obj`:callable, optional): Called with every result as
+                it is made.
+
+        Returns:
+            dict: The results, ready to be dumped as JSON.
+        """
+        results = []
+        for name, make_storage in storages.items():
+            storage = make_storage()
+            for size in sizes:
+                for operation, summary in self.measure(storage, size).items():
+                    result = dict(
+                        summary, storage=name, size=size, operation=operation,
+                    )
+                    results.append(result)
+                    if progress is not None:
+                        progress(result)
+
+            # Durable storages hold on to the files of their journal.
+            close = getattr(storage, 'close', None)
+            if close is not None:
+                close()
+
+        return {
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'machine': platform.machine(),
+                'sqlite_profile': getattr(settings, 'SQLITE_PROFILE', None),
+            },
+            'repeat': self.repeat,
+            'results': results,
+        }
+
+
+def load_results(path):
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def dump_results(results, path):
+    with open(path, 'w') as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True)
+
+
+def compare(results, baseline, tolerance=0.2, metric='p50_ms'):
+    """ Compare results with a baseline run.
+
+    Args:
+        results (dict): As returned by ``StorageBenchmark.run``.
+        baseline (dict): Likewise, from an earlier run.
+        tolerance (`obj`:float, optional): How much slower than the baseline
+            a result may be, as a fraction of the baseline.
+        metric (`obj`:str, optional): The latency compared.
+
+    Returns:
+        list: A dict for every storage, size and operation in both runs,
+            with ``baseline``, ``current``, their ``ratio`` and whether it is
+            a ``regression``.
+    """
+    baseline_results = {
+        (result['storage'], result['size'], result['operation']): result
+        for result in baseline['results']
+    }
+
+    comparisons = []
+    for result in results['results']:
+        key = (result['storage'], result['size'], result['operation'])
+        if key not in baseline_results:
+            continue
+
+        before = baseline_results[key][metric]
+        after = result[metric]
+        ratio = after / before if before else float('inf')
+        comparisons.append({
+            'storage': key[0],
+            'size': key[1],
+            'operation': key[2],
+            'baseline': before,
+            'current': after,
+            'ratio': ratio,
+            'regression': ratio > 1 + tolerance,
+        })
+
+    return comparisons
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Conditional GETs for ship views. Responses carry an ``ETag`` and a
+``Last-Modified`` header made from the validators of the storage, see
+``ShipLogic.get_version``, and a request which already holds the current
+representation is answered with an empty ``304 Not Modified``:
+
+    GET /api/v1/ships/?limit=20
+    If-None-Match: W/"9c3e..."
+
+The validators are cheap to get, so the ships are neither retrieved nor
+serialized when nothing changed.
+"""
+import calendar
+import hashlib
+
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def parse_etags(header):
+    """ Split an ``If-None-Match`` header in to its entity tags.
+
+    Returns:
+        list: The entity tags, without their quotes nor weakness marker.
+    """
+    etags = []
+    for etag in header.split(','):
+        etag = etag.strip()
+        if etag.startswith('W/'):
+            etag = etag[2:]
+        etags.append(etag.strip('"'))
+    return etags
+
+
+class ConditionalGetMixin:
+
+    """
+    Answers the conditional requests of a view's actions. An action gets the
+    validators of what it is about to return, checks the request against
+    them and only builds the response when needed:
+
+        validators = self.get_validators(logic.get_version(id=pk))
+        not_modified = self.check_not_modified(*validators)
+        if not_modified is not None:
+            return not_modified
+        ...
+        return self.set_validators(response, *validators)
+
+    The ``ETag`` depends on the storage version and on everything else the
+    response is made of: the full URL, the accepted media type and the user.
+    Entity tags are weak, as the same representation may not be byte for
+    byte identical.
+    """
+
+    def get_validators(self, version, dated=True):
+        """
+        Args:
+            version (tuple): (str, datetime) - As returned by
+                ``ShipLogic.get_version``.
+            dated (`obj`:bool, optional): Whether the last modification of
+                the ships dates the response. It doesn't when a filter can
+                drop ships: a ship leaving a ``status`` filter isn't among
+                those whose latest ``modified`` is returned any more, and
+                ``If-Modified-Since`` would be answered with a stale ``304``.
+                Only the ``ETag`` is then used.
+
+        Returns:
+            tuple: (str, int) - The entity tag, the timestamp of the last
+                modification or ``None``.
+        """
+        version, last_modified = version
+        if not dated:
+            last_modified = None
+        accepted_renderer = getattr(self.request, 'accepted_renderer', None)
+
+        etag = hashlib.sha1('\n'.join((
+            version,
+            self.request.get_full_path(),
+            getattr(accepted_renderer, 'media_type', ''),
+            str(self.request.user.pk),
+        )).encode()).hexdigest()
+
+        if last_modified is not None:
+            last_modified = calendar.timegm(last_modified.utctimetuple())
+
+        return etag, last_modified
+
+    def check_not_modified(self, etag, last_modified):
+        """ Check the preconditions of the request.
+
+        ``If-None-Match`` wins over ``If-Modified-Since``, which only has a
+        resolution of a second.
+
+        Returns:
+            Response: A ``304`` response if the client's representation is
+                current, ``None`` otherwise.
+        """
+        if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            etags = parse_etags(if_none_match)
+            current = '*' in etags or etag in etags
+        else:
+            if_modified_since = parse_http_date_safe(
+                self.request.META.get('HTTP_IF_MODIFIED_SINCE', '')
+            )
+            current = (
+                if_modified_since is not None and
+                last_modified is not None and
+                last_modified <= if_modified_since
+            )
+
+        if not current:
+            return None
+
+        return self.set_validators(
+            Response(status=status.HTTP_304_NOT_MODIFIED),
+            etag,
+            last_modified,
+        )
+
+    @staticmethod
+    def set_validators(response, etag, last_modified):
+        response['ETag'] = 'W/"{}"'.format(etag)
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
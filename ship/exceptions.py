@@ -5,3 +5,7 @@ class NotFoundException(Exception):
 
 class DuplicateError(Exception):
     pass
+
+
+class UnknownFieldError(ValueError):
+    pass
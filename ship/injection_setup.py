@@ -1,7 +1,13 @@
 # -*- coding: utf-8 -*-
 # pylint: disable=unused-import
 from .logic import ShipLogic
-from .storage import ShipDjangoStorage, ShipPureMemoryStorage
+from .metrics import instrument_logic, instrument_storage
+from .storage import (
+    CachedShipStorage,
+    GroupCommitShipStorage,
+    ShipDjangoStorage,
+    ShipPureMemoryStorage,
+)
 
 
 storage = ShipPureMemoryStorage()
@@ -10,4 +16,16 @@ storage = ShipPureMemoryStorage()
 # django ORM.
 # storage = ShipDjangoStorage()
 
-logic = ShipLogic(storage=storage)
+# Passing a directory keeps the in-memory storage across restarts.
+# storage = ShipPureMemoryStorage(data_dir='/var/lib/ships')
+
+# Any storage can be wrapped in a read-through cache of ``retrieve_ships``.
+# storage = CachedShipStorage(ShipDjangoStorage(), ttl=5)
+
+# Concurrent writes to the Django storage can share their commits.
+# storage = GroupCommitShipStorage(ShipDjangoStorage(), max_delay=0.002)
+
+# Every storage and logic call is timed, see ``ship.metrics``.
+storage = instrument_storage(storage)
+
+logic = instrument_logic(ShipLogic(storage=storage))
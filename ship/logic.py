@@ -5,10 +5,19 @@ Logic classes allow us to write pure Python with interchangeable backends or
 "storages". Typically, a logic class would have more complex things in it
 besides this very basic CRUD implmentation.
 """
+from datetime import timedelta
+
+from django.utils import timezone
 
 
 class ShipLogic:
 
+    # Writes can become visible out of ``modified`` order, by transactions
+    # committing late or by read replicas lagging behind. The cursor of the
+    # change feed is kept this far behind, and the ships written since are
+    # sent again by the next call.
+    changes_settle_time = timedelta(seconds=5)
+
     def __init__(self, storage):
         self.storage = storage
 
@@ -42,13 +51,44 @@ class ShipLogic:
             status=status,
         )
 
+    def create_ships(self, ships):
+        """ Create a batch of ship objects.
+
+        Args:
+            ships (list): Dicts holding the keyword arguments of
+                ``create_ship`` for each ship.
+
+        Returns:
+            list: One entry per ship, in the same order. Either the serialized
+                ship object which is now in the storage or the
+                ``DuplicateError`` raised for it.
+        """
+        return self.storage.persist_ships(
+            [
+                {
+                    'name': ship['name'],
+                    'imo_number': ship['imo_number'],
+                    'user_id': ship['user_id'],
+                    'status': ship.get('status', 'ACTIVE'),
+                    'notes': ship.get('notes'),
+                }
+                for ship in ships
+            ]
+        )
+
     def get_ships(
         self,
         id=None,
         ids=None,
         user_ids=None,
         status=None,
+        search=None,
         order_by=None,
+        limit=None,
+        offset=None,
+        cursor=None,
+        fields=None,
+        include_count=True,
     ):
         """ Retrieve a list of ships for given params, ordered and limited.
 
@@ -59,19 +99,176 @@ class ShipLogic:
                 need to be retrieved.
             status (`obj`:string, optional): The status of ships to be
                 retrieved.
+            search (`obj`:str, optional): Only ships whose ``name`` or
+                ``imo_number`` holds this text, ignoring case.
             order_by (`obj`:str, optional): The field on which to sort the
                 retrieved ships by.
+            limit (`obj`:int, optional): The maximum number of ships to
+                return.
+            offset (`obj`:int, optional): The number of ships to skip.
+            cursor (`obj`:tuple, optional): A ``(value, id)`` keyset cursor
+                taken from the last ship of the previous page.
+            fields (`obj`:list, optional): The names of the fields to return,
+                all of them by default.
+            include_count (`obj`:bool, optional): How to count the ships
+                found, one of ``ship.storage.COUNT_STRATEGIES``. ``False``
+                doesn't count them.
 
         Returns:
             tuple: (list, int) - List of serialized ship objects. Int the total
-                count of ship objects found.
+                count of ship objects found, ``None`` if they weren't counted.
         """
         return self.storage.retrieve_ships(
             id=id,
             ids=ids,
             user_ids=user_ids,
             status=status,
+            search=search,
+            order_by=order_by,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+            fields=fields,
+            include_count=include_count,
+        )
+
+    def get_version(self, id=None, ids=None, user_ids=None, status=None):
+        """ Cheap validators of the ships ``get_ships`` would retrieve for
+        the same filters, without retrieving them.
+
+        Args:
+            id (`obj`:int, optional): The ID of the given ship.
+            ids (`obj`:list, optional): A list of IDs of ships.
+            user_ids (`obj`:list, optional): A list of user IDs whos ships
+                are concerned.
+            status (`obj`:string, optional): The status of ships concerned.
+
+        Returns:
+            tuple: (str, datetime) - An opaque version, which changes whenever
+                one of the ships does. The last time one of the ships changed,
+                ``None`` if unknown.
+        """
+        return self.storage.retrieve_version(
+            id=id,
+            ids=ids,
+            user_ids=user_ids,
+            status=status,
+        )
+
+    def get_ship_changes(
+        self,
+        since=None,
+        user_ids=None,
+        limit=None,
+        fields=None,
+    ):
+        """ Retrieve the ships written since the last call, to keep a copy
+        of the fleet in sync. Ships set to ``DELETED`` are included.
+
+        Ships are returned at least once: those written within
+        ``changes_settle_time`` are returned again by the next call, unless
+        the page is full.
+
+        Args:
+            since (`obj`:tuple, optional): The cursor returned by the previous
+                call. Every ship is returned without it.
+            user_ids (`obj`:list, optional): A list of user IDs whos ships
+                need to be retrieved.
+            limit (`obj`:int, optional): The maximum number of ships to
+                return.
+            fields (`obj`:list, optional): The names of the fields to return,
+                all of them by default.
+
+        Returns:
+            tuple: (list, tuple) - List of serialized ship objects, in the
+                order they were written. The cursor to pass to the next call.
+        """
+        ships = self.storage.retrieve_changes(
+            **self._changes_kwargs(since, user_ids, limit, fields)
+        )
+        return ships, self._changes_cursor(ships, since, limit)
+
+    def get_fleet_stats(self, user_ids=None):
+        """ Count the ships of each user by status, from counts the storage
+        keeps up to date rather than by counting ships.
+
+        Args:
+            user_ids (`obj`:list, optional): A list of user IDs whos ships
+                need to be counted, every user with ships by default.
+
+        Returns:
+            dict: ``{user_id: {status: count}}``, users without ships have
+                no counts.
+        """
+        return self.storage.retrieve_fleet_stats(
+            user_ids=user_ids,
+        )
+
+    @staticmethod
+    def _changes_kwargs(since, user_ids, limit, fields):
+        if fields:
+            # The cursor is built on them.
+            fields = list(fields) + ['id', 'modified']
+
+        return {
+            'since': since,
+            'user_ids': user_ids,
+            'limit': limit,
+            'fields': fields,
+        }
+
+    def _changes_cursor(self, ships, since, limit):
+        """ The cursor of the change feed after ``ships``, the last of them
+        which settled. A full page moves it to its last ship all the same, so
+        that no call returns the same page again.
+        """
+        settled = None
+        if limit is None or len(ships) < int(limit):
+            settled = timezone.now() - self.changes_settle_time
+
+        for ship in reversed(ships):
+            if settled is None or ship['modified'] <= settled:
+                return ship['modified'], ship['id']
+
+        return since
+
+    def stream_ships(
+        self,
+        id=None,
+        ids=None,
+        user_ids=None,
+        status=None,
+        search=None,
+        order_by=None,
+        fields=None,
+    ):
+        """ Lazily retrieve ships for given params, ordered.
+
+        Args:
+            id (`obj`:int, optional): The ID of the given ship to be retrieved.
+            ids (`obj`:list, optional): A list of IDs of ships to be retrieved.
+            user_ids (`obj`:list, optional): A list of user IDs whos ships
+                need to be retrieved.
+            status (`obj`:string, optional): The status of ships to be
+                retrieved.
+            search (`obj`:str, optional): Only ships whose ``name`` or
+                ``imo_number`` holds this text, ignoring case.
+            order_by (`obj`:str, optional): The field on which to sort the
+                retrieved ships by.
+            fields (`obj`:list, optional): The names of the fields to return,
+                all of them by default.
+
+        Returns:
+            generator: Serialized ship objects, produced as they are consumed.
+        """
+        return self.storage.stream_ships(
+            id=id,
+            ids=ids,
+            user_ids=user_ids,
+            status=status,
+            search=search,
             order_by=order_by,
+            fields=fields,
         )
 
     def update_ship(self, id, **kwargs):
@@ -93,6 +290,28 @@ class ShipLogic:
             **kwargs
         )
 
+    def update_ships(self, ids, user_ids=None, **kwargs):
+        """ Apply the same changes to many ships at once.
+
+        Args:
+            ids (list): The IDs of the ships to be updated.
+            user_ids (`obj`:list, optional): Only update ships owned by these
+                users.
+            kwargs (dict): Key-value pairs to set on every ship.
+
+        Returns:
+            int: The number of ships updated.
+
+        Raises:
+            DuplicateError: If the changes would give an owner two ships with
+                the same IMO.
+        """
+        return self.storage.update_ships(
+            ids,
+            user_ids=user_ids,
+            **kwargs
+        )
+
     def delete_ship(self, id):
         """ Set the ship's status to ``DELETED``.
 
@@ -105,3 +324,68 @@ class ShipLogic:
         return self.storage.delete_ship(
             id=id,
         )
+
+    def delete_ships(self, ids, user_ids=None):
+        """ Set the status of many ships to ``DELETED`` at once.
+
+        Args:
+            ids (list): The IDs of the ships to set to DELETED.
+            user_ids (`obj`:list, optional): Only delete ships owned by these
+                users.
+
+        Returns:
+            int: The number of ships deleted.
+        """
+        return self.storage.delete_ships(
+            ids,
+            user_ids=user_ids,
+        )
+
+
+class AsyncShipLogic(ShipLogic):
+
+    """
+    ``ShipLogic`` for async code, built on one of the storages of
+    ``ship.async_storage``. Every method is a coroutine taking the same
+    arguments as its ``ShipLogic`` counterpart, apart from ``stream_ships``
+    which returns an async iterator of ships.
+    """
+
+    async def create_ship(self, *args, **kwargs):
+        return await super().create_ship(*args, **kwargs)
+
+    async def create_ships(self, ships):
+        return await super().create_ships(ships)
+
+    async def get_ships(self, *args, **kwargs):
+        return await super().get_ships(*args, **kwargs)
+
+    async def get_version(self, *args, **kwargs):
+        return await super().get_version(*args, **kwargs)
+
+    async def get_ship_changes(
+        self,
+        since=None,
+        user_ids=None,
+        limit=None,
+        fields=None,
+    ):
+        ships = await self.storage.retrieve_changes(
+            **self._changes_kwargs(since, user_ids, limit, fields)
+        )
+        return ships, self._changes_cursor(ships, since, limit)
+
+    async def get_fleet_stats(self, *args, **kwargs):
+        return await super().get_fleet_stats(*args, **kwargs)
+
+    async def update_ship(self, id, **kwargs):
+        return await super().update_ship(id, **kwargs)
+
+    async def update_ships(self, ids, user_ids=None, **kwargs):
+        return await super().update_ships(ids, user_ids=user_ids, **kwargs)
+
+    async def delete_ship(self, id):
+        return await super().delete_ship(id)
+
+    async def delete_ships(self, ids, user_ids=None):
+        return await super().delete_ships(ids, user_ids=user_ids)
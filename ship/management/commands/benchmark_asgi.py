@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Compare serving the ship API to many slow clients through the WSGI and the
+ASGI application, with the same number of threads, e.g.:
+
+    ./manage.py benchmark_asgi --clients 200 --requests 2000 --threads 8
+
+The servers are simulated in process: every client takes ``--delay`` seconds
+to send its request and as long again to read the response. Under WSGI a
+thread is held for all of that, under ASGI only while the view runs.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from rest_framework.authtoken.models import Token
+
+from assessment.handlers import ASGIHandler
+from ship.injection_setup import logic
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark the WSGI and ASGI applications with slow clients.'
+
+    path = '/api/v1/ships/'
+    query_string = b'limit=20&order_by=-created'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clients',
+            type=int,
+            default=200,
+            help='Number of clients sending requests at the same time.',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Total number of requests.',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Number of threads of either server.',
+        )
+        parser.add_argument(
+            '--delay',
+            type=float,
+            default=0.05,
+            help='Seconds a client takes to send and again to receive.',
+        )
+        parser.add_argument(
+            '--ships',
+            type=int,
+            default=1000,
+            help='Number of ships owned by the benchmark user.',
+        )
+
+    def populate(self, user_id, count):
+        logic.create_ships([
+            {
+                'name': 'SHIP {index}'.format(index=index),
+                'imo_number': '{index:07d}'.format(index=index),
+                'user_id': user_id,
+            }
+            for index in range(count)
+        ])
+
+    def scope(self, token):
+        host = next(
+            (
+                host for host in settings.ALLOWED_HOSTS
+                if not host.startswith(('*', '.'))
+            ),
+            'localhost',
+        )
+        return {
+            'type': 'http',
+            'method': 'GET',
+            'path': self.path,
+            'query_string': self.query_string,
+            'headers': [
+                (b'host', host.encode()),
+                (b'authorization', 'Token {}'.format(token).encode()),
+            ],
+        }
+
+    @staticmethod
+    def wsgi_server(application, executor, delay):
+        """ A thread per request server: the thread reads the request, runs
+        the view and writes the response.
+        """
+        def handle(environ):
+            time.sleep(delay)
+            statuses = []
+            body = b''.join(application(
+                environ, lambda status, headers: statuses.append(status),
+            ))
+            time.sleep(delay)
+            return statuses[0], body
+
+        async def serve(scope):
+            environ = ASGIHandler.get_environ(scope, b'')
+            return await asyncio.get_event_loop().run_in_executor(
+                executor, handle, environ,
+            )
+
+        return serve
+
+    @staticmethod
+    def asgi_server(handler, delay):
+        """ An event loop server: the slow client is awaited. """
+        async def serve(scope):
+            sent = []
+
+            async def receive():
+                await asyncio.sleep(delay)
+                return {'type': 'http.request', 'body': b''}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    sent.append(message['status'])
+                elif not message.get('more_body'):
+                    await asyncio.sleep(delay)
+
+            await handler(scope, receive, send)
+            return sent[0], None
+
+        return serve
+
+    @staticmethod
+    def run(serve, scope, clients, requests):
+        """
+        Returns:
+            tuple: (float, list) - Seconds taken and the latency of every
+                request.
+        """
+        latencies = []
+        statuses = set()
+
+        async def client(count):
+            for __ in range(count):
+                start = time.perf_counter()
+                status, __ = await serve(scope)
+                latencies.append(time.perf_counter() - start)
+                statuses.add(int(str(status).split(' ')[0]))
+
+        async def run_clients():
+            per_client, extra = divmod(requests, clients)
+            await asyncio.gather(*[
+                client(per_client + (index < extra))
+                for index in range(clients)
+            ])
+
+        loop = asyncio.new_event_loop()
+        start = time.perf_counter()
+        try:
+            loop.run_until_complete(run_clients())
+        finally:
+            loop.close()
+
+        assert statuses == {200}, statuses
+        return time.perf_counter() - start, sorted(latencies)
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        delay = options['delay']
+
+        user, __ = User.objects.get_or_create(username='benchmark_asgi')
+        token, __ = Token.objects.get_or_create(user=user)
+        self.populate(user.id, options['ships'])
+        scope = self.scope(token.key)
+
+        wsgi_application = get_wsgi_application()
+        executor = ThreadPoolExecutor(threads)
+        handler = ASGIHandler(wsgi_application, max_workers=threads)
+
+        self.stdout.write(
+            '{:<6} {:>10} {:>12} {:>12} {:>12}'.format(
+                '', 'seconds', 'requests/s', 'p50 ms', 'p99 ms',
+            )
+        )
+        try:
+            for label, serve in (
+                ('WSGI', self.wsgi_server(wsgi_application, executor, delay)),
+                ('ASGI', self.asgi_server(handler, delay)),
+            ):
+                seconds, latencies = self.run(
+                    serve, scope, options['clients'], options['requests'],
+                )
+                self.stdout.write(
+                    '{:<6} {:>10.2f} {:>12.1f} {:>12.1f} {:>12.1f}'.format(
+                        label,
+                        seconds,
+                        len(latencies) / seconds,
+                        latencies[len(latencies) // 2] * 1e3,
+                        latencies[int(len(latencies) * 0.99)] * 1e3,
+                    )
+                )
+        finally:
+            executor.shutdown()
+            handler.executor.shutdown()
+            user.delete()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Compare ship writes made straight through ``ShipDjangoStorage`` with writes
+group committed by ``GroupCommitShipStorage``, under concurrent writers,
+e.g.:
+
+    ./manage.py benchmark_group_commit --threads 16 --writes 500
+
+Every profile and storage gets a new database file. Each thread acts as a
+stream of requests: one write, then Django's end of request handling of the
+database connections. One in ten writes is a duplicate.
+"""
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connections
+
+from ship.benchmarks import add_sqlite_database
+from ship.exceptions import DuplicateError
+from ship.storage import GroupCommitShipStorage, ShipDjangoStorage
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark group commit of ship writes under concurrent writers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profiles',
+            default='default,production',
+            help='Comma separated list of SQLITE_PROFILES to benchmark.',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=16,
+            help='Number of threads writing at the same time.',
+        )
+        parser.add_argument(
+            '--writes',
+            type=int,
+            default=500,
+            help='Number of writes made by every thread.',
+        )
+        parser.add_argument(
+            '--max-delay',
+            type=float,
+            default=0.002,
+            help='Seconds a batch of writes stays open.',
+        )
+        parser.add_argument(
+            '--max-batch',
+            type=int,
+            default=64,
+            help='Maximum number of writes in a batch.',
+        )
+
+    @staticmethod
+    def work(storage, thread, writes, results):
+        rng = random.Random(thread)
+        latencies = []
+        errors = 0
+        ids = []
+        for index in range(writes):
+            start = time.perf_counter()
+            try:
+                if ids and rng.random() < 0.3:
+                    storage.update_ship(
+                        rng.choice(ids), notes='Noted {}'.format(index),
+                    )
+                else:
+                    # Every thread writes the ships of a user of its own.
+                    number = 0 if ids and rng.random() < 0.1 else index
+                    ids.append(storage.persist_ship(
+                        name='SHIP {}'.format(number),
+                        imo_number='{:07d}'.format(number),
+                        user_id=thread,
+                    )['id'])
+            except DuplicateError:
+                latencies.append(time.perf_counter() - start)
+            except OperationalError:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+            finally:
+                close_old_connections()
+
+        results.append((latencies, errors))
+
+    def run(self, storage, options):
+        results = []
+        threads = [
+            threading.Thread(
+                target=self.work,
+                args=(storage, thread, options['writes'], results),
+            )
+            for thread in range(options['threads'])
+        ]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start
+
+        latencies = sorted(
+            latency for thread_latencies, __ in results
+            for latency in thread_latencies
+        )
+        errors = sum(thread_errors for __, thread_errors in results)
+        return seconds, latencies, errors
+
+    @staticmethod
+    def percentile(values, fraction):
+        if not values:
+            return float('nan')
+        return values[int((len(values) - 1) * fraction)] * 1e3
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            '{:<12} {:<14} {:>10} {:>10} {:>10} {:>10} {:>8}'.format(
+                'profile', 'storage', 'writes/s', 'p50 ms', 'p99 ms',
+                'per commit', 'errors',
+            )
+        )
+
+        data_dir = tempfile.mkdtemp()
+        try:
+            for profile in options['profiles'].split(','):
+                for name in ('direct', 'group_commit'):
+                    alias = add_sqlite_database(
+                        'benchmark_{}_{}'.format(profile, name),
+                        os.path.join(data_dir, profile + name + '.sqlite3'),
+                        profile=profile,
+                    )
+                    storage = ShipDjangoStorage(using=alias)
+                    if name == 'group_commit':
+                        storage = GroupCommitShipStorage(
+                            storage,
+                            max_delay=options['max_delay'],
+                            max_batch=options['max_batch'],
+                        )
+
+                    seconds, latencies, errors = self.run(storage, options)
+                    per_commit = 1.0
+                    if name == 'group_commit':
+                        stats = storage.stats()
+                        per_commit = stats['writes'] / max(
+                            stats['batches'], 1,
+                        )
+
+                    self.stdout.write(
+                        '{:<12} {:<14} {:>10.1f} {:>10.2f} {:>10.2f} '
+                        '{:>10.1f} {:>8}'.format(
+                            profile,
+                            name,
+                            len(latencies) / seconds,
+                            self.percentile(latencies, 0.5),
+                            self.percentile(latencies, 0.99),
+                            per_commit,
+                            errors,
+                        )
+                    )
+                    connections[alias].close()
+        finally:
+            shutil.rmtree(data_dir)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the memory cost of a ship held by ``ShipPureMemoryStorage`` against
+the same ship held as a plain ``dict`` or as a ``Ship`` model instance, e.g.:
+
+    ./manage.py benchmark_memory_footprint --size 100000
+"""
+import gc
+import sys
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ship.models import Ship
+from ship.storage import ShipPureMemoryStorage
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark the memory used per ship by the in-memory storage.'
+
+    ships_per_user = 20
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=100000,
+            help='Number of ships to hold in memory.',
+        )
+
+    def ship_data(self, index):
+        return {
+            'name': 'SHIP {index}'.format(index=index),
+            'imo_number': '{index:07d}'.format(index=index),
+            'user_id': index // self.ships_per_user,
+            'status': 'ACTIVE',
+            'notes': None,
+        }
+
+    def build_storage(self, size):
+        storage = ShipPureMemoryStorage()
+        for index in range(size):
+            storage.persist_ship(**self.ship_data(index))
+        return storage
+
+    def build_dicts(self, size):
+        ships = {}
+        for index in range(size):
+            now = timezone.now()
+            ship = self.ship_data(index)
+            ship.update(id=index, created=now, modified=now)
+            ships[index] = ship
+        return ships
+
+    def build_models(self, size):
+        ships = {}
+        for index in range(size):
+            now = timezone.now()
+            ships[index] = Ship(
+                id=index, created=now, modified=now, **self.ship_data(index)
+            )
+        return ships
+
+    @staticmethod
+    def row_size(row):
+        """ Size of the container of a single row, excluding its values. """
+        size = sys.getsizeof(row)
+        if hasattr(row, '__dict__'):
+            size += sys.getsizeof(row.__dict__)
+        state = getattr(row, '_state', None)
+        if state is not None:
+            size += sys.getsizeof(state) + sys.getsizeof(state.__dict__)
+        return size
+
+    @staticmethod
+    def measure(build, size):
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        held = build(size)
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        rows = getattr(held, '_ships', held)
+        return (after - before) / size, rows[next(iter(rows))]
+
+    def handle(self, *args, **options):
+        size = options['size']
+
+        self.stdout.write(
+            '{:<24} {:>16} {:>16}'.format('', 'row bytes', 'total bytes')
+        )
+        for label, build in (
+            ('ShipPureMemoryStorage', self.build_storage),
+            ('dict per ship', self.build_dicts),
+            ('Ship model per ship', self.build_models),
+        ):
+            # The total for the storage also includes its indexes.
+            total, row = self.measure(build, size)
+            self.stdout.write(
+                '{:<24} {:>16} {:>16.1f}'.format(
+                    label, self.row_size(row), total
+                )
+            )
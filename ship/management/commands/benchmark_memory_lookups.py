@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Show that lookups against ``ShipPureMemoryStorage`` stay flat as the fleet
+grows, e.g.:
+
+    ./manage.py benchmark_memory_lookups --sizes 1000,10000,100000,1000000
+"""
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from ship.exceptions import DuplicateError
+from ship.storage import ShipPureMemoryStorage
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark ShipPureMemoryStorage lookups against the fleet size.'
+
+    # Every user owns this many ships, so the size of a single user's list
+    # stays the same no matter how big the fleet gets.
+    ships_per_user = 20
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='1000,10000,100000,1000000',
+            help='Comma separated list of fleet sizes to benchmark.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=1000,
+            help='Number of times each lookup is timed.',
+        )
+
+    def populate(self, storage, size):
+        for index in range(size):
+            storage.persist_ship(
+                name='SHIP {index}'.format(index=index),
+                imo_number='{index:07d}'.format(index=index),
+                user_id=index // self.ships_per_user,
+            )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        repeat = options['repeat']
+
+        self.stdout.write(
+            '{:>10} {:>14} {:>14} {:>14} {:>14} {:>14}'.format(
+                'ships', 'by id', 'by user', 'user+status',
+                'update', 'duplicate',
+            )
+        )
+
+        for size in sizes:
+            storage = ShipPureMemoryStorage()
+            self.populate(storage, size)
+
+            middle_id = size // 2
+            middle_user = middle_id // self.ships_per_user
+
+            def duplicate():
+                try:
+                    storage.persist_ship(
+                        name='DUPLICATE',
+                        imo_number='{index:07d}'.format(index=0),
+                        user_id=0,
+                    )
+                except DuplicateError:
+                    pass
+
+            lookups = (
+                lambda: storage.retrieve_ships(id=middle_id),
+                lambda: storage.retrieve_ships(
+                    user_ids=[middle_user], order_by='-created',
+                ),
+                lambda: storage.retrieve_ships(
+                    user_ids=[middle_user], status='ACTIVE',
+                ),
+                lambda: storage.update_ship(id=middle_id, notes='Updated'),
+                duplicate,
+            )
+
+            timings = [
+                timeit.timeit(lookup, number=repeat) / repeat * 1e6
+                for lookup in lookups
+            ]
+            self.stdout.write(
+                '{:>10} '.format(size) +
+                ' '.join('{:>11.2f} us'.format(timing) for timing in timings)
+            )
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Time how long a durable ``ShipPureMemoryStorage`` takes to start up against
+the number of ships it has to restore, e.g.:
+
+    ./manage.py benchmark_memory_startup --sizes 1000,10000,100000,1000000
+"""
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from ship.storage import ShipPureMemoryStorage
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark the startup time of the durable in-memory storage.'
+
+    ships_per_user = 20
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='1000,10000,100000,1000000',
+            help='Comma separated list of fleet sizes to benchmark.',
+        )
+        parser.add_argument(
+            '--tail',
+            type=int,
+            default=1000,
+            help='Number of writes left in the log after the snapshot.',
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        tail = options['tail']
+
+        self.stdout.write(
+            '{:>10} {:>16} {:>16}'.format('ships', 'log only', 'snapshot')
+        )
+
+        for size in sizes:
+            data_dir = tempfile.mkdtemp()
+            try:
+                # Never snapshot on our own so the log holds every write.
+                storage = ShipPureMemoryStorage(
+                    data_dir=data_dir, snapshot_every=float('inf'),
+                )
+                for index in range(size):
+                    storage.persist_ship(
+                        name='SHIP {index}'.format(index=index),
+                        imo_number='{index:07d}'.format(index=index),
+                        user_id=index // self.ships_per_user,
+                    )
+
+                start = time.perf_counter()
+                storage = ShipPureMemoryStorage(
+                    data_dir=data_dir, snapshot_every=float('inf'),
+                )
+                log_only = time.perf_counter() - start
+
+                storage.snapshot()
+                for index in range(min(tail, size)):
+                    storage.update_ship(id=index + 1, notes='Updated')
+                storage.close()
+
+                start = time.perf_counter()
+                ShipPureMemoryStorage(
+                    data_dir=data_dir, snapshot_every=float('inf'),
+                ).close()
+                from_snapshot = time.perf_counter() - start
+            finally:
+                shutil.rmtree(data_dir)
+
+            self.stdout.write(
+                '{:>10} {:>14.3f} s {:>14.3f} s'.format(
+                    size, log_only, from_snapshot
+                )
+            )
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the rows per second of the generic DRF read path against the fast
+path of ``ShipSerializer`` and ``ShipJSONRenderer``, e.g.:
+
+    ./manage.py benchmark_serializer --sizes 20,1000,100000
+"""
+import time
+from collections import OrderedDict
+
+from django.core.management.base import BaseCommand
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from ship.renderers import ShipJSONRenderer
+from ship.serializers import ShipSerializer
+from ship.storage import ShipPureMemoryStorage
+
+
+class GenericShipSerializer(ShipSerializer):
+
+    """ ``ShipSerializer`` without its fast path. """
+
+    to_representation = serializers.Serializer.to_representation
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark serializing and rendering pages of ships.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='20,1000,100000',
+            help='Comma separated list of page sizes to benchmark.',
+        )
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=200000,
+            help='Rough number of rows serialized per timing.',
+        )
+
+    @staticmethod
+    def build_page(size):
+        storage = ShipPureMemoryStorage()
+        for index in range(size):
+            storage.persist_ship(
+                name='SHIP {index}'.format(index=index),
+                imo_number='{index:07d}'.format(index=index),
+                user_id=1,
+            )
+        ships, count = storage.retrieve_ships(order_by='id')
+        return OrderedDict([
+            ('count', count),
+            ('next', None),
+            ('previous', None),
+            ('results', ships),
+        ])
+
+    @staticmethod
+    def rows_per_second(run, size, repeat):
+        start = time.perf_counter()
+        for __ in range(repeat):
+            run()
+        return size * repeat / (time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+
+        self.stdout.write(
+            '{:>10} {:>14} {:>14} {:>14} {:>14}'.format(
+                'ships', 'serializer', 'fast', 'renderer', 'fast',
+            )
+        )
+
+        for size in sizes:
+            page = self.build_page(size)
+            ships = page['results']
+            repeat = max(1, options['rows'] // size)
+
+            runs = (
+                lambda: GenericShipSerializer(ships, many=True).data,
+                lambda: ShipSerializer(ships, many=True).data,
+                lambda: JSONRenderer().render(page),
+                lambda: ShipJSONRenderer().render(page),
+            )
+
+            # Both paths have to agree before their speed is worth comparing.
+            assert runs[0]() == runs[1]()
+            assert runs[2]() == runs[3]()
+
+            self.stdout.write(
+                '{:>10} '.format(size) + ' '.join(
+                    '{:>9.0f} r/s'.format(
+                        self.rows_per_second(run, size, repeat)
+                    )
+                    for run in runs
+                )
+            )
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the SQLite profiles of ``assessment.settings`` under a mixed load
+of concurrent reads and writes of ships, e.g.:
+
+    ./manage.py benchmark_sqlite_profiles --threads 8 --operations 2000
+
+Every profile gets a new database file. Each thread acts as a stream of
+requests: one storage call, then Django's end of request handling of the
+database connections.
+"""
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connections
+
+from ship.benchmarks import add_sqlite_database
+from ship.storage import ShipDjangoStorage
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark the SQLite profiles under concurrent reads and writes.'
+
+    users = 500
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profiles',
+            default='default,production',
+            help='Comma separated list of SQLITE_PROFILES to benchmark.',
+        )
+        parser.add_argument(
+            '--ships',
+            type=int,
+            default=10000,
+            help='Number of ships stored before the run.',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Number of threads making requests at the same time.',
+        )
+        parser.add_argument(
+            '--operations',
+            type=int,
+            default=2000,
+            help='Number of requests made by every thread.',
+        )
+        parser.add_argument(
+            '--writes',
+            type=float,
+            default=0.2,
+            help='Share of the requests which write.',
+        )
+
+    def populate(self, storage, count):
+        for start in range(0, count, 1000):
+            storage.persist_ships([
+                {
+                    'name': 'SHIP {index}'.format(index=index),
+                    'imo_number': '{index:07d}'.format(index=index),
+                    'user_id': index % self.users,
+                }
+                for index in range(start, min(start + 1000, count))
+            ])
+
+    def work(self, storage, operations, writes, count, results):
+        rng = random.Random()
+        latencies = {'read': [], 'write': []}
+        errors = 0
+        for __ in range(operations):
+            kind = 'write' if rng.random() < writes else 'read'
+            start = time.perf_counter()
+            try:
+                if kind == 'read':
+                    storage.retrieve_ships(
+                        user_ids=[rng.randrange(self.users)],
+                        order_by='-created',
+                        limit=20,
+                    )
+                else:
+                    storage.update_ships(
+                        [rng.randrange(1, count + 1) for __ in range(5)],
+                        notes='Noted {}'.format(rng.random()),
+                    )
+            except OperationalError:
+                errors += 1
+            else:
+                latencies[kind].append(time.perf_counter() - start)
+            finally:
+                close_old_connections()
+
+        results.append((latencies, errors))
+
+    def run(self, storage, options):
+        results = []
+        threads = [
+            threading.Thread(
+                target=self.work,
+                args=(
+                    storage,
+                    options['operations'],
+                    options['writes'],
+                    options['ships'],
+                    results,
+                ),
+            )
+            for __ in range(options['threads'])
+        ]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start
+
+        latencies = {'read': [], 'write': []}
+        errors = 0
+        for thread_latencies, thread_errors in results:
+            for kind, values in thread_latencies.items():
+                latencies[kind].extend(values)
+            errors += thread_errors
+
+        for values in latencies.values():
+            values.sort()
+        return seconds, latencies, errors
+
+    @staticmethod
+    def percentile(values, fraction):
+        if not values:
+            return float('nan')
+        return values[int((len(values) - 1) * fraction)] * 1e3
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'].split(',')
+
+        self.stdout.write(
+            '{:<12} {:>10} {:>10} {:>10} {:>10} {:>10} {:>8}'.format(
+                'profile', 'ops/s', 'read p50', 'read p99', 'write p50',
+                'write p99', 'errors',
+            )
+        )
+
+        data_dir = tempfile.mkdtemp()
+        try:
+            for profile in profiles:
+                alias = add_sqlite_database(
+                    'benchmark_{}'.format(profile),
+                    os.path.join(data_dir, profile + '.sqlite3'),
+                    profile=profile,
+                )
+                storage = ShipDjangoStorage(using=alias)
+                self.populate(storage, options['ships'])
+                close_old_connections()
+
+                seconds, latencies, errors = self.run(storage, options)
+                operations = options['threads'] * options['operations']
+                self.stdout.write(
+                    '{:<12} {:>10.1f} {:>10.2f} {:>10.2f} {:>10.2f} '
+                    '{:>10.2f} {:>8}'.format(
+                        profile,
+                        (operations - errors) / seconds,
+                        self.percentile(latencies['read'], 0.5),
+                        self.percentile(latencies['read'], 0.99),
+                        self.percentile(latencies['write'], 0.5),
+                        self.percentile(latencies['write'], 0.99),
+                        errors,
+                    )
+                )
+                connections[alias].close()
+        finally:
+            shutil.rmtree(data_dir)
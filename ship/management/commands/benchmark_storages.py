@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Time the storage operations against every storage at a range of fleet
+sizes, save the results as JSON and compare them with a baseline, e.g.:
+
+    ./manage.py benchmark_storages --sizes 1000,10000 --output new.json \
+        --baseline baseline.json
+
+The Django storages get a new SQLite database file of their own, with the
+settings of the current ``SQLITE_PROFILE``, and ``django_sharded`` two more
+for its shards. ``django_replicated`` reads from a replica which is the same
+file, so it times the routing of reads rather than a replica's lag. The
+durable ``memory_durable`` logs its writes to a temporary directory. The
+command fails if any operation got slower than the baseline by more than
+``--tolerance``. ``--ships-per-user`` as large as the largest size times a
+single user's large fleet, e.g. its searches.
+"""
+import os
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import override_settings
+
+from ship.benchmarks import (
+    StorageBenchmark,
+    add_sqlite_database,
+    add_sqlite_replica,
+    compare,
+    django_storages,
+    dump_results,
+    load_results,
+    memory_storages,
+)
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark every storage and compare with a baseline.'
+
+    alias = 'benchmark_storages'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--storages',
+            default=(
+                'memory,memory_cached,memory_durable,django,django_cached,'
+                'django_sharded,django_replicated'
+            ),
+            help='Comma separated list of storages to benchmark.',
+        )
+        parser.add_argument(
+            '--sizes',
+            default='1000,10000,100000',
+            help='Comma separated list of fleet sizes, up to 1000000.',
+        )
+        parser.add_argument(
+            '--ships-per-user',
+            type=int,
+            default=20,
+            help='Number of ships of every user, the fleet size for one user.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=200,
+            help='Number of timed calls per operation.',
+        )
+        parser.add_argument(
+            '--output',
+            help='Path of the JSON file the results are written to.',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Path of the JSON results of an earlier run to compare to.',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help='Fraction a median latency may grow by over the baseline.',
+        )
+
+    def write_result(self, result):
+        self.stdout.write(
+            '{storage:<18} {size:>8} {operation:<26} {ops_per_sec:>12.1f} '
+            '{p50_ms:>10.3f} {p99_ms:>10.3f}'.format(**result)
+        )
+
+    def write_comparisons(self, comparisons):
+        self.stdout.write('')
+        self.stdout.write(
+            '{:<18} {:>8} {:<26} {:>10} {:>10} {:>8}'.format(
+                'storage', 'ships', 'operation', 'base p50', 'p50', 'ratio',
+            )
+        )
+        for comparison in comparisons:
+            self.stdout.write(
+                '{storage:<18} {size:>8} {operation:<26} {baseline:>10.3f} '
+                '{current:>10.3f} {ratio:>8.2f}{flag}'.format(
+                    flag=' REGRESSION' if comparison['regression'] else '',
+                    **comparison
+                )
+            )
+
+    def handle(self, *args, **options):
+        names = options['storages'].split(',')
+        sizes = [int(size) for size in options['sizes'].split(',')]
+
+        data_dir = tempfile.mkdtemp()
+        aliases = []
+        try:
+            available = memory_storages(os.path.join(data_dir, 'journal'))
+            shards = replicas = ()
+            if any(name.startswith('django') for name in names):
+                aliases.append(add_sqlite_database(
+                    self.alias, os.path.join(data_dir, 'ships.sqlite3'),
+                ))
+                if 'django_sharded' in names:
+                    shards = tuple(
+                        add_sqlite_database(
+                            '{}_{}'.format(self.alias, index),
+                            os.path.join(
+                                data_dir, 'ships_{}.sqlite3'.format(index),
+                            ),
+                        )
+                        for index in range(2)
+                    )
+                if 'django_replicated' in names:
+                    replicas = (add_sqlite_replica(
+                        self.alias + '_replica', self.alias,
+                    ),)
+                aliases.extend(shards + replicas)
+                available.update(
+                    django_storages(self.alias, shards, replicas)
+                )
+
+            unknown = set(names).difference(available)
+            if unknown:
+                raise CommandError('Unknown storages: {}'.format(
+                    ', '.join(sorted(unknown))
+                ))
+
+            self.stdout.write(
+                '{:<18} {:>8} {:<26} {:>12} {:>10} {:>10}'.format(
+                    'storage', 'ships', 'operation', 'ops/s', 'p50 ms',
+                    'p99 ms',
+                )
+            )
+            # Shards and replicas are picked by the database routers.
+            with override_settings(SHIP_SHARDS=shards, SHIP_REPLICAS=replicas):
+                benchmark = StorageBenchmark(
+                    repeat=options['repeat'],
+                    ships_per_user=options['ships_per_user'],
+                )
+                results = benchmark.run(
+                    {name: available[name] for name in names},
+                    sizes,
+                    progress=self.write_result,
+                )
+        finally:
+            for alias in aliases:
+                connections[alias].close()
+            shutil.rmtree(data_dir)
+
+        if options['output']:
+            dump_results(results, options['output'])
+
+        if options['baseline']:
+            comparisons = compare(
+                results,
+                load_results(options['baseline']),
+                tolerance=options['tolerance'],
+            )
+            self.write_comparisons(comparisons)
+
+            regressions = sum(
+                comparison['regression'] for comparison in comparisons
+            )
+            if regressions:
+                raise CommandError(
+                    '{} operations regressed.'.format(regressions)
+                )
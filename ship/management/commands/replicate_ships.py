@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Keep the SQLite read replicas in ``SHIP_REPLICAS`` up to date with the
+default database, with a simulated replication lag, until interrupted:
+
+    ./manage.py replicate_ships --lag 1.0
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from ship.replication import SQLiteReplicator
+
+
+class Command(BaseCommand):
+
+    help = 'Replicate the default SQLite database to the ship replicas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lag',
+            type=float,
+            default=1.0,
+            help='Seconds before a write shows on the replicas.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0.1,
+            help='Seconds between snapshots of the default database.',
+        )
+
+    @staticmethod
+    def database_path(alias):
+        database = settings.DATABASES[alias]
+        if connections[alias].vendor != 'sqlite':
+            raise CommandError(
+                '{} is not an SQLite database.'.format(alias)
+            )
+        return database['NAME']
+
+    def handle(self, *args, **options):
+        replicas = getattr(settings, 'SHIP_REPLICAS', ())
+        if not replicas:
+            raise CommandError('There are no SHIP_REPLICAS to replicate to.')
+
+        replicator = SQLiteReplicator(
+            self.database_path(DEFAULT_DB_ALIAS),
+            [self.database_path(alias) for alias in replicas],
+            lag=options['lag'],
+            interval=options['interval'],
+        )
+
+        # The replicas start off as copies of the primary.
+        replicator.sync()
+        self.stdout.write(
+            'Replicating to {} with {}s of lag, quit with CONTROL-C.'.format(
+                ', '.join(replicas), options['lag'],
+            )
+        )
+
+        try:
+            replicator.run()
+        except KeyboardInterrupt:
+            replicator.stop()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Metrics of the ship app, served on ``/metrics`` with every other metric in
+``assessment.metrics.registry``:
+
+* ``ship_storage_duration_seconds``: storage calls by operation and backend.
+* ``ship_logic_duration_seconds``: ``ShipLogic`` calls by operation.
+* ``ship_view_duration_seconds``: ``ShipViewSet`` actions by phase, where
+  ``view`` is the whole action and ``auth``, ``pagination`` and ``render``
+  are parts of a request.
+
+Each comes with an ``_errors_total`` counter of the calls which raised.
+"""
+import time
+
+from assessment.metrics import Instrumented, registry
+
+
+STORAGE_METHODS = (
+    'wipe',
+    'persist_ship',
+    'persist_ships',
+    'retrieve_ships',
+    'retrieve_version',
+    'retrieve_changes',
+    'retrieve_fleet_stats',
+    'update_ship',
+    'update_ships',
+    'delete_ship',
+    'delete_ships',
+)
+
+LOGIC_METHODS = (
+    'create_ship',
+    'create_ships',
+    'get_ships',
+    'get_version',
+    'get_ship_changes',
+    'get_fleet_stats',
+    'update_ship',
+    'update_ships',
+    'delete_ship',
+    'delete_ships',
+)
+
+STORAGE_DURATION = registry.histogram(
+    'ship_storage_duration_seconds',
+    'Time spent in ship storage calls.',
+    ('operation', 'backend'),
+)
+STORAGE_ERRORS = registry.counter(
+    'ship_storage_errors_total',
+    'Ship storage calls which raised.',
+    ('operation', 'backend', 'error'),
+)
+
+LOGIC_DURATION = registry.histogram(
+    'ship_logic_duration_seconds',
+    'Time spent in ShipLogic calls.',
+    ('operation',),
+)
+LOGIC_ERRORS = registry.counter(
+    'ship_logic_errors_total',
+    'ShipLogic calls which raised.',
+    ('operation', 'error'),
+)
+
+VIEW_DURATION = registry.histogram(
+    'ship_view_duration_seconds',
+    'Time spent in ShipViewSet actions, by phase of the request.',
+    ('action', 'phase'),
+)
+
+
+def instrument_storage(storage, backend=None):
+    """ Time every call to ``storage``.
+
+    Args:
+        storage (`obj`): Any ship storage.
+        backend (`obj`:str, optional): The ``backend`` label, the class name
+            of the storage by default.
+
+    Returns:
+        Instrumented: A stand-in for the storage.
+    """
+    return Instrumented(
+        storage,
+        STORAGE_METHODS,
+        STORAGE_DURATION,
+        STORAGE_ERRORS,
+        labels=(backend or type(storage).__name__,),
+        iterators=('stream_ships',),
+    )
+
+
+def instrument_logic(logic):
+    """ Time every call to ``logic``.
+
+    Returns:
+        Instrumented: A stand-in for the logic.
+    """
+    return Instrumented(
+        logic,
+        LOGIC_METHODS,
+        LOGIC_DURATION,
+        LOGIC_ERRORS,
+        iterators=('stream_ships',),
+    )
+
+
+class TimedViewMixin:
+
+    """
+    Times the actions of a viewset in ``ship_view_duration_seconds``, and
+    the authentication of their requests. ``timed`` times any other phase.
+
+    Rendering happens once the action returned, it is timed by the renderer,
+    see ``ship.renderers.ShipJSONRenderer``.
+    """
+
+    def get_action_name(self):
+        return getattr(self, 'action', None) or self.request.method.lower()
+
+    def timed(self, phase):
+        return VIEW_DURATION.time((self.get_action_name(), phase))
+
+    def dispatch(self, request, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            VIEW_DURATION.observe(
+                time.perf_counter() - start,
+                (self.get_action_name(), 'view'),
+            )
+
+    def perform_authentication(self, request):
+        with self.timed('auth'):
+            super().perform_authentication(request)
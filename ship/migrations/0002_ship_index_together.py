@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ship', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='ship',
+            index_together=set([
+                ('user_id', 'created'),
+                ('user_id', 'modified'),
+                ('status', 'created'),
+                ('status', 'modified'),
+            ]),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=unused-argument
+from __future__ import unicode_literals
+
+from django.db import DatabaseError, migrations, transaction
+
+# An FTS5 table of the trigrams of ``name`` and ``imo_number``, which finds
+# any substring of three characters or more. It holds no copy of the ships,
+# triggers keep its index in sync with every write.
+CREATE_SEARCH_TABLE = (
+    """
+    CREATE VIRTUAL TABLE ship_ship_search USING fts5(
+        name, imo_number,
+        content='ship_ship', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER ship_ship_search_insert AFTER INSERT ON ship_ship BEGIN
+        INSERT INTO ship_ship_search(rowid, name, imo_number)
+        VALUES (new.id, new.name, new.imo_number);
+    END
+    """,
+    """
+    CREATE TRIGGER ship_ship_search_delete AFTER DELETE ON ship_ship BEGIN
+        INSERT INTO ship_ship_search(ship_ship_search, rowid, name, imo_number)
+        VALUES ('delete', old.id, old.name, old.imo_number);
+    END
+    """,
+    """
+    CREATE TRIGGER ship_ship_search_update
+    AFTER UPDATE OF name, imo_number ON ship_ship BEGIN
+        INSERT INTO ship_ship_search(ship_ship_search, rowid, name, imo_number)
+        VALUES ('delete', old.id, old.name, old.imo_number);
+        INSERT INTO ship_ship_search(rowid, name, imo_number)
+        VALUES (new.id, new.name, new.imo_number);
+    END
+    """,
+    "INSERT INTO ship_ship_search(ship_ship_search) VALUES ('rebuild')",
+)
+
+DROP_SEARCH_TABLE = (
+    'DROP TRIGGER IF EXISTS ship_ship_search_insert',
+    'DROP TRIGGER IF EXISTS ship_ship_search_delete',
+    'DROP TRIGGER IF EXISTS ship_ship_search_update',
+    'DROP TABLE IF EXISTS ship_ship_search',
+)
+
+
+def create_search_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+
+    try:
+        with transaction.atomic(using=connection.alias):
+            for statement in CREATE_SEARCH_TABLE:
+                schema_editor.execute(statement)
+    except DatabaseError:
+        # SQLite before 3.34 has no trigram tokenizer, or was built without
+        # FTS5. Ships are then searched without the index.
+        pass
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in DROP_SEARCH_TABLE:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ship', '0003_ship_modified_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=unused-argument
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def count_ships(apps, schema_editor):
+    """ Count the ships there already are, once. Writes keep the counts up
+    to date from then on.
+    """
+    Ship = apps.get_model('ship', 'Ship')
+    ShipStatusCount = apps.get_model('ship', 'ShipStatusCount')
+    alias = schema_editor.connection.alias
+
+    ShipStatusCount.objects.using(alias).bulk_create([
+        ShipStatusCount(user_id=row['user_id'], status=row['status'],
+                        count=row['count'])
+        for row in Ship.objects.using(alias).values(
+            'user_id', 'status',
+        ).annotate(count=models.Count('id')).order_by()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ship', '0004_ship_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShipStatusCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.PositiveIntegerField()),
+                ('status', models.CharField(max_length=7)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='shipstatuscount',
+            unique_together=set([('user_id', 'status')]),
+        ),
+        migrations.RunPython(count_ships, migrations.RunPython.noop),
+    ]
@@ -7,7 +7,11 @@ class Ship(models.Model):
     name = models.CharField(max_length=127, blank=False, null=False)
     imo_number = models.CharField(max_length=7, blank=False, null=False)
     user_id = models.PositiveIntegerField(blank=False, null=False)
-    modified = models.DateTimeField(auto_now=True, blank=False, null=False)
+    # Indexed for the change feed of every user, see
+    # ``ShipDjangoStorage.retrieve_changes``.
+    modified = models.DateTimeField(
+        auto_now=True, blank=False, null=False, db_index=True,
+    )
     created = models.DateTimeField(auto_now_add=True, blank=False, null=False)
     notes = models.TextField(blank=True, null=True)
     status = models.CharField(
@@ -22,9 +26,43 @@ class Ship(models.Model):
         unique_together = (
             ('imo_number', 'user_id'),
         )
+        # Built for the filters and orderings of ``retrieve_ships``, see
+        # ``ship.tests.test_ship_indexes``. Lookups by ``id`` use the primary
+        # key and the ties of every ordering are broken on it.
+        index_together = (
+            ('user_id', 'created'),
+            ('user_id', 'modified'),
+            ('status', 'created'),
+            ('status', 'modified'),
+        )
 
     def __str__(self):
         return '{name} -- {imo_number}'.format(
             name=self.name,
             imo_number=self.imo_number,
         )
+
+
+class ShipStatusCount(models.Model):
+
+    """
+    The number of ships of a user in a status, kept up to date by every
+    write of ``ShipDjangoStorage`` so that fleet statistics never have to
+    count ships.
+    """
+
+    user_id = models.PositiveIntegerField(blank=False, null=False)
+    status = models.CharField(max_length=7, blank=False, null=False)
+    count = models.IntegerField(default=0, blank=False, null=False)
+
+    class Meta:
+        unique_together = (
+            ('user_id', 'status'),
+        )
+
+    def __str__(self):
+        return '{user_id} {status}: {count}'.format(
+            user_id=self.user_id,
+            status=self.status,
+            count=self.count,
+        )
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Pagination for ships which is pushed down in to the storage: instead of
+slicing a list that holds the whole fleet, the paginator tells the storage
+which page it wants and is then handed that page and the total count.
+
+Two styles are supported:
+
+* limit/offset, e.g. ``?limit=20&offset=40``, which is the default.
+* keyset cursors, e.g. ``?cursor=<token>``. Send an empty ``cursor`` to get
+  the first page. Every page costs the same no matter how deep it is.
+
+Limit/offset pages hold the total ``count``, worked out from the last page or
+counted otherwise. ``?count=`` picks another of the
+``ship.storage.COUNT_STRATEGIES``, or ``none`` to leave the count out, which
+saves a query. Cursor pages are never counted.
+
+The change feed, e.g. ``?since=<token>``, pages through the ships in the order
+they were written with the same cursors, see ``ShipLogic.get_ship_changes``.
+"""
+import base64
+import json
+from collections import OrderedDict
+from datetime import datetime
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .exceptions import UnknownFieldError
+from .storage import COUNT_PAGE, COUNT_STRATEGIES, select_order
+
+
+class ShipPagination(LimitOffsetPagination):
+
+    cursor_query_param = 'cursor'
+    changes_query_param = 'since'
+    invalid_cursor_message = 'Invalid cursor'
+
+    count_query_param = 'count'
+    # Counting strategy of limit/offset pages without a valid ``count``.
+    default_count = COUNT_PAGE
+
+    def get_storage_kwargs(self, request, order_by=None):
+        """ Work out which page the storage has to return.
+
+        Args:
+            request (`obj`:Request): The request being paginated.
+            order_by (`obj`:str, optional): The ordering of the ships, which
+                the keyset cursor is built on.
+
+        Returns:
+            dict: ``limit``, ``include_count`` and either ``offset`` or
+                ``cursor`` keyword arguments for ``ShipLogic.get_ships``.
+        """
+        self.request = request
+        self.order_by = order_by or 'id'
+        self.limit = self.get_limit(request)
+        self.offset = 0
+        self.use_cursor = self.cursor_query_param in request.query_params
+
+        if self.use_cursor:
+            cursor = self.decode_cursor(
+                request.query_params[self.cursor_query_param]
+            )
+            try:
+                # Even the first page, the next one is linked by cursor.
+                select_order(self.order_by, cursor or ())
+            except UnknownFieldError as err:
+                raise ValidationError({'order_by': [str(err)]})
+            return {
+                'limit': self.limit,
+                'cursor': cursor,
+                'include_count': False,
+            }
+
+        self.offset = self.get_offset(request)
+        return {
+            'limit': self.limit,
+            'offset': self.offset,
+            'include_count': self.get_count_strategy(request),
+        }
+
+    def get_count_strategy(self, request):
+        """
+        Returns:
+            str: One of the ``COUNT_STRATEGIES``, or ``False`` not to count
+                the ships.
+        """
+        strategy = request.query_params.get(self.count_query_param)
+        if strategy == 'none':
+            return False
+        if strategy in COUNT_STRATEGIES:
+            return strategy
+        return self.default_count
+
+    def get_changes_kwargs(self, request):
+        """ Work out which changes the storage has to return.
+
+        Returns:
+            dict: ``since`` and ``limit`` keyword arguments for
+                ``ShipLogic.get_ship_changes``.
+        """
+        self.request = request
+        self.limit = self.get_limit(request)
+        return {
+            'since': self.decode_cursor(
+                request.query_params[self.changes_query_param]
+            ),
+            'limit': self.limit,
+        }
+
+    def get_changes_response(self, ships, cursor):
+        """ Build the response of the change feed, which links to the
+        changes made after ``cursor``.
+        """
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.offset_query_param,
+        )
+        return Response(OrderedDict([
+            ('next', replace_query_param(
+                url,
+                self.changes_query_param,
+                '' if cursor is None else self.encode_cursor(cursor),
+            )),
+            ('results', ships),
+        ]))
+
+    def paginate_ships(self, ships, total_count):
+        """ Accept the page returned by the storage.
+
+        Args:
+            ships (list): The serialized ships on the page.
+            total_count (int): The number of ships across all pages, ``None``
+                if they weren't counted.
+
+        Returns:
+            list: The ships on the page.
+        """
+        self.page = ships
+        self.count = total_count
+
+        if (
+            not self.use_cursor and
+            self.limit is not None and
+            self.count is not None and
+            self.count > self.limit and
+            self.template is not None
+        ):
+            self.display_page_controls = True
+
+        return ships
+
+    def get_paginated_response(self, data):
+        if self.use_cursor:
+            return Response(OrderedDict([
+                ('next', self.get_next_cursor_link()),
+                ('results', data),
+            ]))
+
+        if self.count is None:
+            return Response(OrderedDict([
+                ('next', self.get_next_link()),
+                ('previous', self.get_previous_link()),
+                ('results', data),
+            ]))
+
+        return super().get_paginated_response(data)
+
+    def get_next_link(self):
+        if self.count is not None:
+            return super().get_next_link()
+
+        # Without a count, any full page may have another after it.
+        if self.limit is None or len(self.page) < self.limit:
+            return None
+
+        url = replace_query_param(
+            self.request.build_absolute_uri(),
+            self.limit_query_param,
+            self.limit,
+        )
+        return replace_query_param(
+            url, self.offset_query_param, self.offset + self.limit,
+        )
+
+    def get_next_cursor_link(self):
+        if self.limit is None or len(self.page) < self.limit:
+            return None
+
+        last = self.page[-1]
+        field = self.order_by.lstrip('-')
+
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.offset_query_param)
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            self.encode_cursor((last[field], last['id'])),
+        )
+
+    @staticmethod
+    def encode_cursor(cursor):
+        """ Turn a ``(value, id)`` keyset cursor in to an opaque token. """
+        value, id = cursor  # pylint: disable=redefined-builtin
+        payload = {'value': value, 'id': id}
+
+        if isinstance(value, datetime):
+            payload['value'] = value.isoformat()
+            payload['type'] = 'datetime'
+
+        return base64.urlsafe_b64encode(
+            json.dumps(payload).encode()
+        ).decode()
+
+    def decode_cursor(self, token):
+        """ Turn a token made by ``encode_cursor`` back in to a cursor.
+
+        Returns:
+            tuple: ``(value, id)`` or ``None`` for the first page.
+
+        Raises:
+            NotFound: If the token is not a valid cursor.
+        """
+        if not token:
+            return None
+
+        try:
+            payload = json.loads(
+                base64.urlsafe_b64decode(token.encode()).decode()
+            )
+            value = payload['value']
+            if payload.get('type') == 'datetime':
+                value = parse_datetime(value)
+                if value is None:
+                    raise ValueError(payload)
+
+            return value, int(payload['id'])
+
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Renderers for ship responses.
+
+``JSONRenderer`` hands every ``datetime`` back to Python through
+``JSONEncoder.default``, once per field per ship. ``ShipJSONRenderer`` formats
+the datetimes of a page of ships up front, so the whole page is then encoded
+by ``json`` in a single pass, and produces exactly the same bytes.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Time zones which are known to always be UTC, so a datetime in one of them
+# can be formatted without asking the time zone for its offset.
+UTC_TIMEZONES = (timezone.utc, dt_timezone.utc)
+
+DATETIME_FIELDS = ('created', 'modified')
+
+
+def format_datetime(value, _default=JSONEncoder().default):
+    """ Format a datetime exactly like ``JSONEncoder`` does. """
+    if value.tzinfo in UTC_TIMEZONES:
+        return value.replace(tzinfo=None).isoformat() + 'Z'
+    return _default(value)
+
+
+def prepare_ship(ship):
+    """ Copy a serialized ship, with its datetimes formatted as strings. """
+    row = dict(ship)
+    last_value = last_string = None
+
+    for field in DATETIME_FIELDS:
+        value = row.get(field)
+        if not isinstance(value, datetime):
+            continue
+
+        # A ship which was never updated has the same created and modified
+        # datetime, so it only needs formatting once.
+        if value is not last_value:
+            last_value, last_string = value, format_datetime(value)
+        row[field] = last_string
+
+    return row
+
+
+class ShipJSONRenderer(JSONRenderer):
+
+    """
+    Renders a page of serialized ships, i.e. a dict with a ``results`` list,
+    with its datetimes already formatted. Anything else is rendered as is.
+
+    Rendering is timed as the ``render`` phase of views which time their
+    phases, see ``ship.metrics.TimedViewMixin``.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        view = (renderer_context or {}).get('view')
+        if hasattr(view, 'timed'):
+            with view.timed('render'):
+                return self._render(
+                    data, accepted_media_type, renderer_context,
+                )
+        return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type, renderer_context):
+        if isinstance(data, dict) and isinstance(data.get('results'), list):
+            data = data.copy()
+            data['results'] = [
+                prepare_ship(ship) if isinstance(ship, dict) else ship
+                for ship in data['results']
+            ]
+
+        return super().render(data, accepted_media_type, renderer_context)
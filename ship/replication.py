@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Replication of SQLite databases to file copies, to try out
+``ReplicatedShipStorage`` locally. SQLite has no replication of its own, so
+``SQLiteReplicator`` simulates an asynchronous one: it snapshots the primary
+every ``interval`` seconds and copies each snapshot on to the replicas
+``lag`` seconds later, e.g.:
+
+    replicator = SQLiteReplicator('db.sqlite3', ['replica_0.sqlite3'], lag=1)
+    replicator.start()
+"""
+import sqlite3
+import threading
+import time
+from collections import deque
+
+
+class SQLiteReplicator:
+
+    """
+    Copies the SQLite database at ``primary`` on to the databases at
+    ``replicas`` with a delay of ``lag`` seconds.
+
+    Copies are made with SQLite's online backup, so connections open on
+    the replicas see the new data and the primary can be written meanwhile.
+
+    Args:
+        primary (str): The path of the primary database.
+        replicas (list): The paths of the replica databases, created if they
+            don't exist.
+        lag (`obj`:float, optional): Seconds before a write to the primary
+            shows on the replicas.
+        interval (`obj`:float, optional): Seconds between snapshots of the
+            primary.
+    """
+
+    def __init__(self, primary, replicas, lag=1.0, interval=0.1):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.lag = lag
+        self.interval = interval
+
+        # Snapshots waiting for their lag to pass, as (due, connection).
+        self.pending = deque()
+        self.last_snapshot = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _copy(source, target):
+        with sqlite3.connect(target) as connection:
+            source.backup(connection)
+
+    def snapshot(self):
+        """ Copy the primary into memory as it is now.
+
+        Returns:
+            sqlite3.Connection: A connection to the in-memory copy.
+        """
+        copy = sqlite3.connect(':memory:', check_same_thread=False)
+        with sqlite3.connect(self.primary) as primary:
+            primary.backup(copy)
+        return copy
+
+    def sync(self):
+        """ Bring the replicas up to date with the primary now. """
+        copy = self.snapshot()
+        try:
+            for replica in self.replicas:
+                self._copy(copy, replica)
+        finally:
+            copy.close()
+
+    def tick(self, now=None):
+        """ Take a snapshot of the primary if one is due, and copy the
+        latest snapshot whose lag has passed on to the replicas.
+
+        Args:
+            now (`obj`:float, optional): The ``time.monotonic`` time.
+        """
+        if now is None:
+            now = time.monotonic()
+
+        if (
+                self.last_snapshot is None or
+                now - self.last_snapshot >= self.interval
+        ):
+            self.pending.append((now + self.lag, self.snapshot()))
+            self.last_snapshot = now
+
+        due = None
+        while self.pending and self.pending[0][0] <= now:
+            if due is not None:
+                due.close()
+            __, due = self.pending.popleft()
+
+        if due is not None:
+            try:
+                for replica in self.replicas:
+                    self._copy(due, replica)
+            finally:
+                due.close()
+
+    def run(self):
+        """ Replicate until ``stop`` is called. """
+        while not self._stop.is_set():
+            self.tick()
+            self._stop.wait(min(self.interval, self.lag) or self.interval)
+
+    def start(self):
+        """ Replicate on a background thread. """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        while self.pending:
+            self.pending.popleft()[1].close()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Database routing for ``ShardedShipStorage``, which partitions ships by
+``user_id`` across the databases named in the ``SHIP_SHARDS`` setting, and
+for ``ReplicatedShipStorage``, which reads ships from the replicas named in
+the ``SHIP_REPLICAS`` setting.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+class ShipShardRouter:
+
+    """
+    Routes ships to the shard of their owner when asked with a ``user_id``
+    hint, e.g. ``router.db_for_write(Ship, user_id=1)``. Without the hint
+    nothing is routed, so ``ShipDjangoStorage`` keeps using the default
+    database.
+
+    Only the ``ship`` app is migrated on to the shards.
+    """
+
+    app_label = 'ship'
+
+    @property
+    def shards(self):
+        return tuple(getattr(settings, 'SHIP_SHARDS', ()))
+
+    def shard_for_user(self, user_id):
+        """
+        Returns:
+            str: The alias of the database holding the user's ships.
+        """
+        return self.shards[int(user_id) % len(self.shards)]
+
+    def db_for_read(self, model, **hints):
+        if (
+            model._meta.app_label == self.app_label and
+            hints.get('user_id') is not None and
+            self.shards
+        ):
+            return self.shard_for_user(hints['user_id'])
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # pylint: disable=unused-argument
+        if db in self.shards:
+            return app_label == self.app_label
+        return None
+
+
+class RecentWriters:
+
+    """
+    The users who wrote ships in the last ``SHIP_REPLICA_STICKY_SECONDS``,
+    whose reads have to go to the primary database as the replicas may not
+    have their writes yet.
+
+    Writers are only known to the process they wrote in, so the user's next
+    requests are expected to reach the same process within the window.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Expiry time by user ID, oldest first as the window never changes
+        # while a process runs.
+        self._users = OrderedDict()
+        # Expiry time of writes to ships of unknown owners.
+        self._everyone = 0.0
+
+    @staticmethod
+    def window():
+        return getattr(settings, 'SHIP_REPLICA_STICKY_SECONDS', 5)
+
+    def add(self, user_ids=None):
+        """ Record a write to the ships of ``user_ids``, or of any user when
+        they aren't known.
+        """
+        now = time.monotonic()
+        expires = now + self.window()
+        with self._lock:
+            if user_ids is None:
+                self._everyone = expires
+            else:
+                for user_id in user_ids:
+                    user_id = int(user_id)
+                    self._users.pop(user_id, None)
+                    self._users[user_id] = expires
+
+            while self._users and next(iter(self._users.values())) <= now:
+                self._users.popitem(last=False)
+
+    def wrote_recently(self, user_ids=None):
+        """
+        Returns:
+            bool: Whether any of ``user_ids`` wrote within the window. For
+                a read of every user's ships, whether anybody did.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._everyone > now:
+                return True
+            if user_ids is None:
+                return any(
+                    expires > now for expires in self._users.values()
+                )
+            return any(
+                self._users.get(int(user_id), 0.0) > now
+                for user_id in user_ids
+            )
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self._everyone = 0.0
+
+
+recent_writers = RecentWriters()
+
+
+class ShipReplicaRouter:
+
+    """
+    Routes reads of ships asked with a ``replica`` hint, e.g.
+    ``router.db_for_read(Ship, replica=True, user_ids=[1])``, to the read
+    replicas in turn, unless one of ``user_ids`` wrote recently, see
+    ``RecentWriters``. Then, like every other query, they go to the primary
+    database.
+
+    Nothing is migrated on to the replicas, they are copies of the primary.
+    """
+
+    app_label = 'ship'
+
+    def __init__(self):
+        self._turns = itertools.count()
+
+    @property
+    def replicas(self):
+        return tuple(getattr(settings, 'SHIP_REPLICAS', ()))
+
+    def db_for_read(self, model, **hints):
+        if (
+            model._meta.app_label != self.app_label or
+            not hints.get('replica') or
+            not self.replicas
+        ):
+            return None
+
+        if recent_writers.wrote_recently(hints.get('user_ids')):
+            return DEFAULT_DB_ALIAS
+        return self.replicas[next(self._turns) % len(self.replicas)]
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # pylint: disable=unused-argument
+        if db in self.replicas:
+            return False
+        return None
@@ -1,5 +1,23 @@
 # -*- coding: utf-8 -*-
+from collections import OrderedDict
+
 from rest_framework import serializers
+from rest_framework.fields import empty
+
+from .exceptions import UnknownFieldError
+from .injection_setup import logic
+from .storage import select_order
+
+
+class ShipListSerializer(serializers.ListSerializer):
+
+    def create(self, validated_data):
+        """ Create every ship in one batch.
+
+        Returns:
+            list: The serialized ship or the ``DuplicateError`` for each row.
+        """
+        return logic.create_ships(validated_data)
 
 
 class ShipSerializer(serializers.Serializer):
@@ -10,14 +28,96 @@ class ShipSerializer(serializers.Serializer):
     status = serializers.CharField(required=False, read_only=True)
     notes = serializers.CharField(required=False)
 
+    class Meta:
+        list_serializer_class = ShipListSerializer
+
+    def get_read_path(self):
+        """ Compile the readable fields in to a list of
+        ``(name, to_representation, missing)`` tuples, where ``missing`` is
+        what ``Field.get_attribute`` does when a ship has no such key: return
+        ``'null'``, ``'skip'`` the field or ``'fail'``.
+
+        Returns:
+            list: The compiled fields, or ``None`` if any of the fields does
+                more than copy a value out of the dict, in which case the
+                generic DRF path is used.
+        """
+        if not hasattr(self, '_read_path'):
+            read_path = []
+            for field in self._readable_fields:
+                if (
+                    type(field) is not serializers.CharField or
+                    field.source_attrs != [field.field_name] or
+                    field.default is not empty
+                ):
+                    read_path = None
+                    break
+
+                if field.allow_null:
+                    missing = 'null'
+                elif not field.required:
+                    missing = 'skip'
+                else:
+                    missing = 'fail'
+                read_path.append((field.field_name, str, missing))
+
+            # pylint: disable=attribute-defined-outside-init
+            self._read_path = read_path
+
+        return self._read_path
+
+    def to_representation(self, instance):
+        """ Turn a ship dict from the storage straight in to its
+        representation, giving the same result as the generic DRF path
+        without going through every field's ``get_attribute``.
+        """
+        read_path = self.get_read_path()
+        if read_path is None or not isinstance(instance, dict):
+            return super().to_representation(instance)
+
+        ret = OrderedDict()
+        for name, to_representation, missing in read_path:
+            try:
+                value = instance[name]
+            except KeyError:
+                if missing == 'fail':
+                    # Let DRF raise its usual error.
+                    return super().to_representation(instance)
+                if missing == 'skip':
+                    continue
+                value = None
+
+            ret[name] = None if value is None else to_representation(value)
+
+        return ret
+
     def create(self, validated_data):
-        return Ship(**validated_data)
-
-    def update(self, instance, validate_data):
-        instance.name = validated_data.get('name', instance.name)
-        instance.imo_number = validated_data.get('imo_number', instance.imo_number)
-        instance.user_id = validated_data.get('user_id', instance.user_id)
-        instance.status = validated_data.get('status', instance.status)
-        instance.notes = validated_data.get('notes', instance.notes)
-        instance.save()
-        return instance
+        return logic.create_ship(**validated_data)
+
+    def update(self, instance, validated_data):
+        return logic.update_ship(id=instance['id'], **validated_data)
+
+
+class ShipIdsSerializer(serializers.Serializer):
+
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1))
+
+    def validate_ids(self, value):
+        if not value:
+            raise serializers.ValidationError('This list may not be empty.')
+        return value
+
+
+class ShipQuerySerializer(serializers.Serializer):
+
+    user_id = serializers.ListField(
+        child=serializers.IntegerField(), required=False,
+    )
+    order_by = serializers.CharField(required=False, allow_blank=True)
+
+    def validate_order_by(self, value):
+        try:
+            select_order(value)
+        except UnknownFieldError as err:
+            raise serializers.ValidationError(str(err))
+        return value
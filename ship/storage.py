@@ -12,134 +12,658 @@ Using a StorageInterface class to define the test cases we wish to run
 we can run a test suite against multiple backends and ensure that no matter
 which storage we use we will always get the same results.
 """
+import bisect
+import functools
+import heapq
+import json
 import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
-from django.db import IntegrityError
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    IntegrityError,
+    close_old_connections,
+    connections,
+    router,
+    transaction,
+)
+from django.db.models import Count, F, Max, Q
+from django.utils import timezone
 
-from .exceptions import DuplicateError, NotFoundException
-from .models import Ship
+from .exceptions import DuplicateError, NotFoundException, UnknownFieldError
+from .models import Ship, ShipStatusCount
+from .routers import recent_writers
 
 
 logger = logging.getLogger(__name__)
 
+# How ``retrieve_ships`` counts the ships matching a query, its
+# ``include_count`` argument:
+# * ``COUNT_EXACT``, or ``True``, counts them every time.
+# * ``COUNT_PAGE`` works the count out of a short page, which has to be the
+#   last one, and counts them otherwise.
+# * ``COUNT_CACHED`` also works the count out of a short page, otherwise it
+#   keeps the count of each query, whatever the page, until a write may have
+#   changed it, see ``CountCache``.
+# ``False`` skips the count, ``retrieve_ships`` returns ``None`` for it.
+COUNT_EXACT = 'exact'
+COUNT_PAGE = 'page'
+COUNT_CACHED = 'cached'
+COUNT_STRATEGIES = (COUNT_EXACT, COUNT_PAGE, COUNT_CACHED)
 
-class ShipPureMemoryStorage:
 
-    def wipe(self):
-        """ Used during testing to ensure each unittest is indepedent. """
+# Ship fields which may be ``None``. Ships are ordered on them with the
+# ``None`` values first, and never paged on them with a keyset cursor.
+NULLABLE_FIELDS = ('notes',)
 
-    def persist_ship(
-        self,
-        name,
-        imo_number,
-        user_id,
-        status='ACTIVE',
-        notes=None,
+
+class ShipRecord:
+
+    """
+    A compact row held by ``ShipPureMemoryStorage``. Using ``__slots__``
+    rather than a ``dict`` or a ``Ship`` model instance keeps the per ship
+    overhead down to a fixed size object with one pointer per field.
+    """
+
+    __slots__ = (
+        'created',
+        'id',
+        'imo_number',
+        'modified',
+        'name',
+        'notes',
+        'status',
+        'user_id',
+    )
+
+    def __init__(  # pylint: disable=too-many-arguments
+            self,
+            created,
+            id,
+            imo_number,
+            modified,
+            name,
+            notes,
+            status,
+            user_id,
     ):
-        """ Persists the ship into storage.
+        self.created = created
+        self.id = id
+        self.imo_number = imo_number
+        self.modified = modified
+        self.name = name
+        self.notes = notes
+        self.status = status
+        self.user_id = user_id
 
-        Args:
-            name (str): The name of the ship.
-            imo_number (str): A 7 digit string for the ship's IMO.
-            user_id (str): The ID of the user who owns the ship.
-            status (`obj`:str, optional): An optional status string. Defaults
-                to ``ACTIVE``.
-            notes (`obj`:str, optional): An optional string to add notes to the
-                ship.
 
-        Returns:
-            dict: Serialized ship object which is now in the storage.
-        """
-        #raise NotImplementedError('This must be implemented!')
-        ship = Ship()
-        ship.name = name
-        ship.imo_number = imo_number
-        ship.user_id = user_id
-        ship.status = status
-        ship.notes = notes
+def select_fields(fields):
+    """ Check the ``fields`` a storage was asked to return.
+
+    Args:
+        fields (`obj`:list, optional): Names of ship fields.
 
-        return dict(
-        (name, getattr(ship, name)) for name in dir(f) if not name.startswith('__')
+    Returns:
+        tuple: The fields in their usual order, or ``None`` when every field
+            is wanted.
+
+    Raises:
+        UnknownFieldError: If any of the fields isn't a ship field.
+    """
+    if not fields:
+        return None
+
+    unknown = set(fields).difference(ShipRecord.__slots__)
+    if unknown:
+        raise UnknownFieldError(
+            'Unknown ship fields: {}'.format(', '.join(sorted(unknown)))
         )
 
-    def retrieve_ships(
-        self,
-        id=None,
-        ids=None,
-        user_ids=None,
-        status=None,
-        order_by=None,
+    return tuple(field for field in ShipRecord.__slots__ if field in fields)
+
+
+def select_order(order_by, cursor=None):
+    """ Check the ``order_by`` a storage was asked to sort ships on.
+
+    Args:
+        order_by (`obj`:str, optional): A ship field, prefixed with ``-`` for
+            a descending order.
+        cursor (`obj`:tuple, optional): The keyset cursor the ships are paged
+            with, which can't be built on a field that may be null.
+
+    Returns:
+        tuple: (str, bool) - The field, ``id`` by default, and whether the
+            order is descending.
+
+    Raises:
+        UnknownFieldError: If the field isn't a ship field, or may be null
+            while a cursor is given.
+    """
+    if not order_by:
+        return 'id', False
+
+    field = order_by.lstrip('-')
+    if field not in ShipRecord.__slots__:
+        raise UnknownFieldError('Unknown ship field: {}'.format(field))
+    if cursor is not None and field in NULLABLE_FIELDS:
+        raise UnknownFieldError(
+            'Ships can not be paged with a cursor on {}, it may be '
+            'null'.format(field)
+        )
+
+    return field, order_by.startswith('-')
+
+
+def nulls_first(value):
+    """ Sort key of a value of one of the ``NULLABLE_FIELDS``, putting
+    ``None`` before any other value as SQLite does, without comparing it.
+    """
+    return value is not None, value
+
+
+def search_trigrams(text):
+    """ Break text in to the trigrams of the search indexes. A search term
+    is found in any text holding all of its trigrams, terms shorter than a
+    trigram have none and can't be looked up.
+
+    Returns:
+        set: The lower cased, three character substrings of ``text``.
+    """
+    if not text:
+        return set()
+
+    text = text.lower()
+    return {text[start:start + 3] for start in range(len(text) - 2)}
+
+
+def page_count(page_size, limit=None, offset=None, cursor=None):
+    """ Work out the number of ships matching a query from one of its pages,
+    when it is the last one.
+
+    Args:
+        page_size (int): The number of ships on the page.
+        limit (`obj`:int, optional): The size of a full page.
+        offset (`obj`:int, optional): The number of ships before the page.
+        cursor (`obj`:tuple, optional): The keyset cursor of the page, which
+            doesn't tell how many ships come before it.
+
+    Returns:
+        int: The number of ships, ``None`` when it can't be told.
+    """
+    offset = int(offset or 0)
+    if (
+            cursor is not None or
+            (limit is not None and page_size >= int(limit)) or
+            # Past the end, or the last ship was just deleted.
+            (offset and not page_size)
     ):
-        """ Retrieve a list of ships for given params and order if required.
+        return None
+    return offset + page_size
 
-        Args:
-            id (`obj`:int, optional): The ID of the given ship to be retrieved.
-            ids (`obj`:list, optional): A list of IDs of ships to be retrieved.
-            user_ids (`obj`:list, optional): A list of user IDs whos ships
-                need to be retrieved.
-            status (`obj`:string, optional): The status of ships to be
-                retrieved.
-            order_by (`obj`:str, optional): The field on which to sort the
-                retrieved ships by.
 
-        Returns:
-            tuple: (list, int) - List of serialized ship objects. Int the total
-                count of ship objects found.
+class ShipJournal:
+
+    """
+    Durability for ``ShipPureMemoryStorage``: an append-only log of every
+    written ship plus a periodic compact snapshot of the whole fleet, both kept
+    in ``data_dir``.
+
+    Each log entry is the full row after the write, so replaying is an upsert
+    and a torn final entry left by a crash can simply be dropped. Entries carry
+    a sequence number and a snapshot records the last one it includes, which
+    keeps recovery correct even if we crash between writing a snapshot and
+    dropping the entries it includes from the log.
+
+    A snapshot is taken in three steps, see ``ShipPureMemoryStorage.snapshot``:
+    ``mark`` where it ends in the log, ``write_snapshot`` and
+    ``drop_entries``. Only the first and last need writes held off.
+    """
+
+    LOG_NAME = 'ships.log'
+    SNAPSHOT_NAME = 'ships.snapshot'
+
+    EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+    def __init__(self, data_dir, snapshot_every=100000, fsync=False):
+        """
+        Args:
+            data_dir (str): Directory holding the log and the snapshot.
+            snapshot_every (`obj`:int, optional): Number of log entries after
+                which the storage writes a new snapshot.
+            fsync (`obj`:bool, optional): ``fsync`` every log entry rather
+                than only flushing it to the operating system.
         """
-        #raise NotImplementedError('This must be implemented!')
-        ship = ship()
+        self.data_dir = data_dir
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
 
+        self.log_path = os.path.join(data_dir, self.LOG_NAME)
+        self.snapshot_path = os.path.join(data_dir, self.SNAPSHOT_NAME)
 
-    def update_ship(self, id, **kwargs):
-        """ Update details of a ship.
+        os.makedirs(data_dir, exist_ok=True)
+
+        self.sequence = 0
+        self.entries_since_snapshot = 0
+        self._log = None
+
+    @classmethod
+    def encode_datetime(cls, value):
+        epoch = cls.EPOCH
+        if timezone.is_naive(value):
+            epoch = epoch.replace(tzinfo=None)
+        return (value - epoch) // timedelta(microseconds=1)
+
+    @classmethod
+    def decode_datetime(cls, value):
+        value = cls.EPOCH + timedelta(microseconds=value)
+        if not settings.USE_TZ:
+            value = value.replace(tzinfo=None)
+        return value
+
+    @classmethod
+    def encode_ship(cls, ship):
+        """ Encode a ``ShipRecord`` as a compact JSON array. """
+        return [
+            cls.encode_datetime(ship.created),
+            ship.id,
+            ship.imo_number,
+            cls.encode_datetime(ship.modified),
+            ship.name,
+            ship.notes,
+            ship.status,
+            ship.user_id,
+        ]
+
+    @classmethod
+    def decode_ship(cls, row, decoded_datetimes):
+        """ Decode a JSON array created by ``encode_ship`` in place.
 
         Args:
-            id (int): The ID of the ship to be updated
-            kwargs (dict): Key-value pair that we use to setattr() to ship
-                before saving it.
+            row (list): The encoded ship.
+            decoded_datetimes (dict): Datetimes decoded so far. Ships which
+                have never been modified share a single object for both
+                ``created`` and ``modified``.
 
         Returns:
-            dict: A serialized ship object that has been updated in storage.
+            list: The arguments for a ``ShipRecord``.
+        """
+        for index in (0, 3):
+            value = row[index]
+            decoded = decoded_datetimes.get(value)
+            if decoded is None:
+                decoded = decoded_datetimes[value] = cls.decode_datetime(value)
+            row[index] = decoded
+        return row
 
-        Raises:
-            NotFoundException: If the ship was not found.
+    def load(self):
+        """ Read the latest snapshot and the tail of the log.
+
+        Returns:
+            iterable: ``ShipRecord`` arguments in the order they need to be
+                applied.
         """
-        raise NotImplementedError('This must be implemented!')
+        snapshot_sequence = 0
+        decoded_datetimes = {}
+        rows = ()
 
-    def delete_ship(self, id, user_id):
-        """ Set the ship's status to ``DELETED``.
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as snapshot:
+                header = snapshot.readline()
+                if header:
+                    snapshot_sequence = json.loads(header.decode())['sequence']
+                    # All the rows are a single JSON array so they are parsed
+                    # in one go.
+                    rows = json.loads(snapshot.read().decode())
+
+        for row in rows:
+            yield self.decode_ship(row, decoded_datetimes)
+        rows = None
+        decoded_datetimes.clear()
+
+        self.sequence = snapshot_sequence
+
+        valid_length = 0
+        if os.path.exists(self.log_path):
+            with open(self.log_path, 'rb') as log:
+                for line in log:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError(line)
+                        entry = json.loads(line.decode())
+                    except ValueError:
+                        # A torn write from a crash, it can only be the last
+                        # entry so anything from here on is thrown away.
+                        logger.warning('Discarding a torn ship log entry.')
+                        break
+
+                    valid_length += len(line)
+                    if entry['sequence'] <= snapshot_sequence:
+                        continue
+
+                    self.sequence = entry['sequence']
+                    self.entries_since_snapshot += 1
+                    yield self.decode_ship(entry['ship'], decoded_datetimes)
+
+        self._log = open(self.log_path, 'ab')
+        self._log.truncate(valid_length)
+
+    def append(self, ship):
+        """ Append a written ``ShipRecord`` to the log. """
+        self.sequence += 1
+        self.entries_since_snapshot += 1
+
+        entry = {'sequence': self.sequence, 'ship': self.encode_ship(ship)}
+        self._log.write(json.dumps(entry).encode() + b'\n')
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+
+    def needs_snapshot(self):
+        return self.entries_since_snapshot >= self.snapshot_every
+
+    def mark(self):
+        """ Start a snapshot of the ships as they are now.
+
+        Returns:
+            tuple: (int, int) - The sequence of the last entry the snapshot
+                includes, and the length of the log up to the end of it.
+        """
+        self._log.flush()
+        self.entries_since_snapshot = 0
+        return self.sequence, os.fstat(self._log.fileno()).st_size
+
+    def write_snapshot(self, ships, sequence):
+        """ Write every ship to a new snapshot, which replaces the last one
+        once it is on disk. The log is left alone, so writes can carry on.
 
         Args:
-            id (int): The ID of the ship's status to set to DELETED
+            ships (iterable): All ``ShipRecord`` objects in the storage, as
+                of the log entry numbered ``sequence``.
+            sequence (int): As returned by ``mark``.
+        """
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as snapshot:
+            header = {'sequence': sequence}
+            snapshot.write(json.dumps(header).encode() + b'\n[')
+            separator = b''
+            for ship in ships:
+                snapshot.write(
+                    separator + json.dumps(self.encode_ship(ship)).encode()
+                )
+                separator = b','
+            snapshot.write(b']\n')
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
 
-        Raises:
-            NotFoundException: If the ship was not found.
+        os.replace(tmp_path, self.snapshot_path)
+
+    def drop_entries(self, length):
+        """ Drop the entries a snapshot includes from the log, keeping those
+        logged since. The log is replaced with a copy of the kept entries, so
+        a crash meanwhile leaves either log whole.
+
+        Args:
+            length (int): As returned by ``mark``.
         """
-        raise NotImplementedError('This must be implemented!')
+        self._log.flush()
+        tmp_path = self.log_path + '.tmp'
+        with open(self.log_path, 'rb') as log, open(tmp_path, 'wb') as kept:
+            log.seek(length)
+            shutil.copyfileobj(log, kept)
+            kept.flush()
+            os.fsync(kept.fileno())
 
+        self._log.close()
+        os.replace(tmp_path, self.log_path)
+        self._log = open(self.log_path, 'ab')
 
-class ShipDjangoStorage:
+    def wipe(self):
+        """ Throw away the snapshot and the log. """
+        if os.path.exists(self.snapshot_path):
+            os.remove(self.snapshot_path)
 
-    ship_model = Ship
+        self._log.truncate(0)
+        self._log.flush()
+        self.sequence = 0
+        self.entries_since_snapshot = 0
 
-    INTEGRITY_ERROR_ARG = (
-        'UNIQUE constraint failed: ship_ship.imo_number, ship_ship.user_id'
-    )
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+class ShipPureMemoryStorage:
+
+    """
+    An in-memory storage engine. Ships are kept as ``ShipRecord`` rows in a
+    primary key map and are reachable through secondary hash indexes on
+    ``user_id`` and ``status`` and a unique index on ``(imo_number, user_id)``
+    so that no operation has to scan the whole fleet.
+
+    Passing a ``data_dir`` turns on durability through a ``ShipJournal``: the
+    fleet is restored from disk when the storage is created and every write is
+    logged before it is acknowledged.
+    """
+
+    FIELDS = ShipRecord.__slots__
+
+    # Fields which can never be changed through ``update_ship``.
+    READ_ONLY_FIELDS = ('created', 'id', 'modified', 'user_id')
+
+    def __init__(self, data_dir=None, snapshot_every=100000, fsync=False):
+        """
+        Args:
+            data_dir (`obj`:str, optional): Directory used to make the storage
+                durable. Ships are only kept in memory when it is not given.
+            snapshot_every (`obj`:int, optional): Number of writes after which
+                a new snapshot is taken.
+            fsync (`obj`:bool, optional): ``fsync`` every write to the log.
+        """
+        self._lock = threading.RLock()
+        # Held while a snapshot is taken, before ``_lock`` if both are.
+        self._snapshot_lock = threading.Lock()
+        self._reset()
+
+        self._journal = None
+        if data_dir is not None:
+            self._journal = ShipJournal(
+                data_dir, snapshot_every=snapshot_every, fsync=fsync,
+            )
+            self._recover()
 
     def wipe(self):
         """ Used during testing to ensure each unittest is indepedent. """
-        self.ship_model.objects.all().delete()
+        with self._snapshot_lock, self._lock:
+            self._reset()
+            if self._journal is not None:
+                self._journal.wipe()
+
+    def _reset(self):
+        with self._lock:
+            # Primary key map: {id: ShipRecord}
+            self._ships = {}
+            # Secondary indexes: {user_id: {id: None}}, {status: {id: None}}.
+            # Dicts are used as insertion ordered sets.
+            self._user_index = {}
+            self._status_index = {}
+            # Unique index: {user_id: {imo_number: id}}
+            self._unique_index = {}
+            # Search index: {trigram: {id: None}} of the lower cased
+            # ``name`` and ``imo_number``, see ``search_trigrams``.
+            self._search_index = {}
+            # Fleet statistics: {user_id: {status: number of ships}}.
+            self._status_counts = {}
+            # Values repeated across many ships (``user_id``, ``status``) are
+            # interned so that every record points at the same object.
+            self._interned = {}
+            self._next_id = 1
+            # Versions of the ships of each user and of the whole fleet:
+            # {user_id: (version, modified)}, bumped by every write. The
+            # epoch tells versions counted since different resets apart.
+            self._epoch = uuid.uuid4().hex[:8]
+            self._version = 0
+            self._last_modified = None
+            self._user_versions = {}
+            # Change log: ``(modified, id)`` of every write, sorted. Entries
+            # of ships which were written again since are left behind until
+            # the log is compacted.
+            self._changes = []
 
     @staticmethod
-    def _serialize_ship(obj):
-        """ Serialize a ship object in to a ``dict`` object.
+    def _normalize_key(value):
+        """ Coerce IDs passed in as strings (e.g. from a URL) to integers. """
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return value
+
+    def _intern(self, value):
+        return self._interned.setdefault(value, value)
+
+    @staticmethod
+    def _index_add(index, key, id):
+        index.setdefault(key, {})[id] = None
+
+    @staticmethod
+    def _index_discard(index, key, id):
+        bucket = index.get(key)
+        if bucket is None:
+            return
+
+        bucket.pop(id, None)
+        if not bucket:
+            del index[key]
+
+    def _add_record(self, ship):
+        """ Put a ``ShipRecord`` in to the primary key map and the indexes. """
+        self._ships[ship.id] = ship
+        self._unique_index.setdefault(ship.user_id, {})[ship.imo_number] = (
+            ship.id
+        )
+        self._index_add(self._user_index, ship.user_id, ship.id)
+        self._index_add(self._status_index, ship.status, ship.id)
+        for trigram in self._ship_trigrams(ship):
+            self._index_add(self._search_index, trigram, ship.id)
+        self._count_status(ship.user_id, ship.status, 1)
+
+    def _remove_record(self, ship):
+        """ Take a ``ShipRecord`` out of the primary key map and the indexes.
+        """
+        del self._ships[ship.id]
+        self._index_discard(self._unique_index, ship.user_id, ship.imo_number)
+        self._index_discard(self._user_index, ship.user_id, ship.id)
+        self._index_discard(self._status_index, ship.status, ship.id)
+        for trigram in self._ship_trigrams(ship):
+            self._index_discard(self._search_index, trigram, ship.id)
+        self._count_status(ship.user_id, ship.status, -1)
+
+    def _count_status(self, user_id, status, change):
+        counts = self._status_counts.setdefault(user_id, {})
+        counts[status] = counts.get(status, 0) + change
+        if not counts[status]:
+            del counts[status]
+            if not counts:
+                del self._status_counts[user_id]
+
+    @staticmethod
+    def _ship_trigrams(ship):
+        return search_trigrams(ship.name) | search_trigrams(ship.imo_number)
+
+    def _recover(self):
+        """ Rebuild the fleet from the journal's snapshot and log tail. """
+        with self._lock:
+            for row in self._journal.load():
+                ship = ShipRecord(*row)
+                ship.status = self._intern(ship.status)
+                ship.user_id = self._intern(ship.user_id)
+
+                # Log entries are full rows, so a later entry for the same
+                # ship replaces the earlier one.
+                existing = self._ships.get(ship.id)
+                if existing is not None:
+                    self._remove_record(existing)
+
+                self._add_record(ship)
+                # The change log is built once every ship is recovered.
+                self._record_write(ship, log_change=False)
+                if ship.id >= self._next_id:
+                    self._next_id = ship.id + 1
+
+            self._compact_changes()
+
+        self._maybe_snapshot()
+
+    def _maybe_snapshot(self):
+        """ Take a snapshot if the log has grown enough and no other is
+        being taken. Called by writes once they released the storage lock.
+        """
+        if (
+                self._journal is not None and
+                self._journal.needs_snapshot() and
+                self._snapshot_lock.acquire(blocking=False)
+        ):
+            try:
+                self._snapshot()
+            finally:
+                self._snapshot_lock.release()
+
+    def snapshot(self):
+        """ Write a compact snapshot of the fleet and truncate the log. """
+        if self._journal is None:
+            return
+
+        with self._snapshot_lock:
+            self._snapshot()
+
+    def _snapshot(self):
+        """ Copy the ships under the storage lock, then write them while
+        reads and writes carry on. Only the log entries the copy includes are
+        dropped afterwards. Callers must hold the snapshot lock.
+        """
+        with self._lock:
+            # Writes change the records in place.
+            ships = [
+                ShipRecord(**self._serialize_ship(ship))
+                for ship in self._ships.values()
+            ]
+            sequence, length = self._journal.mark()
+
+        self._journal.write_snapshot(ships, sequence)
+
+        with self._lock:
+            self._journal.drop_entries(length)
+
+    def close(self):
+        """ Release the journal's file handles. """
+        with self._snapshot_lock, self._lock:
+            if self._journal is not None:
+                self._journal.close()
+
+    @staticmethod
+    def _serialize_ship(obj, fields=None):
+        """ Serialize a ship record in to a ``dict`` object.
 
         Args:
-            obj (`obj`:Ship): A ship object that exists in the database.
+            obj (`obj`:ShipRecord): A ship record held in the storage.
+            fields (`obj`:tuple, optional): Only serialize these fields, as
+                returned by ``select_fields``.
 
         Returns:
             dict: A serialized ship object.
         """
+        if fields is not None:
+            return {field: getattr(obj, field) for field in fields}
+
         return {
             'created': obj.created,
             'id': obj.id,
@@ -172,115 +696,2725 @@ class ShipDjangoStorage:
 
         Returns:
             dict: Serialized ship object which is now in the storage.
+
+        Raises:
+            DuplicateError: If the user already owns a ship with the IMO.
         """
-        try:
-            ship = self.ship_model.objects.create(
-                name=name,
-                imo_number=imo_number,
-                user_id=user_id,
-                status=status,
-                notes=notes,
-            )
-        except Exception as err:  # pylint: disable=broad-except
-            logger.exception('Oops something went wrong persisting a ship.')
-            if (
-                isinstance(err, IntegrityError) and
-                err.args == (self.INTEGRITY_ERROR_ARG,)
-            ):
-                raise DuplicateError(err)
-            else:
-                raise err
+        with self._lock:
+            ship = self._insert(name, imo_number, user_id, status, notes)
+            ship = self._serialize_ship(ship)
 
-        return self._serialize_ship(ship)
+        self._maybe_snapshot()
+        return ship
 
-    def retrieve_ships(
-        self,
-        id=None,
-        ids=None,
-        user_ids=None,
-        status=None,
-        order_by=None,
-    ):
-        """ Retrieve a list of ships for given params and order if required.
+    def persist_ships(self, ships):
+        """ Persists a batch of ships into storage in one pass.
+
+        A duplicate only fails its own row, the rest of the batch is still
+        persisted.
 
         Args:
-            id (`obj`:int, optional): The ID of the given ship to be retrieved.
-            ids (`obj`:list, optional): A list of IDs of ships to be retrieved.
-            user_ids (`obj`:list, optional): A list of user IDs whos ships
-                need to be retrieved.
-            status (`obj`:string, optional): The status of ships to be
-                retrieved.
-            order_by (`obj`:str, optional): The field on which to sort the
-                retrieved ships by.
+            ships (list): Dicts holding the keyword arguments of
+                ``persist_ship`` for each ship.
 
         Returns:
-            tuple: (list, int) - List of serialized ship objects. Int the total
-                count of ship objects found.
+            list: One entry per ship, in the same order. Either the serialized
+                ship or the ``DuplicateError`` raised for it.
+        """
+        results = []
+        with self._lock:
+            for data in ships:
+                try:
+                    ship = self._insert(
+                        data['name'],
+                        data['imo_number'],
+                        data['user_id'],
+                        data.get('status', 'ACTIVE'),
+                        data.get('notes'),
+                    )
+                except DuplicateError as err:
+                    results.append(err)
+                else:
+                    results.append(self._serialize_ship(ship))
+
+        self._maybe_snapshot()
+        return results
+
+    def _insert(  # pylint: disable=too-many-arguments
+            self,
+            name,
+            imo_number,
+            user_id,
+            status,
+            notes,
+    ):
+        """ Create, journal and index a new ``ShipRecord``.
+
+        Callers must hold the storage lock.
+
+        Raises:
+            DuplicateError: If the user already owns a ship with the IMO.
+        """
+        user_id = self._intern(self._normalize_key(user_id))
+        status = self._intern(status)
+
+        if imo_number in self._unique_index.get(user_id, ()):
+            raise DuplicateError((imo_number, user_id))
+
+        id = self._next_id
+        self._next_id += 1
+
+        now = timezone.now()
+        ship = ShipRecord(
+            created=now,
+            id=id,
+            imo_number=imo_number,
+            modified=now,
+            name=name,
+            notes=notes,
+            status=status,
+            user_id=user_id,
+        )
+
+        if self._journal is not None:
+            self._journal.append(ship)
+
+        self._add_record(ship)
+        self._record_write(ship)
+        return ship
+
+    def _candidate_ids(  # pylint: disable=too-many-arguments
+            self,
+            id=None,
+            ids=None,
+            user_ids=None,
+            status=None,
+            search=None,
+    ):
+        """ Pick the smallest set of IDs which can satisfy the given filters.
+
+        Every filter maps on to a primary key lookup or an index bucket, so
+        the remaining filters only ever have to be checked against that set.
+
+        Returns:
+            iterable: IDs of ships that may match the filters.
         """
-        ships = self.ship_model.objects.all()
+        candidates = []
 
         if id:
-            ships = ships.filter(id=id)
+            candidates.append((id,))
 
         if ids:
-            ships = ships.filter(id__in=ids)
+            candidates.append(ids)
 
         if user_ids:
-            ships = ships.filter(user_id__in=user_ids)
+            buckets = [
+                self._user_index.get(user_id, ()) for user_id in user_ids
+            ]
+            if len(buckets) == 1:
+                candidates.append(buckets[0])
+            else:
+                candidates.append(
+                    [ship_id for bucket in buckets for ship_id in bucket]
+                )
 
         if status:
-            ships = ships.filter(status=status)
+            candidates.append(self._status_index.get(status, ()))
 
-        if order_by:
-            ships.order_by(order_by)
+        trigrams = search_trigrams(search)
+        if trigrams:
+            postings = sorted(
+                (self._search_index.get(trigram, {}) for trigram in trigrams),
+                key=len,
+            )
+            # Intersecting the postings costs as much as walking the
+            # shortest, which is pointless when another filter is shorter.
+            if not candidates or len(postings[0]) < min(map(len, candidates)):
+                candidates.append(self._intersect(postings))
 
-        total_count = ships.count()
-        serialized_ships = [
-            self._serialize_ship(ship)
-            for ship in ships
-        ]
+        if not candidates:
+            return self._ships.keys()
 
-        return serialized_ships, total_count
+        return min(candidates, key=len)
 
-    def update_ship(self, id, **kwargs):
-        """ Update details of a ship.
+    @staticmethod
+    def _intersect(postings):
+        """ Find the IDs in every one of the search index ``postings``,
+        sorted from the shortest.
+        """
+        shortest, others = postings[0], postings[1:]
+        return [
+            ship_id for ship_id in shortest
+            if all(ship_id in posting for posting in others)
+        ]
 
-        Args:
-            id (int): The ID of the ship to be updated
-            kwargs (dict): Key-value pair that we use to setattr() to ship
-                before saving it.
+    def _filter_records(  # pylint: disable=too-many-arguments
+            self,
+            id=None,
+            ids=None,
+            user_ids=None,
+            status=None,
+            search=None,
+    ):
+        """ Find the ``ShipRecord`` objects matching the given filters.
 
-        Returns:
-            dict: A serialized ship object that has been updated in storage.
+        Callers must hold the storage lock.
 
-        Raises:
-            NotFoundException: If the ship was not found.
+        Returns:
+            list: The matching records, in no particular order.
         """
-        if 'user_id' in kwargs:
-            logger.debug('Cannot change the owner of the ship.')
-            del kwargs['user_id']
+        if id:
+            id = self._normalize_key(id)
 
-        try:
-            ship = self.ship_model.objects.get(id=id)
-        except self.ship_model.DoesNotExist:
-            raise NotFoundException
+        if ids:
+            ids = {self._normalize_key(ship_id) for ship_id in ids}
 
-        # Naively set attribute values on an object. If the key is not a valid
-        # attribute key then ``.save()`` should succeed without any issues.
-        for key, value in kwargs.items():
-            setattr(ship, key, value)
+        if user_ids:
+            user_ids = {self._normalize_key(user_id) for user_id in user_ids}
 
-        ship.save()
+        if search:
+            search = search.lower()
 
-        return self._serialize_ship(ship)
+        ships = []
+        for ship_id in self._candidate_ids(id, ids, user_ids, status, search):
+            ship = self._ships.get(ship_id)
 
-    def delete_ship(self, id):
-        """ Set the ship's status to ``DELETED``.
+            if ship is None:
+                continue
 
-        Args:
-            id (int): The ID of the ship's status to set to DELETED
+            if id and ship.id != id:
+                continue
+
+            if ids and ship.id not in ids:
+                continue
+
+            if user_ids and ship.user_id not in user_ids:
+                continue
+
+            if status and ship.status != status:
+                continue
+
+            # Trigrams only narrow the search down, they can be found apart.
+            if search and not (
+                    search in ship.name.lower() or
+                    search in ship.imo_number.lower()
+            ):
+                continue
+
+            ships.append(ship)
+
+        return ships
+
+    @staticmethod
+    def _sort_key(order_by, cursor=None):
+        """ Build the sort key for an ``order_by`` value, checked by
+        ``select_order``.
+
+        Returns:
+            tuple: (function, bool) - The key function, which breaks ties on
+                ``id``, and whether the order is descending.
+        """
+        field, descending = select_order(order_by, cursor)
+
+        if field in NULLABLE_FIELDS:
+            def sort_key(ship):
+                return nulls_first(getattr(ship, field)), ship.id
+        else:
+            def sort_key(ship):
+                return getattr(ship, field), ship.id
+
+        return sort_key, descending
+
+    def retrieve_version(  # pylint: disable=unused-argument
+            self,
+            id=None,
+            ids=None,
+            user_ids=None,
+            status=None,
+    ):
+        """ Cheap validators of the ships matching the given filters, which
+        change whenever any of those ships does.
+
+        They are made from the version counters bumped by every write, of
+        the users concerned or of the whole fleet, so no ship is looked at
+        beyond the one asked for by ``id``. Writes to other ships of the
+        same users change them too.
+
+        Args:
+            id (`obj`:int, optional): The ID of the given ship.
+            ids (`obj`:list, optional): A list of IDs of ships.
+            user_ids (`obj`:list, optional): A list of user IDs whos ships
+                are concerned.
+            status (`obj`:string, optional): The status of ships concerned.
+
+        Returns:
+            tuple: (str, datetime) - An opaque version, equal for two calls
+                only if none of the ships changed in between. The last time
+                one of the ships changed, ``None`` if unknown.
+        """
+        # ``ids`` and ``status`` only ever narrow down the ships, and every
+        # write to those ships already bumps the versions used below.
+        with self._lock:
+            last_modified = None
+            if id:
+                ship = self._ships.get(self._normalize_key(id))
+                if ship is not None:
+                    last_modified = ship.modified
+                    user_ids = [ship.user_id]
+
+            if user_ids:
+                versions = [
+                    self._user_versions.get(user_id, (0, None))
+                    for user_id in sorted(
+                        {self._normalize_key(user_id) for user_id in user_ids},
+                        key=str,
+                    )
+                ]
+            else:
+                versions = [(self._version, self._last_modified)]
+
+            if last_modified is None:
+                modified = [modified for __, modified in versions if modified]
+                last_modified = max(modified, default=None)
+
+            version = '{}-{}'.format(
+                self._epoch,
+                '.'.join(str(version) for version, __ in versions),
+            )
+
+        return version, last_modified
+
+    def retrieve_ships(
+        self,
+        id=None,
+        ids=None,
+        user_ids=None,
+        status=None,
+        search=None,
+        order_by=None,
+        limit=None,
+        offset=None,
+        cursor=None,
+        fields=None,
+        include_count=True,
+    ):
+        """ Retrieve a list of ships for given params and order if required.
+
+        Args:
+            id (`obj`:int, optional): The ID of the given ship to be retrieved.
+            ids (`obj`:list, optional): A list of IDs of ships to be retrieved.
+            user_ids (`obj`:list, optional): A list of user IDs whos ships
+                need to be retrieved.
+            status (`obj`:string, optional): The status of ships to be
+                retrieved.
+            search (`obj`:str, optional): Only ships whose ``name`` or
+                ``imo_number`` holds this text, ignoring case.
+            order_by (`obj`:str, optional): The field on which to sort the
+                retrieved ships by. Ties are broken on ``id``.
+            limit (`obj`:int, optional): The maximum number of ships to
+                return.
+            offset (`obj`:int, optional): The number of ships to skip.
+            cursor (`obj`:tuple, optional): A ``(value, id)`` keyset cursor,
+                the ``order_by`` value and ID of the last ship of the previous
+                page. Only ships after it are returned.
+            fields (`obj`:list, optional): The names of the fields to return,
+                all of them by default.
+            include_count (`obj`:bool, optional): How to count the ships
+                found, one of the ``COUNT_STRATEGIES``. ``True`` is
+                ``COUNT_EXACT`` and ``False`` doesn't count them.
+
+        Returns:
+            tuple: (list, int) - List of serialized ship objects. Int the total
+                count of ship objects found, ignoring ``limit``, ``offset``
+                and ``cursor``, or ``None`` when they aren't counted.
+        """
+        fields = select_fields(fields)
+        sort_key, descending = self._sort_key(order_by, cursor)
+
+        with self._lock:
+            ships = self._filter_records(id, ids, user_ids, status, search)
+            total_count = len(ships)
+
+            if cursor is not None:
+                cursor = tuple(cursor)
+                if descending:
+                    ships = [ship for ship in ships if sort_key(ship) < cursor]
+                else:
+                    ships = [ship for ship in ships if sort_key(ship) > cursor]
+
+            offset = int(offset or 0)
+            if limit is not None:
+                # Only the ships up to the end of the page need sorting.
+                select = heapq.nlargest if descending else heapq.nsmallest
+                ships = select(offset + int(limit), ships, key=sort_key)
+            else:
+                ships.sort(key=sort_key, reverse=descending)
+
+            serialized_ships = [
+                self._serialize_ship(ship, fields) for ship in ships[offset:]
+            ]
+
+        # Every strategy is exact, the ships are filtered anyway.
+        return serialized_ships, total_count if include_count else None
+
+    def stream_ships(
+        self,
+        id=None,
+        ids=None,
+        user_ids=None,
+        status=None,
+        search=None,
+        order_by=None,
+        fields=None,
+    ):
+        """ Lazily retrieve ships for given params and order if required.
+
+        Only references to the matching records are collected up front, each
+        ship is serialized as it is consumed. Bad arguments are reported
+        straight away rather than once the ships are consumed.
+
+        Args:
+            id (`obj`:int, optional): The ID of the given ship to be retrieved.
+            ids (`obj`:list, optional): A list of IDs of ships to be retrieved.
+            user_ids (`obj`:list, optional): A list of user IDs whos ships
+                need to be retrieved.
+            status (`obj`:string, optional): The status of ships to be
+                retrieved.
+            search (`obj`:str, optional): Only ships whose ``name`` or
+                ``imo_number`` holds this text, ignoring case.
+            order_by (`obj`:str, optional): The field on which to sort the
+                retrieved ships by.
+            fields (`obj`:list, optional): The names of the fields to return,
+                all of them by default.
+
+        Returns:
+            generator: Serialized ship objects.
+        """
+        fields = select_fields(fields)
+        sort_key, descending = self._sort_key(order_by)
+
+        with self._lock:
+            ships = self._filter_records(id, ids, user_ids, status, search)
+
+        ships.sort(key=sort_key, reverse=descending)
+
+        return self._stream_records(ships, fields)
+
+    def retrieve_fleet_stats(self, user_ids=None):
+        """ Count the ships of each user by status.
+
+        The counts are kept up to date by every write, no ship is looked at.
+
+        Args:
+            user_ids (`obj`:list, optional): The users to count the ships of,
+                every user with ships by default.
+
+        Returns:
+            dict: ``{user_id: {status: count}}``, users without ships have
+                no counts.
+        """
+        with self._lock:
+            if not user_ids:
+                return {
+                    user_id: dict(counts)
+                    for user_id, counts in self._status_counts.items()
+                }
+
+            return {
+                user_id: dict(self._status_counts.get(user_id, {}))
+                for user_id in map(self._normalize_key, user_ids)
+            }
+
+    def retrieve_changes(
+        self,
+        since=None,
+        user_ids=None,
+        limit=None,
+        fields=None,
+    ):
+        """ Retrieve the ships written after a cursor, in the order they
+        were written, ships set to ``DELETED`` included.
+
+        The change log is searched for the cursor, so only the changes made
+        since are looked at.
+
+        Args:
+            since (`obj`:tuple, optional): A ``(modified, id)`` cursor taken
+                from the last ship of the previous call. Every ship is
+                returned without it.
+            user_ids (`obj`:list, optional): A list of user IDs whos ships
+                need to be retrieved.
+            limit (`obj`:int, optional): The maximum number of ships to
+                return.
+            fields (`obj`:list, optional): The names of the fields to return,
+                all of them by default.
+
+        Returns:
+            list: Serialized ships, ordered by ``modified`` then ``id``.
+        """
+        fields = select_fields(fields)
+
+        if user_ids:
+            user_ids = {self._normalize_key(user_id) for user_id in user_ids}
+
+        ships = []
+        with self._lock:
+            changes = self._changes
+            start = 0
+            if since is not None:
+                start = bisect.bisect_right(changes, tuple(since))
+
+            previous = None
+            for position in range(start, len(changes)):
+                if limit is not None and len(ships) >= int(limit):
+                    break
+
+                change = changes[position]
+                if change == previous:
+                    continue
+                previous = change
+
+                modified, ship_id = change
+                ship = self._ships.get(ship_id)
+                # Skip changes which were overwritten by a later one.
+                if ship is None or ship.modified != modified:
+                    continue
+
+                if user_ids and ship.user_id not in user_ids:
+                    continue
+
+                ships.append(self._serialize_ship(ship, fields))
+
+        return ships
+
+    def _stream_records(self, ships, fields):
+        for ship in ships:
+            with self._lock:
+                serialized_ship = self._serialize_ship(ship, fields)
+            yield serialized_ship
+
+    def update_ship(self, id, **kwargs):
+        """ Update details of a ship.
+
+        Args:
+            id (int): The ID of the ship to be updated
+            kwargs (dict): Key-value pair that we use to setattr() to ship
+                before saving it.
+
+        Returns:
+            dict: A serialized ship object that has been updated in storage.
+
+        Raises:
+            NotFoundException: If the ship was not found.
+            DuplicateError: If the new IMO is already used by the owner.
+        """
+        with self._lock:
+            ship = self._ships.get(self._normalize_key(id))
+            if ship is None:
+                raise NotFoundException
+
+            changes = self._clean_changes(kwargs)
+            if (
+                'imo_number' in changes and
+                changes['imo_number'] != ship.imo_number and
+                changes['imo_number'] in self._unique_index[ship.user_id]
+            ):
+                raise DuplicateError((changes['imo_number'], ship.user_id))
+
+            self._apply_changes(ship, changes, timezone.now())
+            ship = self._serialize_ship(ship)
+
+        self._maybe_snapshot()
+        return ship
+
+    def update_ships(self, ids, user_ids=None, **kwargs):
+        """ Apply the same changes to many ships at once.
+
+        Args:
+            ids (list): The IDs of the ships to be updated. Unknown IDs are
+                skipped.
+            user_ids (`obj`:list, optional): Only update ships owned by these
+                users.
+            kwargs (dict): Key-value pairs to set on every ship.
+
+        Returns:
+            int: The number of ships updated.
+
+        Raises:
+            DuplicateError: If the changes would give an owner two ships with
+                the same IMO. No ship is updated in that case.
+        """
+        changes = self._clean_changes(kwargs)
+
+        with self._lock:
+            ships = self._filter_records(ids=ids, user_ids=user_ids)
+
+            if 'imo_number' in changes:
+                imo_number = changes['imo_number']
+                owners = set()
+                for ship in ships:
+                    owned = self._unique_index[ship.user_id]
+                    if (
+                        ship.user_id in owners or
+                        owned.get(imo_number, ship.id) != ship.id
+                    ):
+                        raise DuplicateError((imo_number, ship.user_id))
+                    owners.add(ship.user_id)
+
+            now = timezone.now()
+            for ship in ships:
+                self._apply_changes(ship, dict(changes), now)
+
+        self._maybe_snapshot()
+        return len(ships)
+
+    def _clean_changes(self, kwargs):
+        """ Drop the keys of an update which can't be changed.
+
+        Unknown keys are ignored, in the same way that the django storage
+        ignores attributes which are not model fields.
+
+        Returns:
+            dict: The changes to apply.
+        """
+        if 'user_id' in kwargs:
+            logger.debug('Cannot change the owner of the ship.')
+
+        return {
+            key: value for key, value in kwargs.items()
+            if key in self.FIELDS and key not in self.READ_ONLY_FIELDS
+        }
+
+    def _apply_changes(self, ship, changes, modified):
+        """ Journal changes to a ``ShipRecord`` and apply them to it and to
+        the indexes.
+
+        Callers must hold the storage lock and have checked the unique index.
+        """
+        if 'status' in changes:
+            changes['status'] = self._intern(changes['status'])
+
+        changes['modified'] = modified
+
+        # The write is logged before any index changes, so a failed append
+        # leaves the storage as it was.
+        if self._journal is not None:
+            updated = ShipRecord(**self._serialize_ship(ship))
+            for key, value in changes.items():
+                setattr(updated, key, value)
+            self._journal.append(updated)
+
+        if (
+            'imo_number' in changes and
+            changes['imo_number'] != ship.imo_number
+        ):
+            owned = self._unique_index[ship.user_id]
+            del owned[ship.imo_number]
+            owned[changes['imo_number']] = ship.id
+
+        if 'status' in changes and changes['status'] != ship.status:
+            self._index_discard(self._status_index, ship.status, ship.id)
+            self._index_add(self._status_index, changes['status'], ship.id)
+            self._count_status(ship.user_id, ship.status, -1)
+            self._count_status(ship.user_id, changes['status'], 1)
+
+        searched = 'name' in changes or 'imo_number' in changes
+        if searched:
+            trigrams = self._ship_trigrams(ship)
+
+        for key, value in changes.items():
+            setattr(ship, key, value)
+
+        if searched:
+            new_trigrams = self._ship_trigrams(ship)
+            for trigram in trigrams - new_trigrams:
+                self._index_discard(self._search_index, trigram, ship.id)
+            for trigram in new_trigrams - trigrams:
+                self._index_add(self._search_index, trigram, ship.id)
+
+        self._record_write(ship)
+
+    def _record_write(self, ship, log_change=True):
+        """ Bump the versions and log the change of a ship just written.
+
+        Callers must hold the storage lock.
+        """
+        modified = ship.modified
+        self._version += 1
+        self._user_versions[ship.user_id] = (self._version, modified)
+        if self._last_modified is None or modified > self._last_modified:
+            self._last_modified = modified
+
+        if not log_change:
+            return
+
+        change = (modified, ship.id)
+        if self._changes and change < self._changes[-1]:
+            # The clock went back.
+            bisect.insort(self._changes, change)
+        else:
+            self._changes.append(change)
+
+        if len(self._changes) > 2 * len(self._ships) + 1024:
+            self._compact_changes()
+
+    def _compact_changes(self):
+        """ Rebuild the change log from the latest change of every ship. """
+        self._changes = sorted(
+            (ship.modified, ship.id) for ship in self._ships.values()
+        )
+
+    def delete_ship(self, id):
+        """ Set the ship's status to ``DELETED``.
+
+        Args:
+            id (int): The ID of the ship's status to set to DELETED
 
         Raises:
             NotFoundException: If the ship was not found.
         """
         return self.update_ship(id=id, status='DELETED')
+
+    def delete_ships(self, ids, user_ids=None):
+        """ Set the status of many ships to ``DELETED`` at once.
+
+        Args:
+            ids (list): The IDs of the ships to set to DELETED.
+            user_ids (`obj`:list, optional): Only delete ships owned by these
+                users.
+
+        Returns:
+            int: The number of ships deleted.
+        """
+        return self.update_ships(ids, user_ids=user_ids, status='DELETED')
+
+
+class CountCache:
+
+    """
+    The number of ships matching each query of ``retrieve_ships``, kept
+    until a write to the ships of one of the users it concerns, or to any
+    ship for queries not filtered by owner, or until the TTL runs out.
+
+    A count taken while a write is under way is not kept, as it may predate
+    the write. Writes made by other processes are not seen until the TTL runs
+    out.
+    """
+
+    # Tag for counts which are not filtered by owner, every write drops
+    # them.
+    ALL = object()
+
+    def __init__(self, max_entries=1024, ttl=30):
+        """
+        Args:
+            max_entries (`obj`:int, optional): Maximum number of counts kept.
+            ttl (`obj`:float, optional): Seconds a count stays valid.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            # {key: (expires, count, tags)}, oldest first.
+            self._entries = OrderedDict()
+            # {tag: {key: None}}
+            self._tags = {}
+            self._generation = getattr(self, '_generation', 0) + 1
+
+    @staticmethod
+    def _normalize_key(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return value
+
+    def key(self, id=None, ids=None, user_ids=None, **filters):
+        """ Normalize the filters of a query in to the key of its count.
+
+        Returns:
+            tuple: (tuple, list) - The key and the tags of the count.
+        """
+        user_ids = tuple(sorted(
+            {self._normalize_key(user_id) for user_id in user_ids or ()}
+        ))
+        ids = tuple(sorted(
+            {self._normalize_key(ship_id) for ship_id in ids or ()}
+        ))
+        key = (self._normalize_key(id) if id else None, ids, user_ids) + tuple(
+            (name, filters[name])
+            for name in sorted(filters)
+            if filters[name] is not None
+        )
+        return key, [('user', user_id) for user_id in user_ids] or [self.ALL]
+
+    @property
+    def generation(self):
+        """ Changes with every write, take it before counting and hand it
+        to ``set``.
+        """
+        return self._generation
+
+    def get(self, key):
+        """
+        Returns:
+            int: The count of the query, ``None`` if it isn't known.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, tags, count, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, count, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, {})[key] = None
+
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        __, __, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.pop(key, None)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate(self, user_ids=None):
+        """ Drop the counts a write to the ships of ``user_ids`` may have
+        changed, every count when they aren't known.
+        """
+        if user_ids is None:
+            self.clear()
+            return
+
+        with self._lock:
+            self._generation += 1
+            tags = {self.ALL}
+            tags.update(
+                ('user', self._normalize_key(user_id)) for user_id in user_ids
+            )
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._drop(key)
+
+
+class ShipDjangoStorage:
+
+    ship_model = Ship
+
+    # Number of ships of each user by status, kept up to date by every write
+    # in the same transaction, see ``retrieve_fleet_stats``.
+    stats_model = ShipStatusCount
+
+    INTEGRITY_ERROR_ARG = (
+        'UNIQUE constraint failed: ship_ship.imo_number, ship_ship.user_id'
+    )
+
+    # Maximum number of values in a single ``__in`` lookup.
+    QUERY_BATCH_SIZE = 500
+
+    UPDATABLE_FIELDS = ('imo_number', 'name', 'notes', 'status')
+
+    # SQLite FTS5 table of the trigrams of ``name`` and ``imo_number``, kept
+    # in sync with the ships by triggers, see ``0004_ship_search``. Databases
+    # without it are searched by scanning.
+    SEARCH_TABLE = 'ship_ship_search'
+
+    # Whether each database alias has the ``SEARCH_TABLE``.
+    _search_tables = {}
+
+    # Changes to these fields may move a ship in or out of the results of a
+    # query, the cached counts of its owner are dropped.
+    COUNTED_FIELDS = ('imo_number', 'name', 'status')
+
+    def __init__(self, using=None, count_cache_ttl=30):
+        """
+        Args:
+            using (`obj`:str, optional): The alias of the database holding
+                the ships, picked by the database routers by default.
+            count_cache_ttl (`obj`:float, optional): Seconds the counts of
+                ``COUNT_CACHED`` stay valid, which bounds how long the writes
+                of other processes go unseen.
+        """
+        self.using = using
+        self.counts = CountCache(ttl=count_cache_ttl)
+
+    @property
+    def objects(self):
+        return self.ship_model.objects.db_manager(self.using)
+
+    @property
+    def stats(self):
+        return self.stats_model.objects.db_manager(self.using)
+
+    def wipe(self):
+        """ Used during testing to ensure each unittest is indepedent. """
+        self.objects.all().delete()
+        self.stats.all().delete()
+        self.counts.clear()
+
+    def _invalidate_counts(self, user_ids=None):
+        """ Drop the cached counts of ``user_ids`` once the write commits,
+        so that no count taken in between outlives it.
+        """
+        transaction.on_commit(
+            lambda: self.counts.invalidate(user_ids), using=self.using,
+        )
+
+    def _count_ships(self, changes):
+        """ Add to the fleet statistics, within the transaction of the write
+        they count.
+
+        Args:
+            changes (dict): ``{(user_id, status): number}`` of ships to add,
+                negative to remove.
+        """
+        for (user_id, status), number in sorted(changes.items()):
+            if not number:
+                continue
+
+            counts = self.stats.filter(user_id=user_id, status=status)
+            if counts.update(count=F('count') + number):
+                continue
+
+            try:
+                with transaction.atomic(using=self.using):
+                    self.stats.create(
+                        user_id=user_id, status=status, count=number,
+                    )
+            except IntegrityError:
+                # Another writer counted the user's first ship of the status.
+                counts.update(count=F('count') + number)
+
+    @staticmethod
+    def _serialize_ship(obj):
+        """ Serialize a ship object in to a ``dict`` object.
+
+        Args:
+            obj (`obj`:Ship): A ship object that exists in the database.
+
+        Returns:
+            dict: A serialized ship object.
+        """
+        return {
+            'created': obj.created,
+            'id': obj.id,
+            'imo_number': obj.imo_number,
+            'modified': obj.modified,
+            'name': obj.name,
+            'notes': obj.notes,
+            'status': obj.status,
+            'user_id': obj.user_id,
+        }
+
+    def _filter_queryset(  # pylint: disable=too-many-arguments
+            self,
+            id=None,
+            ids=None,
+            user_ids=None,
+            status=None,
+            search=None,
+    ):
+        """ Build the queryset of ships matching the given filters. """
+        ships = self.objects.all()
+        # The ``SEARCH_TABLE`` answers any term with a trigram, whatever the
+        # other filters, which then only check the ships it finds.
+        indexed = bool(
+            search_trigrams(search) and self._has_search_table(ships.db)
+        )
+
+        if id:
+            ships = ships.filter(id=id)
+
+        if ids:
+            ships = ships.filter(id__in=ids)
+
+        if user_ids:
+            if indexed:
+                ships = self._check_column(ships, 'user_id', user_ids)
+            else:
+                ships = ships.filter(user_id__in=user_ids)
+
+        if status:
+            if indexed:
+                ships = self._check_column(ships, 'status', [status])
+            else:
+                ships = ships.filter(status=status)
+
+        if indexed:
+            # ``id__in=RawSQL(...)`` would wrap the subquery in a second
+            # pair of brackets, which SQLite reads as a single value.
+            ships = ships.extra(
+                where=[
+                    '{ships}.id IN (SELECT rowid FROM {table} '
+                    'WHERE {table} MATCH %s)'.format(
+                        ships=self.ship_model._meta.db_table,
+                        table=self.SEARCH_TABLE,
+                    )
+                ],
+                # A quoted phrase, matched as a substring by the trigrams.
+                params=['"{}"'.format(search.replace('"', '""'))],
+            )
+        elif search:
+            # Terms shorter than a trigram scan the ships the filters leave.
+            ships = ships.filter(
+                Q(name__icontains=search) | Q(imo_number__icontains=search)
+            )
+
+        return ships
+
+    def _check_column(self, ships, column, values):
+        """ Filter ships on ``column`` without using its index. SQLite
+        plans without statistics and would rather walk every ship of a user
+        or status through the index than look up the ships a search found.
+        A unary ``+`` keeps it from using the index.
+        """
+        return ships.extra(
+            where=['+{ships}.{column} IN ({values})'.format(
+                ships=self.ship_model._meta.db_table,
+                column=column,
+                values=', '.join(['%s'] * len(values)),
+            )],
+            params=list(values),
+        )
+
+    @classmethod
+    def _has_search_table(cls, alias):
+        if alias not in cls._search_tables:
+            connection = connections[alias]
+            cls._search_tables[alias] = (
+                connection.vendor == 'sqlite' and
+                cls.SEARCH_TABLE in connection.introspection.table_names()
+            )
+        return cls._search_tables[alias]
+
+    def persist_ship(
+        self,
+        name,
+        imo_number,
+        user_id,
+        status='ACTIVE',
+        notes=None,
+        id=None,
+    ):
+        """ Persists the ship into storage.
+
+        Args:
+            name (str): The name of the ship.
+            imo_number (str): A 7 digit string for the ship's IMO.
+            user_id (str): The ID of the user who owns the ship.
+            status (`obj`:str, optional): An optional status string. Defaults
+                to ``ACTIVE``.
+            notes (`obj`:str, optional): An optional string to add notes to the
+                ship.
+            id (`obj`:int, optional): The primary key, picked by the database
+                by default.
+
+        Returns:
+            dict: Serialized ship object which is now in the storage.
+        """
+        try:
+            with transaction.atomic(using=self.using):
+                ship = self.objects.create(
+                    id=id,
+                    name=name,
+                    imo_number=imo_number,
+                    user_id=user_id,
+                    status=status,
+                    notes=notes,
+                )
+                self._count_ships({(ship.user_id, ship.status): 1})
+        except Exception as err:  # pylint: disable=broad-except
+            logger.exception('Oops something went wrong persisting a ship.')
+            if (
+                isinstance(err, IntegrityError) and
+                err.args == (self.INTEGRITY_ERROR_ARG,)
+            ):
+                raise DuplicateError(err)
+            else:
+                raise err
+
+        self._invalidate_counts([ship.user_id])
+        return self._serialize_ship(ship)
+
+    def persist_ships(self, ships):
+        """ Persists a batch of ships into storage in one transaction.
+
+        A duplicate only fails its own row, the rest of the batch is still
+        persisted.
+
+        Args:
+            ships (list): Dicts holding the keyword arguments of
+                ``persist_ship`` for each ship.
+
+        Returns:
+            list: One entry per ship, in the same order. Either the serialized
+                ship or the ``DuplicateError`` raised for it.
+        """
+        results = [None] * len(ships)
+        keys = [
+            (data['imo_number'], int(data['user_id'])) for data in ships
+        ]
+
+        with transaction.atomic(using=self.using):
+            taken = set(self._existing_keys(keys))
+
+            new_ships = []
+            for index, (key, data) in enumerate(zip(keys, ships)):
+                if key in taken:
+                    results[index] = DuplicateError(key)
+                    continue
+
+                taken.add(key)
+                new_ships.append(self.ship_model(
+                    id=data.get('id'),
+                    name=data['name'],
+                    imo_number=data['imo_number'],
+                    user_id=data['user_id'],
+                    status=data.get('status', 'ACTIVE'),
+                    notes=data.get('notes'),
+                ))
+
+            try:
+                with transaction.atomic(using=self.using):
+                    self.objects.bulk_create(new_ships)
+            except IntegrityError:
+                # Another writer got in between our duplicate check and the
+                # insert, fall back to finding the duplicates one at a time.
+                logger.info('Bulk insert of ships raced, retrying per ship.')
+                for ship in new_ships:
+                    try:
+                        with transaction.atomic(using=self.using):
+                            ship.save(force_insert=True, using=self.using)
+                    except IntegrityError as err:
+                        if err.args != (self.INTEGRITY_ERROR_ARG,):
+                            raise
+                        key = (ship.imo_number, int(ship.user_id))
+                        results[keys.index(key)] = DuplicateError(key)
+
+            # SQLite doesn't hand back the primary keys of a bulk insert, so
+            # read the new rows back in one query.
+            created = {
+                (ship.imo_number, ship.user_id): ship
+                for ship in self._existing_keys(keys, rows=True)
+            }
+
+            counts = {}
+            for index, key in enumerate(keys):
+                if results[index] is None:
+                    ship = created[key]
+                    results[index] = self._serialize_ship(ship)
+                    count_key = (ship.user_id, ship.status)
+                    counts[count_key] = counts.get(count_key, 0) + 1
+            self._count_ships(counts)
+
+        self._invalidate_counts({user_id for user_id, __ in counts})
+        return results
+
+    def _existing_keys(self, keys, rows=False):
+        """ Find which ``(imo_number, user_id)`` keys are already stored.
+
+        Args:
+            keys (list): ``(imo_number, user_id)`` tuples.
+            rows (`obj`:bool, optional): Return the ships rather than keys.
+
+        Returns:
+            iterable: The stored keys, or ships, out of ``keys``.
+        """
+        keys = set(keys)
+        imo_numbers = sorted({imo_number for imo_number, __ in keys})
+        user_ids = {user_id for __, user_id in keys}
+
+        found = []
+        # Keep under SQLite's limit on the number of query parameters.
+        for start in range(0, len(imo_numbers), self.QUERY_BATCH_SIZE):
+            ships = self.objects.filter(
+                imo_number__in=imo_numbers[
+                    start:start + self.QUERY_BATCH_SIZE
+                ],
+                user_id__in=user_ids,
+            )
+            if not rows:
+                ships = ships.values_list('imo_number', 'user_id')
+
+            for ship in ships:
+                key = (ship.imo_number, ship.user_id) if rows else ship
+                if key in keys:
+                    found.append(ship)
+
+        return found
+
+    def retrieve_fleet_stats(self, user_ids=None):
+        """ Count the ships of each user by status.
+
+        The counts are read from ``stats_model``, one row per user and
+        status, rather than counting the ships.
+
+        Args:
+            user_ids (`obj`:list, optional): The users to count the ships of,
+                every user with ships by default.
+
+        Returns:
+            dict: ``{user_id: {status: count}}``, users without ships have
+                no counts.
+        """
+        stats = {}
+        counts = self.stats.filter(count__gt=0)
+        if user_ids:
+            stats = {int(user_id): {} for user_id in user_ids}
+            counts = counts.filter(user_id__in=stats)
+
+        for user_id, status, count in counts.values_list(
+                'user_id', 'status', 'count',
+        ):
+            stats.setdefault(user_id, {})[status] = count
+        return stats
+
+    def retrieve_version(self, id=None, ids=None, user_ids=None, status=None):
+        """ Cheap validators of the ships matching the given filters, which
+        change whenever any of those ships does.
+
+        They come from one aggregate query, the number of ships and their
+        latest ``modified``, answered from the ``(user_id, modified)`` and
+        ``(status, modified)`` indexes. The number of ships catches a ship
+        leaving the filters, e.g. by changing status.
+
+        Args:
+            id (`obj`:int, optional): The ID of the given ship.
+            ids (`obj`:list, optional): A list of IDs of ships.
+            user_ids (`obj`:list, optional): A list of user IDs whos ships
+                are concerned.
+            status (`obj`:string, optional): The status of ships concerned.
+
+        Returns:
+            tuple: (str, datetime) - An opaque version, equal for two calls
+                only if none of the ships changed in between. The last time
+                one of the ships changed, ``None`` if there are none.
+        """
+        validators = self._filter_queryset(
+            id, ids, user_ids, status,
+        ).aggregate(count=Count('id'), modified=Max('modified'))
+
+        last_modified = validators['modified']
+        version = '{}-{}'.format(
+            validators['count'],
+            last_modified.isoformat() if last_modified else '',
+        )
+        return version, last_modified
+
+    def retrieve_ships(
+        self,
+        id=None,
+        ids=None,
+        user_ids=None,
+        status=None,
+        search=None,
+        order_by=None,
+        limit=None,
+        offset=None,
+        cursor=None,
+        fields=None,
+        include_count=True,
+    ):
+        """ Retrieve a list of ships for given params and order if required.
+
+        Args:
+            id (`obj`:int, optional): The ID of the given ship to be retrieved.
+            ids (`obj`:list, optional): A list of IDs of ships to be retrieved.
+            user_ids (`obj`:list, optional): A list of user IDs whos ships
+                need to be retrieved.
+            status (`obj`:string, optional): The status of ships to be
+                retrieved.
+            search (`obj`:str, optional): Only ships whose ``name`` or
+                ``imo_number`` holds this text, ignoring case.
+            order_by (`obj`:str, optional): The field on which to sort the
+                retrieved ships by. Ties are broken on ``id``.
+            limit (`obj`:int, optional): The maximum number of ships to
+                return.
+            offset (`obj`:int, optional): The number of ships to skip.
+            cursor (`obj`:tuple, optional): A ``(value, id)`` keyset cursor,
+                the ``order_by`` value and ID of the last ship of the previous
+                page. Only ships after it are returned.
+            fields (`obj`:list, optional): The names of the fields to return,
+                all of them by default.
+            include_count (`obj`:bool, optional): How to count the ships
+                found, one of the ``COUNT_STRATEGIES``. ``True`` is
+                ``COUNT_EXACT`` and ``False`` doesn't count them.
+
+        Returns:
+            tuple: (list, int) - List of serialized ship objects. Int the total
+                count of ship objects found, ignoring ``limit``, ``offset``
+                and ``cursor``, or ``None`` when they aren't counted.
+        """
+        fields = select_fields(fields)
+        ships = self._filter_queryset(id, ids, user_ids, status, search)
+        page = self._page_queryset(ships, order_by, limit, offset, cursor)
+
+        if fields is not None:
+            # Only the requested columns are read and no models are built.
+            serialized_ships = list(page.values(*fields))
+        else:
+            serialized_ships = [self._serialize_ship(ship) for ship in page]
+
+        if not include_count:
+            return serialized_ships, None
+
+        if include_count in (COUNT_PAGE, COUNT_CACHED):
+            total_count = page_count(
+                len(serialized_ships), limit, offset, cursor,
+            )
+            if total_count is not None:
+                return serialized_ships, total_count
+
+        if include_count != COUNT_CACHED:
+            return serialized_ships, ships.count()
+
+        key, tags = self.counts.key(
+            id, ids, user_ids, status=status, search=search,
+        )
+        total_count = self.counts.get(key)
+        if total_count is None:
+            generation = self.counts.generation
+            total_count = ships.count()
+            self.counts.set(key, tags, total_count, generation)
+
+        return serialized_ships, total_count
+
+    def retrieve_changes(
+        self,
+        since=None,
+        user_ids=None,
+        limit=None,
+        fields=None,
+    ):
+        """ Retrieve the ships written after a cursor, in the order they
+        were written, ships set to ``DELETED`` included. Takes the same
+        arguments and returns the same as
+        ``ShipPureMemoryStorage.retrieve_changes``.
+
+        The cursor is a keyset on the ``modified`` index, or on the
+        ``(user_id, modified)`` one for the ships of some users.
+        """
+        fields = select_fields(fields)
+        ships = self._page_queryset(
+            self._filter_queryset(user_ids=user_ids),
+            'modified',
+            limit=limit,
+            cursor=since,
+        )
+
+        if fields is not None:
+            return list(ships.values(*fields))
+
+        return [self._serialize_ship(ship) for ship in ships]
+
+    @staticmethod
+    def _page_queryset(ships, order_by, limit=None, offset=None, cursor=None):
+        """ Order and slice a queryset built by ``_filter_queryset`` down to
+        the requested page. Arguments are as for ``retrieve_ships``.
+        """
+        field, descending = select_order(order_by, cursor)
+
+        if cursor is not None:
+            value, cursor_id = cursor
+            lookup = 'lt' if descending else 'gt'
+            ships = ships.filter(
+                Q(**{'{}__{}'.format(field, lookup): value}) |
+                Q(**{field: value, 'id__{}'.format(lookup): cursor_id})
+            )
+            if field != 'id':
+                # The OR above can't seek an index, the range can.
+                ships = ships.filter(
+                    **{'{}__{}e'.format(field, lookup): value}
+                )
+
+        if order_by:
+            ships = ships.order_by(order_by, '-id' if descending else 'id')
+        elif limit is not None or offset or cursor is not None:
+            # Slicing needs a stable order.
+            ships = ships.order_by('id')
+
+        offset = int(offset or 0)
+        if limit is not None:
+            ships = ships[offset:offset + int(limit)]
+        elif offset:
+            ships = ships[offset:]
+
+        return ships
+
+    def stream_ships(
+        self,
+        id=None,
+        ids=None,
+        user_ids=None,
+        status=None,
+        search=None,
+        order_by=None,
+        fields=None,
+    ):
+        """ Lazily retrieve ships for given params and order if required.
+
+        Rows are read from the database in chunks, so memory use does not
+        grow with the number of ships.
+
+        Args:
+            id (`obj`:int, optional): The ID of the given ship to be retrieved.
+            ids (`obj`:list, optional): A list of IDs of ships to be retrieved.
+            user_ids (`obj`:list, optional): A list of user IDs whos ships
+                need to be retrieved.
+            status (`obj`:string, optional): The status of ships to be
+                retrieved.
+            search (`obj`:str, optional): Only ships whose ``name`` or
+                ``imo_number`` holds this text, ignoring case.
+            order_by (`obj`:str, optional): The field on which to sort the
+                retrieved ships by.
+            fields (`obj`:list, optional): The names of the fields to return,
+                all of them by default.
+
+        Returns:
+            generator: Serialized ship objects.
+        """
+        fields = select_fields(fields)
+        __, descending = select_order(order_by)
+        ships = self._filter_queryset(id, ids, user_ids, status, search)
+
+        if order_by:
+            ships = ships.order_by(order_by, '-id' if descending else 'id')
+        else:
+            ships = ships.order_by('id')
+
+        if fields is not None:
+            # Only the requested columns are read and no models are built.
+            return ships.values(*fields).iterator()
+
+        return (self._serialize_ship(ship) for ship in ships.iterator())
+
+    def update_ship(self, id, **kwargs):
+        """ Update details of a ship.
+
+        Args:
+            id (int): The ID of the ship to be updated
+            kwargs (dict): Key-value pair that we use to setattr() to ship
+                before saving it.
+
+        Returns:
+            dict: A serialized ship object that has been updated in storage.
+
+        Raises:
+            NotFoundException: If the ship was not found.
+        """
+        changes = self._clean_changes(kwargs)
+        # The fleet statistics move the ship from the status it was read
+        # with, so the write only applies if it still has that status. When
+        # another writer changed it in between, which means that writer
+        # went through, the ship is read again.
+        while True:
+            with transaction.atomic(using=self.using):
+                try:
+                    ship = self.objects.select_for_update().get(id=id)
+                except self.ship_model.DoesNotExist:
+                    raise NotFoundException
+
+                status = ship.status
+                # Only the columns which can be changed are set and written,
+                # so the ship returned is the one which was stored.
+                for key, value in changes.items():
+                    setattr(ship, key, value)
+                ship.modified = timezone.now()
+
+                written = self.objects.filter(id=id, status=status).update(
+                    modified=ship.modified, **changes
+                )
+                if written:
+                    if ship.status != status:
+                        self._count_ships({
+                            (ship.user_id, status): -1,
+                            (ship.user_id, ship.status): 1,
+                        })
+                    break
+
+        if set(changes).intersection(self.COUNTED_FIELDS):
+            self._invalidate_counts([ship.user_id])
+        return self._serialize_ship(ship)
+
+    def update_ships(self, ids, user_ids=None, **kwargs):
+        """ Apply the same changes to many ships at once.
+
+        Each batch of IDs is a single ``UPDATE ... WHERE id IN (...)``.
+
+        Args:
+            ids (list): The IDs of the ships to be updated. Unknown IDs are
+                skipped.
+            user_ids (`obj`:list, optional): Only update ships owned by these
+                users.
+            kwargs (dict): Key-value pairs to set on every ship.
+
+        Returns:
+            int: The number of ships updated.
+
+        Raises:
+            DuplicateError: If the changes would give an owner two ships with
+                the same IMO. No ship is updated in that case.
+        """
+        changes = self._clean_changes(kwargs)
+        changes['modified'] = timezone.now()
+
+        ids = list(ids)
+        updated = 0
+        counts = {}
+        try:
+            with transaction.atomic(using=self.using):
+                for start in range(0, len(ids), self.QUERY_BATCH_SIZE):
+                    ships = self.objects.filter(
+                        id__in=ids[start:start + self.QUERY_BATCH_SIZE],
+                    )
+                    if user_ids:
+                        ships = ships.filter(user_id__in=user_ids)
+                    if 'status' in changes:
+                        updated += self._move_ships(ships, changes, counts)
+                    else:
+                        updated += ships.update(**changes)
+                self._count_ships(counts)
+        except IntegrityError as err:
+            if err.args == (self.INTEGRITY_ERROR_ARG,):
+                raise DuplicateError(err)
+            raise
+
+        if updated and set(changes).intersection(self.COUNTED_FIELDS):
+            self._invalidate_counts(user_ids)
+        return updated
+
+    def _clean_changes(self, kwargs):
+        """ Drop the keys of an update which are not changeable columns.
+
+        Returns:
+            dict: The changes to apply.
+        """
+        if 'user_id' in kwargs:
+            logger.debug('Cannot change the owner of the ship.')
+
+        return {
+            key: value for key, value in kwargs.items()
+            if key in self.UPDATABLE_FIELDS
+        }
+
+    @staticmethod
+    def _move_ships(ships, changes, counts):
+        """ Apply changes which set the status of ``ships``, adding the
+        ships which moved to the changes of the fleet statistics, see
+        ``_count_ships``.
+
+        The ships are updated by owner and current status, each update only
+        applying to the ships still in that status, so the ships counted as
+        moved are the ones which did.
+
+        Returns:
+            int: The number of ships updated.
+        """
+        status = changes['status']
+        updated = 0
+        for user_id, old_status in ships.values_list(
+                'user_id', 'status',
+        ).distinct().order_by():
+            moved = ships.filter(
+                user_id=user_id, status=old_status,
+            ).update(**changes)
+            updated += moved
+            if old_status != status:
+                for key, number in (
+                        ((user_id, old_status), -moved),
+                        ((user_id, status), moved),
+                ):
+                    counts[key] = counts.get(key, 0) + number
+        return updated
+
+    def delete_ship(self, id):
+        """ Set the ship's status to ``DELETED``.
+
+        Args:
+            id (int): The ID of the ship's status to set to DELETED
+
+        Raises:
+            NotFoundException: If the ship was not found.
+        """
+        return self.update_ship(id=id, status='DELETED')
+
+    def delete_ships(self, ids, user_ids=None):
+        """ Set the status of many ships to ``DELETED`` at once.
+
+        Args:
+            ids (list): The IDs of the ships to set to DELETED.
+            user_ids (`obj`:list, optional): Only delete ships owned by these
+                users.
+
+        Returns:
+            int: The number of ships deleted.
+        """
+        return self.update_ships(ids, user_ids=user_ids, status='DELETED')
+
+
+class ShardedShipStorage:
+
+    """
+    Partitions ships by ``user_id`` across the databases named in the
+    ``SHIP_SHARDS`` setting, each shard held by a ``ShipDjangoStorage``. The
+    shard of a user is picked by the database routers, see
+    ``ship.routers.ShipShardRouter``.
+
+    A query for the ships of a single user only goes to that user's shard.
+    Any other query is sent to every shard it may concern at once, and their
+    pages are merged in ``order_by`` order.
+
+    IDs are handed out here rather than by the shards, as
+    ``sequence * len(shards) + shard_index``: they grow in creation order
+    across shards like those of a single database, and tell which shard the
+    ship is on. The sequence carries on from the highest ID stored when the
+    storage is first written to.
+
+    Writes to several shards are not atomic across shards.
+    """
+
+    ship_model = Ship
+
+    # Times an insert is retried when another process took its ID.
+    id_retries = 3
+
+    def __init__(self, max_workers=None):
+        """
+        Args:
+            max_workers (`obj`:int, optional): The number of threads queries
+                are fanned out on, one per shard by default.
+
+        Raises:
+            ImproperlyConfigured: If there are no ``SHIP_SHARDS``.
+        """
+        self.shards = tuple(settings.SHIP_SHARDS)
+        if not self.shards:
+            raise ImproperlyConfigured(
+                'ShardedShipStorage needs the databases of SHIP_SHARDS.'
+            )
+        self.storages = [
+            ShipDjangoStorage(using=alias) for alias in self.shards
+        ]
+        self.executor = ThreadPoolExecutor(max_workers or len(self.shards))
+        self._id_lock = threading.Lock()
+        self._next_sequence = None
+
+    def wipe(self):
+        """ Used during testing to ensure each unittest is indepedent. """
+        for storage in self.storages:
+            storage.wipe()
+        with self._id_lock:
+            self._next_sequence = None
+
+    def _allocate_ids(self, indexes):
+        """ Hand out the IDs of new ships.
+
+        Args:
+            indexes (list): The shard index of every new ship.
+
+        Returns:
+            list: An ID on its shard for every new ship, in the same order.
+        """
+        count = len(self.shards)
+        with self._id_lock:
+            if self._next_sequence is None:
+                top = max(
+                    storage.objects.aggregate(top=Max('id'))['top'] or 0
+                    for storage in self.storages
+                )
+                self._next_sequence = top // count + 1
+
+            start = self._next_sequence
+            self._next_sequence += len(indexes)
+
+        return [
+            (start + offset) * count + index
+            for offset, index in enumerate(indexes)
+        ]
+
+    def _with_new_ids(self, insert):
+        """ Call ``insert`` until the IDs it was given are free.
+
+        Another process writing to the shards may take the IDs allocated
+        here, then the sequence is read again from the shards.
+        """
+        for attempt in range(self.id_retries + 1):
+            try:
+                return insert()
+            except IntegrityError as err:
+                if (
+                        err.args == (ShipDjangoStorage.INTEGRITY_ERROR_ARG,) or
+                        attempt == self.id_retries
+                ):
+                    raise
+                logger.info('Ship IDs taken by another writer, retrying.')
+                with self._id_lock:
+                    self._next_sequence = None
+
+    def _shard_for_user(self, user_id):
+        alias = router.db_for_write(self.ship_model, user_id=int(user_id))
+        if alias not in self.shards:
+            raise ImproperlyConfigured(
+                'Ships are routed to {!r} which is not one of SHIP_SHARDS, '
+                'is ShipShardRouter in DATABASE_ROUTERS?'.format(alias)
+            )
+        return self.shards.index(alias)
+
+    def _locate(self, id):
+        """
+        Returns:
+            int: The index of the shard a ship ID belongs to, or ``None`` if
+                it can't belong to any ship.
+        """
+        try:
+            id = int(id)
+        except (TypeError, ValueError):
+            return None
+
+        if id < len(self.shards):
+            return None
+        return id % len(self.shards)
+
+    def _route(self, id=None, ids=None, user_ids=None):
+        """ Work out the shards a query concerns.
+
+        Returns:
+            dict: The filters to send to each shard index, with only that
+                shard's IDs and users.
+        """
+        targets = set(range(len(self.shards)))
+        filters = {index: {} for index in targets}
+
+        if user_ids:
+            by_shard = {}
+            for user_id in user_ids:
+                by_shard.setdefault(
+                    self._shard_for_user(user_id), []
+                ).append(user_id)
+            for index, shard_user_ids in by_shard.items():
+                filters[index]['user_ids'] = shard_user_ids
+            targets.intersection_update(by_shard)
+
+        if ids:
+            by_shard = {}
+            for ship_id in ids:
+                index = self._locate(ship_id)
+                if index is not None:
+                    by_shard.setdefault(index, []).append(ship_id)
+            for index, shard_ids in by_shard.items():
+                filters[index]['ids'] = shard_ids
+            targets.intersection_update(by_shard)
+
+        if id:
+            index = self._locate(id)
+            if index is None:
+                return {}
+            filters[index]['id'] = id
+            targets.intersection_update([index])
+
+        return {index: filters[index] for index in sorted(targets)}
+
+    @staticmethod
+    def _run(call):
+        # Pool threads outlive any request, so they look after their own
+        # database connections the way Django does around a request.
+        close_old_connections()
+        try:
+            return call()
+        finally:
+            close_old_connections()
+
+    def _fan_out(self, calls):
+        """ Make calls on their shards at once.
+
+        Args:
+            calls (dict): Functions to call by shard index.
+
+        Returns:
+            dict: The result of every call by shard index.
+        """
+        if len(calls) <= 1:
+            return {index: call() for index, call in calls.items()}
+
+        futures = {
+            index: self.executor.submit(self._run, call)
+            for index, call in calls.items()
+        }
+        return {index: future.result() for index, future in futures.items()}
+
+    def persist_ship(self, **kwargs):
+        """ Persists the ship into the shard of its owner. Takes the same
+        arguments and returns the same as ``ShipDjangoStorage.persist_ship``.
+        """
+        index = self._shard_for_user(kwargs['user_id'])
+
+        def insert():
+            id, = self._allocate_ids([index])
+            return self.storages[index].persist_ship(id=id, **kwargs)
+
+        return self._with_new_ids(insert)
+
+    def persist_ships(self, ships):
+        """ Persists a batch of ships, in one transaction per shard.
+
+        Returns:
+            list: As for ``ShipDjangoStorage.persist_ships``.
+        """
+        indexes = [self._shard_for_user(data['user_id']) for data in ships]
+        positions = {}
+        for position, index in enumerate(indexes):
+            positions.setdefault(index, []).append(position)
+
+        def insert():
+            ids = self._allocate_ids(indexes)
+            return self._fan_out({
+                index: functools.partial(
+                    self.storages[index].persist_ships,
+                    [
+                        dict(ships[position], id=ids[position])
+                        for position in shard_positions
+                    ],
+                )
+                for index, shard_positions in positions.items()
+            })
+
+        batches = self._with_new_ids(insert)
+
+        results = [None] * len(ships)
+        for index, batch in batches.items():
+            for position, result in zip(positions[index], batch):
+                results[position] = result
+
+        return results
+
+    def retrieve_ships(
+        self,
+        id=None,
+        ids=None,
+        user_ids=None,
+        status=None,
+        search=None,
+        order_by=None,
+        limit=None,
+        offset=None,
+        cursor=None,
+        fields=None,
+        include_count=True,
+    ):
+        """ Retrieve a page of ships from the shards concerned. Takes the
+        same arguments and returns the same as
+        ``ShipDjangoStorage.retrieve_ships``.
+
+        Every shard returns the ships up to the end of the page, which are
+        merged before the page is cut out of them, and counts its own.
+        """
+        fields = select_fields(fields)
+        routes = self._route(id, ids, user_ids)
+        if not routes:
+            return [], 0 if include_count else None
+
+        field, descending = select_order(order_by, cursor)
+
+        # Merging needs the ordering field and ID of every ship.
+        extra_fields = ()
+        if fields is not None:
+            extra_fields = tuple({'id', field}.difference(fields))
+            fields += extra_fields
+
+        offset = int(offset or 0)
+        end = None if limit is None else offset + int(limit)
+
+        results = self._fan_out({
+            index: functools.partial(
+                self.storages[index].retrieve_ships,
+                status=status,
+                search=search,
+                order_by=order_by or 'id',
+                limit=end,
+                cursor=cursor,
+                fields=fields,
+                include_count=include_count,
+                **filters
+            )
+            for index, filters in routes.items()
+        })
+
+        pages = [page for page, __ in results.values()]
+        total_count = None
+        if include_count:
+            total_count = sum(count for __, count in results.values())
+
+        ships = list(heapq.merge(
+            *pages, key=self._merge_key(field), reverse=descending
+        ))[offset:end]
+
+        for ship in ships:
+            for extra_field in extra_fields:
+                del ship[extra_field]
+
+        return ships, total_count
+
+    def retrieve_version(self, id=None, ids=None, user_ids=None, status=None):
+        """ Validators of the ships from the shards concerned, made of
+        those of every shard. Takes the same arguments and returns the same as
+        ``ShipDjangoStorage.retrieve_version``.
+        """
+        routes = self._route(id, ids, user_ids)
+
+        results = self._fan_out({
+            index: functools.partial(
+                self.storages[index].retrieve_version,
+                status=status,
+                **filters
+            )
+            for index, filters in routes.items()
+        })
+
+        version = '/'.join(
+            '{}:{}'.format(index, results[index][0])
+            for index in sorted(results)
+        )
+        modified = [
+            last_modified for __, last_modified in results.values()
+            if last_modified is not None
+        ]
+        return version, max(modified, default=None)
+
+    def retrieve_fleet_stats(self, user_ids=None):
+        """ Count the ships of each user by status, from the shards of
+        ``user_ids`` only. A user's ships are all on one shard. Takes the same
+        arguments and returns the same as
+        ``ShipDjangoStorage.retrieve_fleet_stats``.
+        """
+        results = self._fan_out({
+            index: functools.partial(
+                self.storages[index].retrieve_fleet_stats, **filters
+            )
+            for index, filters in self._route(user_ids=user_ids).items()
+        })
+
+        stats = {}
+        for index in sorted(results):
+            stats.update(results[index])
+        return stats
+
+    def stream_ships(
+        self,
+        id=None,
+        ids=None,
+        user_ids=None,
+        status=None,
+        search=None,
+        order_by=None,
+        fields=None,
+    ):
+        """ Lazily retrieve ships from the shards concerned, merged in
+        ``order_by`` order. Takes the same arguments and returns the same as
+        ``ShipDjangoStorage.stream_ships``.
+        """
+        fields = select_fields(fields)
+        routes = self._route(id, ids, user_ids)
+
+        field, descending = select_order(order_by)
+        extra_fields = ()
+        if fields is not None:
+            extra_fields = tuple({'id', field}.difference(fields))
+            fields += extra_fields
+
+        streams = [
+            self.storages[index].stream_ships(
+                status=status,
+                search=search,
+                order_by=order_by or 'id',
+                fields=fields,
+                **filters
+            )
+            for index, filters in routes.items()
+        ]
+
+        return self._merge_stream(streams, field, descending, extra_fields)
+
+    def retrieve_changes(
+        self,
+        since=None,
+        user_ids=None,
+        limit=None,
+        fields=None,
+    ):
+        """ Retrieve the ships written after a cursor from the shards
+        concerned, merged in the order they were written. Takes the same
+        arguments and returns the same as
+        ``ShipPureMemoryStorage.retrieve_changes``.
+        """
+        fields = select_fields(fields)
+        routes = self._route(user_ids=user_ids)
+
+        extra_fields = ()
+        if fields is not None:
+            extra_fields = tuple({'id', 'modified'}.difference(fields))
+            fields += extra_fields
+
+        results = self._fan_out({
+            index: functools.partial(
+                self.storages[index].retrieve_changes,
+                since=since,
+                limit=limit,
+                fields=fields,
+                **filters
+            )
+            for index, filters in routes.items()
+        })
+
+        ships = list(heapq.merge(
+            *results.values(),
+            key=lambda ship: (ship['modified'], ship['id'])
+        ))[:None if limit is None else int(limit)]
+
+        for ship in ships:
+            for extra_field in extra_fields:
+                del ship[extra_field]
+
+        return ships
+
+    @staticmethod
+    def _merge_key(field):
+        """ Build the key serialized ships are merged on, in the order of
+        ``field`` with ties broken on ``id``, as every shard sorts them.
+        """
+        if field in NULLABLE_FIELDS:
+            return lambda ship: (nulls_first(ship[field]), ship['id'])
+        return lambda ship: (ship[field], ship['id'])
+
+    @classmethod
+    def _merge_stream(cls, streams, field, descending, extra_fields):
+        for ship in heapq.merge(
+                *streams, key=cls._merge_key(field), reverse=descending
+        ):
+            for extra_field in extra_fields:
+                del ship[extra_field]
+            yield ship
+
+    def update_ship(self, id, **kwargs):
+        """ Update details of a ship on its shard. Takes the same arguments
+        and returns the same as ``ShipDjangoStorage.update_ship``.
+        """
+        index = self._locate(id)
+        if index is None:
+            raise NotFoundException
+        return self.storages[index].update_ship(id, **kwargs)
+
+    def update_ships(self, ids, user_ids=None, **kwargs):
+        """ Apply the same changes to many ships, on every shard concerned.
+
+        Returns:
+            int: The number of ships updated.
+
+        Raises:
+            DuplicateError: If the changes would give one of the users two
+                ships with the same IMO number. Other shards may have been
+                updated.
+        """
+        # Unknown IDs are skipped, so no IDs means no shard at all.
+        ids = list(ids)
+        routes = self._route(ids=ids, user_ids=user_ids) if ids else {}
+        counts = self._fan_out({
+            index: functools.partial(
+                self.storages[index].update_ships,
+                filters['ids'],
+                user_ids=filters.get('user_ids'),
+                **kwargs
+            )
+            for index, filters in routes.items()
+        })
+        return sum(counts.values())
+
+    def delete_ship(self, id):
+        """ Set the ship's status to ``DELETED``.
+
+        Raises:
+            NotFoundException: If the ship was not found.
+        """
+        index = self._locate(id)
+        if index is None:
+            raise NotFoundException
+        return self.storages[index].delete_ship(id)
+
+    def delete_ships(self, ids, user_ids=None):
+        """ Set the status of many ships to ``DELETED`` at once.
+
+        Returns:
+            int: The number of ships deleted.
+        """
+        # Unknown IDs are skipped, so no IDs means no shard at all.
+        ids = list(ids)
+        routes = self._route(ids=ids, user_ids=user_ids) if ids else {}
+        counts = self._fan_out({
+            index: functools.partial(
+                self.storages[index].delete_ships,
+                filters['ids'],
+                user_ids=filters.get('user_ids'),
+            )
+            for index, filters in routes.items()
+        })
+        return sum(counts.values())
+
+
+class ReplicatedShipStorage:
+
+    """
+    Writes ships to the primary database and reads them from the read
+    replicas in the ``SHIP_REPLICAS`` setting, each database held by a
+    ``ShipDjangoStorage``. The database of a read is picked by the database
+    routers, see ``ship.routers.ShipReplicaRouter``.
+
+    Replicas lag behind the primary, so for ``SHIP_REPLICA_STICKY_SECONDS``
+    after a user wrote a ship their reads go to the primary and they see
+    their own writes. Reads of other users' ships may be that much stale.
+    """
+
+    ship_model = Ship
+
+    def __init__(self, using=None):
+        """
+        Args:
+            using (`obj`:str, optional): The alias of the primary database,
+                picked by the database routers by default.
+        """
+        self.primary = ShipDjangoStorage(using=using)
+        self._readers = {}
+
+    def wipe(self):
+        """ Used during testing to ensure each unittest is indepedent. """
+        self.primary.wipe()
+        recent_writers.clear()
+
+    def _reader(self, user_ids=None):
+        """
+        Returns:
+            ShipDjangoStorage: The storage of the database to read the ships
+                of ``user_ids`` from.
+        """
+        alias = router.db_for_read(
+            self.ship_model, replica=True, user_ids=user_ids,
+        )
+        if alias == DEFAULT_DB_ALIAS:
+            # The routers send reads which can't go to a replica to the
+            # primary, which is this storage's.
+            alias = self.primary.using or DEFAULT_DB_ALIAS
+        if alias not in self._readers:
+            reader = ShipDjangoStorage(using=alias)
+            # Counts are dropped by the writes to the primary.
+            reader.counts = self.primary.counts
+            self._readers[alias] = reader
+        return self._readers[alias]
+
+    def persist_ship(self, **kwargs):
+        """ Persists the ship into the primary. Takes the same arguments and
+        returns the same as ``ShipDjangoStorage.persist_ship``.
+        """
+        ship = self.primary.persist_ship(**kwargs)
+        recent_writers.add([ship['user_id']])
+        return ship
+
+    def persist_ships(self, ships):
+        """ Persists a batch of ships into the primary.
+
+        Returns:
+            list: As for ``ShipDjangoStorage.persist_ships``.
+        """
+        results = self.primary.persist_ships(ships)
+        recent_writers.add({data['user_id'] for data in ships})
+        return results
+
+    def retrieve_ships(self, user_ids=None, **kwargs):
+        """ Retrieve ships from a replica, or from the primary if one of
+        ``user_ids`` wrote recently. Takes the same arguments and returns the
+        same as ``ShipDjangoStorage.retrieve_ships``.
+        """
+        return self._reader(user_ids).retrieve_ships(
+            user_ids=user_ids, **kwargs
+        )
+
+    def retrieve_version(self, user_ids=None, **kwargs):
+        """ Validators of the ships, from the same database as
+        ``retrieve_ships`` would read them. Takes the same arguments and
+        returns the same as ``ShipDjangoStorage.retrieve_version``.
+        """
+        return self._reader(user_ids).retrieve_version(
+            user_ids=user_ids, **kwargs
+        )
+
+    def retrieve_fleet_stats(self, user_ids=None):
+        """ Count the ships of each user by status, from the same database
+        as ``retrieve_ships`` would read them.
+        """
+        return self._reader(user_ids).retrieve_fleet_stats(user_ids=user_ids)
+
+    def retrieve_changes(self, user_ids=None, **kwargs):
+        """ Retrieve the ships written after a cursor as for
+        ``retrieve_ships``. Changes which haven't reached the replica yet
+        are missing, see ``ShipLogic.get_ship_changes``.
+        """
+        return self._reader(user_ids).retrieve_changes(
+            user_ids=user_ids, **kwargs
+        )
+
+    def stream_ships(self, user_ids=None, **kwargs):
+        """ Lazily retrieve ships as for ``retrieve_ships``. """
+        return self._reader(user_ids).stream_ships(
+            user_ids=user_ids, **kwargs
+        )
+
+    def update_ship(self, id, **kwargs):
+        """ Update details of a ship on the primary. Takes the same
+        arguments and returns the same as ``ShipDjangoStorage.update_ship``.
+        """
+        ship = self.primary.update_ship(id, **kwargs)
+        recent_writers.add([ship['user_id']])
+        return ship
+
+    def update_ships(self, ids, user_ids=None, **kwargs):
+        """ Apply the same changes to many ships on the primary.
+
+        Returns:
+            int: The number of ships updated.
+        """
+        count = self.primary.update_ships(ids, user_ids=user_ids, **kwargs)
+        if count:
+            # Without ``user_ids`` the owners aren't known, so everybody's
+            # reads go to the primary for a while.
+            recent_writers.add(user_ids)
+        return count
+
+    def delete_ship(self, id):
+        """ Set the ship's status to ``DELETED`` on the primary.
+
+        Raises:
+            NotFoundException: If the ship was not found.
+        """
+        ship = self.primary.delete_ship(id)
+        recent_writers.add([ship['user_id']])
+        return ship
+
+    def delete_ships(self, ids, user_ids=None):
+        """ Set the status of many ships to ``DELETED`` on the primary.
+
+        Returns:
+            int: The number of ships deleted.
+        """
+        count = self.primary.delete_ships(ids, user_ids=user_ids)
+        if count:
+            recent_writers.add(user_ids)
+        return count
+
+
+class CachedShipStorage:
+
+    """
+    A read-through cache which wraps any ship storage.
+
+    ``retrieve_ships`` results are cached, keyed on the normalized query, with
+    LRU eviction, a TTL and a bound on the total number of cached ships.
+    Writes made through the cache invalidate only the entries which could
+    have been affected: queries for the ship's owner, queries for the ship's
+    ID and queries filtered on neither. A query which misses while such a
+    write is made isn't cached, what it read may predate the write.
+
+    Writes made by other processes are not seen until the TTL runs out, so
+    keep it short when several workers share a database.
+    """
+
+    # Tag for entries which are not filtered by owner or ID, every write
+    # invalidates them.
+    ALL = object()
+
+    def __init__(self, storage, max_entries=1024, max_rows=100000, ttl=30):
+        """
+        Args:
+            storage (object): The storage to wrap.
+            max_entries (`obj`:int, optional): Maximum number of cached
+                queries.
+            max_rows (`obj`:int, optional): Maximum number of ships held
+                across all cached queries.
+            ttl (`obj`:float, optional): Seconds a cached query stays valid.
+        """
+        self.storage = storage
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.ttl = ttl
+
+        self._lock = threading.RLock()
+        # {tag: [generation, misses]} of the tags read by misses in flight.
+        # Writes move the generation of their tags on, and a miss which saw
+        # it move doesn't store what it read, as it may be stale.
+        self._generations = {}
+        # Moved on whenever the whole cache is cleared.
+        self._generation = 0
+        self._clear()
+
+    def __getattr__(self, name):
+        # Anything that isn't cached goes straight to the wrapped storage.
+        return getattr(self.storage, name)
+
+    def _clear(self):
+        with self._lock:
+            self._generation += 1
+            # {key: (expires, ships, total_count, tags)}, oldest first.
+            self._entries = OrderedDict()
+            # {tag: {key: None}}
+            self._tags = {}
+            self._rows = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.expirations = 0
+            self.invalidations = 0
+
+    def stats(self):
+        """ Counters to help tune the size and TTL of the cache.
+
+        Returns:
+            dict: The number of hits, misses, evictions, expirations and
+                invalidations so far plus the current number of entries and
+                cached ships.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'rows': self._rows,
+            }
+
+    def wipe(self):
+        """ Used during testing to ensure each unittest is indepedent. """
+        self._clear()
+        self.storage.wipe()
+
+    @staticmethod
+    def _normalize_key(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return value
+
+    def _query_key(self, id, ids, user_ids, kwargs):
+        """ Normalize the arguments of ``retrieve_ships`` in to a cache key.
+
+        Returns:
+            tuple: (tuple, list) - The cache key and the tags of the entry.
+        """
+        id = self._normalize_key(id) if id else None
+        ids = tuple(sorted({self._normalize_key(ship_id) for ship_id in ids}))
+        user_ids = tuple(sorted(
+            {self._normalize_key(user_id) for user_id in user_ids}
+        ))
+
+        if user_ids:
+            tags = [('user', user_id) for user_id in user_ids]
+        elif id or ids:
+            tags = [
+                ('id', ship_id) for ship_id in set(ids) | {id} if ship_id
+            ]
+        else:
+            tags = [self.ALL]
+
+        kwargs = dict(kwargs)
+        if kwargs.get('cursor') is not None:
+            kwargs['cursor'] = tuple(kwargs['cursor'])
+        if 'fields' in kwargs:
+            kwargs['fields'] = select_fields(kwargs['fields'])
+
+        key = (id, ids, user_ids) + tuple(
+            (name, kwargs[name])
+            for name in sorted(kwargs)
+            if kwargs[name] is not None
+        )
+        return key, tags
+
+    def _drop(self, key):
+        __, ships, __, tags = self._entries.pop(key)
+        self._rows -= len(ships)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.pop(key, None)
+                if not keys:
+                    del self._tags[tag]
+
+    def _invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                if tag in self._generations:
+                    self._generations[tag][0] += 1
+                for key in list(self._tags.get(tag, ())):
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def _invalidate_ships(self, ids, user_ids):
+        """ Invalidate every entry which may hold or match the written ships.
+
+        Args:
+            ids (list): The IDs of the written ships.
+            user_ids (list): The owners of the written ships. ``None`` when
+                they are not known, which clears the whole cache.
+        """
+        with self._lock:
+            if user_ids is None:
+                self._generation += 1
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._tags.clear()
+                self._rows = 0
+                return
+
+            tags = {self.ALL}
+            tags.update(('id', self._normalize_key(id)) for id in ids)
+            tags.update(
+                ('user', self._normalize_key(user_id)) for user_id in user_ids
+            )
+            self._invalidate(tags)
+
+    def _invalidate_written(self, ships):
+        """ Invalidate the entries affected by the returned ``ships``. """
+        ships = [ship for ship in ships if not isinstance(ship, Exception)]
+        self._invalidate_ships(
+            [ship['id'] for ship in ships],
+            [ship['user_id'] for ship in ships],
+        )
+
+    def _begin_miss(self, tags):
+        """ Note the generations of ``tags`` before a miss reads them.
+
+        Returns:
+            tuple: The generation of the cache and of each of the tags.
+        """
+        seen = [self._generation]
+        for tag in tags:
+            state = self._generations.setdefault(tag, [0, 0])
+            state[1] += 1
+            seen.append(state[0])
+        return tuple(seen)
+
+    def _end_miss(self, tags, seen):
+        """ Stop following the generations of ``tags`` for a miss.
+
+        Returns:
+            bool: Whether the ships were written since ``_begin_miss``.
+        """
+        generations = [self._generation]
+        for tag in tags:
+            state = self._generations[tag]
+            generations.append(state[0])
+            state[1] -= 1
+            if not state[1]:
+                del self._generations[tag]
+        return tuple(generations) != seen
+
+    def retrieve_ships(
+        self,
+        id=None,
+        ids=None,
+        user_ids=None,
+        **kwargs
+    ):
+        """ Retrieve ships through the cache. Takes the same arguments and
+        returns the same as the ``retrieve_ships`` of the wrapped storage.
+        """
+        key, tags = self._query_key(id, ids or (), user_ids or (), kwargs)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return [dict(ship) for ship in entry[1]], entry[2]
+
+                self._drop(key)
+                self.expirations += 1
+
+            self.misses += 1
+            seen = self._begin_miss(tags)
+
+        try:
+            ships, total_count = self.storage.retrieve_ships(
+                id=id, ids=ids, user_ids=user_ids, **kwargs
+            )
+        finally:
+            with self._lock:
+                written = self._end_miss(tags, seen)
+
+        if written or len(ships) > self.max_rows:
+            return ships, total_count
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+            self._entries[key] = (
+                time.monotonic() + self.ttl,
+                [dict(ship) for ship in ships],
+                total_count,
+                tags,
+            )
+            self._rows += len(ships)
+            for tag in tags:
+                self._tags.setdefault(tag, {})[key] = None
+
+            while (
+                len(self._entries) > self.max_entries or
+                self._rows > self.max_rows
+            ):
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+        return ships, total_count
+
+    def stream_ships(self, **kwargs):
+        return self.storage.stream_ships(**kwargs)
+
+    def persist_ship(self, **kwargs):
+        ship = self.storage.persist_ship(**kwargs)
+        self._invalidate_written([ship])
+        return ship
+
+    def persist_ships(self, ships):
+        results = self.storage.persist_ships(ships)
+        self._invalidate_written(results)
+        return results
+
+    def update_ship(self, id, **kwargs):
+        ship = self.storage.update_ship(id=id, **kwargs)
+        self._invalidate_written([ship])
+        return ship
+
+    def update_ships(self, ids, user_ids=None, **kwargs):
+        ids = list(ids)
+        try:
+            return self.storage.update_ships(ids, user_ids=user_ids, **kwargs)
+        finally:
+            # Only ships owned by ``user_ids`` can have changed. Without them
+            # the owners are unknown and everything is invalidated.
+            self._invalidate_ships(ids, user_ids)
+
+    def delete_ship(self, id):
+        ship = self.storage.delete_ship(id=id)
+        self._invalidate_written([ship])
+        return ship
+
+    def delete_ships(self, ids, user_ids=None):
+        ids = list(ids)
+        try:
+            return self.storage.delete_ships(ids, user_ids=user_ids)
+        finally:
+            self._invalidate_ships(ids, user_ids)
+
+
+class GroupWrite:
+
+    """
+    A write waiting in a batch of ``GroupCommitShipStorage``, until its
+    outcome is known.
+    """
+
+    __slots__ = ('method', 'kwargs', 'result', 'error', 'done')
+
+    def __init__(self, method, kwargs):
+        self.method = method
+        self.kwargs = kwargs
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class GroupCommitShipStorage:
+
+    """
+    Group commit in front of a ``ShipDjangoStorage``: the single ship writes
+    of concurrent callers are collected in to a batch, which is committed in
+    one transaction, so that they share a commit and its sync to disk.
+
+    The first write of a batch waits up to ``max_delay`` seconds for others
+    to join, or until ``max_batch`` have, then commits the batch in its own
+    thread while the others wait. Each write runs in a savepoint of its own,
+    its caller gets its own result or error, e.g. ``DuplicateError``. If the
+    commit fails, every caller of the batch gets its error.
+
+    A batch is only held open while ``commit_siblings`` other writes are
+    under way, a lone writer commits straight away. Batch writes and reads go
+    straight to the wrapped storage.
+
+    The writes of a batch run in the thread of its first write, on that
+    thread's database connection. So they are outside of any transaction the
+    other callers hold, and aren't rolled back with it. A caller gives up
+    waiting on a batch after ``timeout`` seconds, even though the batch may
+    still commit its write.
+    """
+
+    def __init__(
+        self,
+        storage,
+        max_delay=0.002,
+        max_batch=64,
+        commit_siblings=1,
+        timeout=30,
+    ):
+        """
+        Args:
+            storage (ShipDjangoStorage): The storage to wrap.
+            max_delay (`obj`:float, optional): Seconds a batch stays open.
+            max_batch (`obj`:int, optional): Maximum number of writes in a
+                batch.
+            commit_siblings (`obj`:int, optional): Number of other writes
+                under way needed to hold a batch open.
+            timeout (`obj`:float, optional): Seconds a write waits on the
+                batch it joined before raising ``TimeoutError``.
+        """
+        self.storage = storage
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.commit_siblings = commit_siblings
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        # The writes of the batch still open, ``None`` when there is none.
+        self._batch = None
+        # Set when the open batch is full.
+        self._batch_full = None
+        # Writes under way, committed or not.
+        self._pending = 0
+        self.batches = 0
+        self.writes = 0
+
+    def __getattr__(self, name):
+        # Anything that isn't batched goes straight to the wrapped storage.
+        return getattr(self.storage, name)
+
+    def stats(self):
+        """
+        Returns:
+            dict: The number of batches committed and of writes in them.
+        """
+        with self._lock:
+            return {'batches': self.batches, 'writes': self.writes}
+
+    def _write(self, method, **kwargs):
+        write = GroupWrite(method, kwargs)
+
+        with self._lock:
+            self._pending += 1
+            batch, full = self._batch, self._batch_full
+            lead = batch is None
+            if lead:
+                batch, full = [], threading.Event()
+                if (
+                        self._pending > self.commit_siblings and
+                        self.max_batch > 1
+                ):
+                    # Keep the batch open for the other writers.
+                    self._batch, self._batch_full = batch, full
+
+            batch.append(write)
+            if len(batch) >= self.max_batch and self._batch is batch:
+                self._batch = self._batch_full = None
+                full.set()
+            held_open = self._batch is batch
+
+        try:
+            if lead:
+                self._lead(batch, full, held_open)
+            elif not write.done.wait(self.timeout):
+                raise TimeoutError(
+                    'The group commit of a {} did not end within {} '
+                    'seconds.'.format(method, self.timeout)
+                )
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def _lead(self, batch, full, held_open):
+        """ Wait for the batch to fill up if it was held open, then commit
+        it. However this ends, every write of the batch is handed an outcome.
+        """
+        try:
+            if held_open:
+                full.wait(self.max_delay)
+            with self._lock:
+                if self._batch is batch:
+                    self._batch = self._batch_full = None
+            self._commit(batch)
+        finally:
+            # Only when the leader was interrupted, e.g. by
+            # ``KeyboardInterrupt``, are writes left without an outcome.
+            with self._lock:
+                if self._batch is batch:
+                    self._batch = self._batch_full = None
+            for write in batch:
+                if not write.done.is_set():
+                    write.result, write.error = None, RuntimeError(
+                        'The group commit was interrupted.'
+                    )
+                    write.done.set()
+
+    def _commit(self, batch):
+        """ Make the writes of ``batch`` in one transaction, and hand every
+        one its outcome.
+        """
+        try:
+            with transaction.atomic(using=self.storage.using):
+                for write in batch:
+                    try:
+                        with transaction.atomic(using=self.storage.using):
+                            write.result = getattr(
+                                self.storage, write.method
+                            )(**write.kwargs)
+                    except Exception as err:  # pylint: disable=broad-except
+                        write.error = err
+        except Exception as err:  # pylint: disable=broad-except
+            logger.exception('Group commit of %s writes failed.', len(batch))
+            for write in batch:
+                write.result, write.error = None, err
+        finally:
+            with self._lock:
+                self.batches += 1
+                self.writes += len(batch)
+
+        # Not reached when the leader is interrupted, as the outcomes of the
+        # writes rolled back with it aren't those above, see ``_lead``.
+        for write in batch:
+            write.done.set()
+
+    def persist_ship(self, **kwargs):
+        return self._write('persist_ship', **kwargs)
+
+    def update_ship(self, id, **kwargs):
+        return self._write('update_ship', id=id, **kwargs)
+
+    def delete_ship(self, id):
+        return self._write('delete_ship', id=id)
@@ -0,0 +1,568 @@
+# -*- coding: utf-8 -*-
+import json
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from assessment.auth import token_cache
+from assessment.testing import QueryBudgetMixin
+from ship.injection_setup import logic
+from ship.metrics import (
+    LOGIC_DURATION,
+    STORAGE_DURATION,
+    VIEW_DURATION,
+    instrument_storage,
+)
+from ship.storage import ShipDjangoStorage
+
+
+class TestShipViewSet(APITestCase):
+
+    url = '/api/v1/ships/'
+
+    def setUp(self):
+        self.user = User.objects.create_user('assessor')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Token {key}'.format(key=self.token.key)
+        )
+
+    def tearDown(self):
+        logic.storage.wipe()
+
+    def create_ships(self, count, user_id=None):
+        return [
+            logic.create_ship(
+                name='SHIP {index}'.format(index=index),
+                imo_number='{index:07d}'.format(index=index),
+                user_id=user_id or self.user.id,
+            )
+            for index in range(count)
+        ]
+
+    def test_list_limit_offset(self):
+        ships = self.create_ships(5)
+        self.create_ships(3, user_id=self.user.id + 1)
+
+        response = self.client.get(
+            self.url, {'limit': 2, 'offset': 2, 'order_by': 'id'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(
+            [ship['id'] for ship in response.data['results']],
+            [ship['id'] for ship in ships[2:4]],
+        )
+        self.assertIn('offset=4', response.data['next'])
+        self.assertNotIn('offset', response.data['previous'])
+
+    def test_list_count_strategies(self):
+        self.create_ships(5)
+
+        for count in ('exact', 'page', 'cached', 'unknown'):
+            response = self.client.get(
+                self.url, {'limit': 2, 'offset': 2, 'count': count},
+            )
+            self.assertEqual(response.data['count'], 5)
+
+        response = self.client.get(
+            self.url, {'limit': 2, 'offset': 2, 'count': 'none'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIn('offset=4', response.data['next'])
+        self.assertIn('count=none', response.data['next'])
+        self.assertIsNotNone(response.data['previous'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_list_cursor(self):
+        ships = self.create_ships(5)
+
+        seen = []
+        url = self.url + '?cursor=&limit=2&order_by=-created'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+
+            seen.extend(ship['id'] for ship in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(seen, [ship['id'] for ship in reversed(ships)])
+
+    def test_list_is_timed(self):
+        self.create_ships(3)
+        counts = {
+            phase: VIEW_DURATION.count(('list', phase))
+            for phase in ('view', 'auth', 'pagination', 'render')
+        }
+        calls = LOGIC_DURATION.count(('get_ships',))
+        backend = type(logic.storage.target).__name__
+        retrieves = STORAGE_DURATION.count(('retrieve_ships', backend))
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+        for phase, count in counts.items():
+            self.assertEqual(
+                VIEW_DURATION.count(('list', phase)), count + 1, phase
+            )
+        self.assertEqual(LOGIC_DURATION.count(('get_ships',)), calls + 1)
+        self.assertEqual(
+            STORAGE_DURATION.count(('retrieve_ships', backend)),
+            retrieves + 1,
+        )
+
+    def test_list_changes(self):
+        ships = self.create_ships(3)
+        self.create_ships(2, user_id=self.user.id + 1)
+
+        response = self.client.get(self.url, {'since': '', 'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [ship['id'] for ship in response.data['results']],
+            [ship['id'] for ship in ships[:2]],
+        )
+
+        logic.delete_ship(ships[0]['id'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(
+            [
+                (ship['id'], ship['status'])
+                for ship in response.data['results']
+            ],
+            [(ships[2]['id'], 'ACTIVE'), (ships[0]['id'], 'DELETED')],
+        )
+        self.assertIn('since=', response.data['next'])
+
+    def test_list_changes_invalid_cursor(self):
+        response = self.client.get(self.url, {'since': 'nope'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_search(self):
+        ships = self.create_ships(12)
+        self.create_ships(12, user_id=self.user.id + 1)
+
+        response = self.client.get(
+            self.url, {'search': 'ship 1', 'order_by': 'id'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(
+            [ship['id'] for ship in response.data['results']],
+            [ship['id'] for ship in ships[1:2] + ships[10:]],
+        )
+
+    def test_stats(self):
+        ships = self.create_ships(3)
+        self.create_ships(2, user_id=self.user.id + 1)
+        logic.delete_ship(ships[0]['id'])
+
+        response = self.client.get(
+            self.url + 'stats/', {'user_id': self.user.id + 2},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [
+            {
+                'user_id': self.user.id,
+                'total': 3,
+                'statuses': {'ACTIVE': 2, 'DELETED': 1},
+            },
+            {'user_id': self.user.id + 2, 'total': 0, 'statuses': {}},
+        ])
+
+    def test_stats_invalid_user_id(self):
+        response = self.client.get(self.url + 'stats/', {'user_id': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('user_id', response.data)
+
+    def test_list_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_order_by(self):
+        ships = self.create_ships(3)
+
+        response = self.client.get(self.url, {'order_by': '-notes'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), len(ships))
+
+        response = self.client.get(self.url, {'order_by': 'bogus'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('order_by', response.data)
+
+        # Notes may be null, which a cursor can't be built on.
+        response = self.client.get(
+            self.url, {'order_by': 'notes', 'cursor': ''},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('order_by', response.data)
+
+    def test_list_stream(self):
+        self.create_ships(3)
+        self.create_ships(2, user_id=self.user.id + 1)
+
+        expected = self.client.get(self.url, {'order_by': 'id'})
+        response = self.client.get(self.url, {'order_by': 'id', 'stream': 1})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(
+            [json.loads(line.decode()) for line in lines],
+            json.loads(expected.content.decode())['results'],
+        )
+
+    def test_list_fields(self):
+        ships = self.create_ships(3)
+
+        response = self.client.get(
+            self.url, {'fields': 'name,imo_number', 'order_by': '-created'},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [
+            {
+                'created': ship['created'],
+                'id': ship['id'],
+                'imo_number': ship['imo_number'],
+                'name': ship['name'],
+            }
+            for ship in reversed(ships)
+        ])
+
+        response = self.client.get(
+            self.url, {'fields': 'name', 'stream': 1, 'order_by': 'id'},
+        )
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(
+            [json.loads(line.decode()) for line in lines],
+            [{'id': ship['id'], 'name': ship['name']} for ship in ships],
+        )
+
+    def test_list_unknown_fields(self):
+        response = self.client.get(self.url, {'fields': 'name,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.data)
+
+    def test_create(self):
+        data = {'name': 'GOODSHIP COTTON', 'imo_number': '1234567'}
+
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, 204)
+
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, 409)
+
+        __, count = logic.get_ships(user_ids=[self.user.id])
+        self.assertEqual(count, 1)
+
+    def test_create_many(self):
+        self.create_ships(1)
+        data = [
+            {'name': 'SHIP 0', 'imo_number': '0000000'},
+            {'name': 'SHIP 1', 'imo_number': '0000001', 'user_id': 666},
+        ]
+
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(
+            [result['status'] for result in response.data], [409, 201]
+        )
+        self.assertEqual(response.data[1]['ship']['user_id'], self.user.id)
+
+        __, count = logic.get_ships(user_ids=[self.user.id])
+        self.assertEqual(count, 2)
+
+    def test_create_many_invalid(self):
+        data = [{'name': 'SHIP 0', 'imo_number': '0000000'}, {'name': ''}]
+
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(logic.get_ships()[1], 0)
+
+    def test_bulk_update(self):
+        ships = self.create_ships(3)
+        other = self.create_ships(1, user_id=self.user.id + 1)
+
+        response = self.client.post(
+            self.url + 'bulk_update/',
+            {
+                'ids': [ship['id'] for ship in ships[:2] + other],
+                'changes': {'notes': 'Bulk notes'},
+            },
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'updated': 2})
+
+    def test_bulk_update_invalid(self):
+        response = self.client.post(
+            self.url + 'bulk_update/',
+            {'ids': [], 'changes': {'name': ''}},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ids', response.data)
+        self.assertIn('changes', response.data)
+
+        for data in ([1, 2], {'ids': [1], 'changes': [1]}):
+            response = self.client.post(
+                self.url + 'bulk_update/', data, format='json',
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_bulk_delete(self):
+        ships = self.create_ships(3)
+
+        response = self.client.post(
+            self.url + 'bulk_delete/',
+            {'ids': [ship['id'] for ship in ships]},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'deleted': 3})
+        self.assertEqual(logic.get_ships(status='DELETED')[1], 3)
+
+    def test_list_not_modified(self):
+        ship, = self.create_ships(1)
+        response = self.client.get(self.url, {'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get(
+            self.url, {'limit': 2}, HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        # Another page is another representation.
+        response = self.client.get(
+            self.url, {'limit': 1}, HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 200)
+
+        logic.update_ship(ship['id'], notes='Changed')
+        response = self.client.get(
+            self.url, {'limit': 2}, HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_not_modified_since(self):
+        self.create_ships(1)
+        response = self.client.get(self.url)
+        last_modified = response['Last-Modified']
+
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=last_modified,
+        )
+        self.assertEqual(response.status_code, 304)
+
+        # The entity tag wins over the date.
+        response = self.client.get(
+            self.url,
+            HTTP_IF_MODIFIED_SINCE=last_modified,
+            HTTP_IF_NONE_MATCH='W/"stale"',
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_by_status_is_not_dated(self):
+        ship, __ = self.create_ships(2)
+        last_modified = self.client.get(self.url)['Last-Modified']
+        response = self.client.get(self.url, {'status': 'ACTIVE'})
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+
+        # The ship leaves the list, the latest ``modified`` of the others
+        # stays the same.
+        logic.delete_ship(ship['id'])
+        response = self.client.get(
+            self.url, {'status': 'ACTIVE'},
+            HTTP_IF_MODIFIED_SINCE=last_modified,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+
+        response = self.client.get(
+            self.url, {'status': 'ACTIVE'}, HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_not_modified_is_not_retrieved(self):
+        self.create_ships(1)
+        etag = self.client.get(self.url)['ETag']
+
+        storage_calls = STORAGE_DURATION.count(
+            ('retrieve_ships', 'ShipPureMemoryStorage')
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(
+            STORAGE_DURATION.count(
+                ('retrieve_ships', 'ShipPureMemoryStorage')
+            ),
+            storage_calls,
+        )
+
+    def test_detail_not_modified(self):
+        ship, other = self.create_ships(2)
+        url = '{}{}/'.format(self.url, ship['id'])
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        logic.delete_ship(ship['id'])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'DELETED')
+
+        self.assertNotEqual(
+            self.client.get('{}{}/'.format(self.url, other['id']))['ETag'],
+            response['ETag'],
+        )
+
+
+@override_settings(QUERY_BUDGETS_ENFORCE=True)
+class TestShipViewSetQueryBudgets(QueryBudgetMixin, APITestCase):
+
+    """
+    The API backed by ``ShipDjangoStorage`` stays within the
+    ``QUERY_BUDGETS``, and the middleware fails any request which doesn't.
+    """
+
+    url = '/api/v1/ships/'
+
+    def setUp(self):
+        self.user = User.objects.create_user('assessor')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Token {key}'.format(key=self.token.key)
+        )
+        # Every request looks its token up.
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+
+        ship_logic = logic.target
+        self.addCleanup(setattr, ship_logic, 'storage', ship_logic.storage)
+        ship_logic.storage = instrument_storage(ShipDjangoStorage())
+        self.addCleanup(ship_logic.storage.wipe)
+        # Whether the database has a search table is only looked up once.
+        ship_logic.storage.retrieve_ships(search='ship')
+
+        self.ships = logic.create_ships([
+            {
+                'name': 'SHIP {index}'.format(index=index),
+                'imo_number': '{index:07d}'.format(index=index),
+                'user_id': self.user.id,
+            }
+            for index in range(5)
+        ])
+
+    def request(self, method, url, data=None):
+        token_cache.clear()
+        response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 400, response.content)
+        self.assertFalse(response.query_stats.duplicates)
+        return response
+
+    def test_list(self):
+        response = self.request('get', self.url + '?limit=2')
+        self.assertEqual(response.query_stats.count, 4)
+
+        token_cache.clear()
+        response = self.client.get(
+            self.url + '?limit=2', HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.query_stats.count, 2)
+
+        # Neither cursor pages nor the last page are counted.
+        response = self.request('get', self.url + '?cursor=&order_by=-created')
+        self.assertEqual(response.query_stats.count, 3)
+        response = self.request('get', self.url + '?limit=2&offset=4')
+        self.assertEqual(response.query_stats.count, 3)
+        self.request('get', self.url + '?fields=name&ids=1&ids=2')
+        self.request('get', self.url + '?since=&fields=name')
+        self.request('get', self.url + '?search=ship')
+
+    def test_detail(self):
+        response = self.request(
+            'get', '{}{}/'.format(self.url, self.ships[0]['id']),
+        )
+        self.assertEqual(response.query_stats.count, 3)
+
+    def test_stats(self):
+        response = self.request('get', self.url + 'stats/')
+        self.assertEqual(response.query_stats.count, 2)
+
+    def test_writes(self):
+        ids = [ship['id'] for ship in self.ships]
+        self.request('post', self.url, {
+            'name': 'NEW SHIP', 'imo_number': '7654321',
+        })
+        self.request('post', self.url, [
+            {'name': 'NEW SHIP', 'imo_number': '76543{:02d}'.format(index)}
+            for index in range(20)
+        ])
+        self.request('post', self.url + 'bulk_update/', {
+            'ids': ids, 'changes': {'notes': 'Bulk notes'},
+        })
+        self.request('post', self.url + 'bulk_delete/', {'ids': ids})
+        self.request('delete', '{}{}/'.format(self.url, ids[0]))
+
+    def test_budgets_are_enforced(self):
+        with self.settings(QUERY_BUDGETS={'ship-list': 1}):
+            with self.assertRaisesRegex(Exception, 'over its budget of 1'):
+                self.client.get(self.url)
+
+    def test_budgets_are_logged(self):
+        with self.settings(
+            QUERY_BUDGETS={'ship-list': 1}, QUERY_BUDGETS_ENFORCE=False,
+        ):
+            with self.assertLogs('assessment.middleware', 'WARNING'):
+                response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_only_budgets_are_counted(self):
+        with self.settings(QUERY_BUDGETS={'ship-detail': 3}):
+            response = self.client.get(self.url)
+            self.assertFalse(hasattr(response, 'query_stats'))
+
+            with self.settings(DEBUG=True):
+                response = self.client.get(self.url)
+            self.assertGreater(response.query_stats.count, 0)
+
+            response = self.client.get('/missing/')
+            self.assertEqual(response.status_code, 404)
+            self.assertFalse(hasattr(response, 'query_stats'))
+
+    def test_storage_queries(self):
+        storage = logic.storage
+        with self.assertQueryBudget(2) as capture:
+            storage.retrieve_ships(user_ids=[self.user.id], limit=2)
+        self.assertEqual(capture.stats.count, 2)
+
+        with self.assertQueryBudget(4):
+            storage.persist_ships([
+                {'name': 'SHIP', 'imo_number': '76543{:02d}'.format(index),
+                 'user_id': self.user.id}
+                for index in range(20)
+            ])
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from ship.benchmarks import (
+    MEMORY_STORAGES,
+    StorageBenchmark,
+    compare,
+    dump_results,
+    load_results,
+    memory_storages,
+)
+
+
+class TestStorageBenchmark(TestCase):
+
+    def setUp(self):
+        self.benchmark = StorageBenchmark(repeat=5, ships_per_user=2)
+
+    def test_run(self):
+        results = self.benchmark.run(MEMORY_STORAGES, [10, 20])
+
+        self.assertEqual(
+            len(results['results']),
+            len(MEMORY_STORAGES) * 2 * len(StorageBenchmark.operations),
+        )
+        for result in results['results']:
+            self.assertEqual(result['samples'], 5)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+    def test_storage_is_wiped_between_sizes(self):
+        storage = MEMORY_STORAGES['memory']()
+        self.benchmark.measure(storage, 10)
+        self.assertEqual(storage.retrieve_ships()[1], 0)
+
+    def test_single_user_fleet(self):
+        benchmark = StorageBenchmark(repeat=5, ships_per_user=100)
+        storage = MEMORY_STORAGES['memory']()
+        benchmark.populate(storage, 20)
+
+        self.assertEqual(storage.retrieve_ships(user_ids=[0])[1], 20)
+        results = benchmark.run(MEMORY_STORAGES, [20])
+        self.assertEqual(
+            len(results['results']),
+            len(MEMORY_STORAGES) * len(StorageBenchmark.operations),
+        )
+
+    def test_durable_storage(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        storages = memory_storages(data_dir)
+
+        results = self.benchmark.run(
+            {'memory_durable': storages['memory_durable']}, [10],
+        )
+
+        self.assertEqual(
+            len(results['results']), len(StorageBenchmark.operations),
+        )
+        self.assertTrue(os.listdir(data_dir))
+
+    def test_results_round_trip(self):
+        results = self.benchmark.run(MEMORY_STORAGES, [10])
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        path = os.path.join(data_dir, 'results.json')
+
+        dump_results(results, path)
+        self.assertEqual(load_results(path), results)
+
+    def test_compare(self):
+        def results(p50_ms):
+            return {'results': [
+                {
+                    'storage': 'memory',
+                    'size': 10,
+                    'operation': operation,
+                    'p50_ms': p50_ms[operation],
+                }
+                for operation in p50_ms
+            ]}
+
+        baseline = results({'update_ship': 1.0, 'delete_ship': 1.0})
+        current = results({'update_ship': 1.5, 'persist_ship': 1.0})
+
+        comparison, = compare(current, baseline, tolerance=0.2)
+        self.assertEqual(comparison['operation'], 'update_ship')
+        self.assertEqual(comparison['ratio'], 1.5)
+        self.assertTrue(comparison['regression'])
+
+        comparison, = compare(current, baseline, tolerance=0.5)
+        self.assertFalse(comparison['regression'])
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import itertools
+from unittest import TestCase, skipUnless
+
+from django.db import connection
+from django.utils import timezone
+
+from ship.storage import ShipDjangoStorage
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite')
+class TestShipIndexes(TestCase):
+
+    """
+    Every filtered query ``ShipDjangoStorage.retrieve_ships`` can make has to
+    be answered from an index. Unfiltered queries are left out as they read
+    every row whatever the indexes are.
+    """
+
+    storage = ShipDjangoStorage()
+
+    filters = (
+        {'id': 1},
+        {'ids': [1, 2]},
+        {'user_ids': [1]},
+        {'user_ids': [1, 2]},
+        {'status': 'ACTIVE'},
+        {'user_ids': [1], 'status': 'ACTIVE'},
+        {'user_ids': [1, 2], 'status': 'DELETED'},
+        {'ids': [1, 2], 'user_ids': [1]},
+    )
+
+    orderings = (
+        None, 'id', '-id', 'created', '-created', 'modified', '-modified',
+    )
+
+    pages = (
+        {},
+        {'limit': 20},
+        {'limit': 20, 'offset': 40},
+        {'limit': 20, 'cursor': True},
+    )
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertSearches(self, queryset):
+        plan = self.query_plan(queryset)
+        scans = [step for step in plan if step.startswith('SCAN')]
+        self.assertFalse(scans, plan)
+
+    def test_filtered_queries_use_an_index(self):
+        for filters, order_by, page in itertools.product(
+                self.filters, self.orderings, self.pages
+        ):
+            page = dict(page)
+            if page.get('cursor'):
+                field = (order_by or 'id').lstrip('-')
+                page['cursor'] = (1 if field == 'id' else timezone.now(), 1)
+
+            with self.subTest(filters=filters, order_by=order_by, page=page):
+                ships = self.storage._filter_queryset(**filters)
+                # The query behind the total count.
+                self.assertSearches(ships)
+                self.assertSearches(
+                    self.storage._page_queryset(ships, order_by, **page)
+                )
+
+    def test_change_feed_uses_an_index(self):
+        since = (timezone.now(), 1)
+        for user_ids in (None, [1], [1, 2]):
+            with self.subTest(user_ids=user_ids):
+                self.assertSearches(self.storage._page_queryset(
+                    self.storage._filter_queryset(user_ids=user_ids),
+                    'modified',
+                    limit=20,
+                    cursor=since,
+                ))
+
+    def test_unfiltered_query_scans(self):
+        # Shows the check above can fail.
+        plan = self.query_plan(self.storage._filter_queryset())
+        self.assertTrue(any(step.startswith('SCAN') for step in plan), plan)
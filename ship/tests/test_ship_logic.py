@@ -1,10 +1,20 @@
 # -*- coding: utf-8 -*-
+import asyncio
 from copy import deepcopy
-from unittest import TestCase
+from datetime import timedelta
+from unittest import TestCase, mock
 
+from ship.async_storage import (
+    AsyncShipDjangoStorage,
+    AsyncShipPureMemoryStorage,
+)
 from ship.exceptions import DuplicateError, NotFoundException
-from ship.storage import ShipDjangoStorage, ShipPureMemoryStorage
-from ship.logic import ShipLogic
+from ship.storage import (
+    CachedShipStorage,
+    ShipDjangoStorage,
+    ShipPureMemoryStorage,
+)
+from ship.logic import AsyncShipLogic, ShipLogic
 
 
 class ShipLogicInterface:
@@ -49,13 +59,13 @@ class ShipLogicInterface:
     def test_get_ships(self):
         data = deepcopy(self.ship_data)
 
-        expected = self.logic.create_ship(**data)
+        self.logic.create_ship(**data)
 
         # We will create 10 additional ships that we don't expect to see
         # when we retrieve the ships by user_id later on.
         for index in range(9):
             data['imo_number'] = '765432{index}'.format(index=index)
-            self.logic.create_ship(**data)
+            expected = self.logic.create_ship(**data)
 
         # Create a ship for a different user that won't be returned when
         # retrieving ships
@@ -71,6 +81,45 @@ class ShipLogicInterface:
         self.assertEqual(len(ships), 10)
         self.assertEqual(ships[0], expected)
 
+    def test_get_ships_fields(self):
+        ship = self.logic.create_ship(**deepcopy(self.ship_data))
+
+        ships, total_count = self.logic.get_ships(fields=['imo_number', 'id'])
+
+        self.assertEqual(total_count, 1)
+        self.assertEqual(
+            ships, [{'id': ship['id'], 'imo_number': ship['imo_number']}],
+        )
+
+    def test_create_ships(self):
+        data = deepcopy(self.ship_data)
+        existing = self.logic.create_ship(**data)
+
+        batch = []
+        for index in range(3):
+            row = deepcopy(self.ship_data)
+            row['imo_number'] = '765432{index}'.format(index=index)
+            batch.append(row)
+
+        # One duplicate of a stored ship and one within the batch itself.
+        batch.insert(1, deepcopy(self.ship_data))
+        batch.append(deepcopy(batch[0]))
+
+        results = self.logic.create_ships(batch)
+
+        self.assertEqual(len(results), 5)
+        self.assertIsInstance(results[1], DuplicateError)
+        self.assertIsInstance(results[4], DuplicateError)
+
+        created = [results[0], results[2], results[3]]
+        for ship, row in zip(created, [batch[0], batch[2], batch[3]]):
+            self.assertEqual(ship['imo_number'], row['imo_number'])
+            self.assertEqual(ship['status'], 'ACTIVE')
+
+        ships, count = self.logic.get_ships(order_by='id')
+        self.assertEqual(count, 4)
+        self.assertEqual(ships, [existing] + created)
+
     def test_update_ship(self):
         data = deepcopy(self.ship_data)
         ship = self.logic.create_ship(**data)
@@ -104,6 +153,59 @@ class ShipLogicInterface:
 
         self.assertEqual(actual['user_id'], expected['user_id'])
 
+    def test_update_ships(self):
+        data = deepcopy(self.ship_data)
+        ids = []
+        for index in range(3):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            ids.append(self.logic.create_ship(**data)['id'])
+
+        data['user_id'] = 666
+        other = self.logic.create_ship(**data)
+
+        updated = self.logic.update_ships(
+            ids[:2] + [other['id'], 1234567889999],
+            user_ids=[self.ship_data['user_id']],
+            notes='Bulk notes',
+            user_id=666,
+        )
+        self.assertEqual(updated, 2)
+
+        ships, __ = self.logic.get_ships(order_by='id')
+        self.assertEqual(
+            [(ship['notes'], ship['user_id']) for ship in ships],
+            [('Bulk notes', 1), ('Bulk notes', 1), (None, 1), (None, 666)],
+        )
+
+    def test_update_ships_raises_duplicate_error(self):
+        data = deepcopy(self.ship_data)
+        ids = []
+        for index in range(2):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            ids.append(self.logic.create_ship(**data)['id'])
+
+        with self.assertRaises(DuplicateError):
+            self.logic.update_ships(ids, imo_number='7777777')
+
+        ships, __ = self.logic.get_ships(order_by='id')
+        self.assertEqual(
+            [ship['imo_number'] for ship in ships], ['7654320', '7654321']
+        )
+
+    def test_delete_ships(self):
+        data = deepcopy(self.ship_data)
+        ids = []
+        for index in range(3):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            ids.append(self.logic.create_ship(**data)['id'])
+
+        deleted = self.logic.delete_ships(ids[1:])
+        self.assertEqual(deleted, 2)
+
+        ships, count = self.logic.get_ships(status='DELETED', order_by='id')
+        self.assertEqual(count, 2)
+        self.assertEqual([ship['id'] for ship in ships], ids[1:])
+
     def test_delete_ship(self):
         data = deepcopy(self.ship_data)
         ship = self.logic.create_ship(**data)
@@ -115,6 +217,53 @@ class ShipLogicInterface:
         self.assertEqual(count, 1)
         self.assertEqual(ships[0]['status'], 'DELETED')
 
+    def test_get_fleet_stats(self):
+        data = deepcopy(self.ship_data)
+        ids = []
+        for index in range(3):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            ids.append(self.logic.create_ship(**data)['id'])
+        self.logic.delete_ship(ids[0])
+
+        self.assertEqual(
+            self.logic.get_fleet_stats(user_ids=[data['user_id'], 666]),
+            {data['user_id']: {'ACTIVE': 2, 'DELETED': 1}, 666: {}},
+        )
+
+    def test_get_ship_changes(self):
+        data = deepcopy(self.ship_data)
+        ids = []
+        for index in range(3):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            ids.append(self.logic.create_ship(**data)['id'])
+
+        # A full page moves the cursor to its last ship.
+        ships, cursor = self.logic.get_ship_changes(limit=2)
+        self.assertEqual([ship['id'] for ship in ships], ids[:2])
+        self.assertEqual(cursor, (ships[-1]['modified'], ids[1]))
+
+        # Ships which haven't settled are sent again.
+        ships, next_cursor = self.logic.get_ship_changes(
+            since=cursor, limit=2,
+        )
+        self.assertEqual([ship['id'] for ship in ships], ids[2:])
+        self.assertEqual(next_cursor, cursor)
+
+        self.logic.delete_ship(ids[0])
+        with mock.patch.object(
+                ShipLogic, 'changes_settle_time', timedelta(0),
+        ):
+            ships, cursor = self.logic.get_ship_changes(
+                since=cursor, fields=['status'],
+            )
+        self.assertEqual(
+            [(ship['id'], ship['status']) for ship in ships],
+            [(ids[2], 'ACTIVE'), (ids[0], 'DELETED')],
+        )
+        self.assertEqual(cursor, (ships[-1]['modified'], ids[0]))
+
+        self.assertEqual(self.logic.get_ship_changes(since=cursor)[0], [])
+
 
 class TestShipLogic_PureMemoryStorage(ShipLogicInterface, TestCase):
 
@@ -127,3 +276,112 @@ class TestShipLogic_DjangoStorage(ShipLogicInterface, TestCase):
     storage = ShipDjangoStorage()
     logic = ShipLogic(storage)
 
+
+class TestShipLogic_CachedDjangoStorage(ShipLogicInterface, TestCase):
+
+    storage = CachedShipStorage(ShipDjangoStorage())
+    logic = ShipLogic(storage)
+
+
+class RunUntilComplete:
+
+    """
+    Lets the synchronous ``ShipLogicInterface`` drive an ``AsyncShipLogic``:
+    every method call is run to completion on ``loop``.
+    """
+
+    def __init__(self, target, loop):
+        self.target = target
+        self.loop = loop
+
+    @property
+    def storage(self):
+        return RunUntilComplete(self.target.storage, self.loop)
+
+    def __getattr__(self, name):
+        method = getattr(self.target, name)
+
+        def run(*args, **kwargs):
+            return self.loop.run_until_complete(method(*args, **kwargs))
+
+        return run
+
+
+class AsyncShipLogicInterface(ShipLogicInterface):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.loop = asyncio.new_event_loop()
+        cls.async_logic = AsyncShipLogic(cls.async_storage)
+        cls.logic = RunUntilComplete(cls.async_logic, cls.loop)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.async_storage.close()
+        cls.loop.close()
+        super().tearDownClass()
+
+    def collect(self, ships):
+        async def collect():
+            return [ship async for ship in ships]
+        return self.loop.run_until_complete(collect())
+
+    def test_stream_ships(self):
+        data = deepcopy(self.ship_data)
+        for index in range(5):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            self.logic.create_ship(**data)
+
+        expected, __ = self.logic.get_ships(order_by='-created')
+        self.async_storage.stream_chunk_size = 2
+        try:
+            ships = self.async_logic.stream_ships(order_by='-created')
+            self.assertEqual(self.collect(ships), expected)
+
+            ships = self.async_logic.stream_ships(
+                order_by='-created', fields=['name'],
+            )
+            self.assertEqual(
+                self.collect(ships),
+                [{'name': ship['name']} for ship in expected],
+            )
+        finally:
+            del self.async_storage.stream_chunk_size
+
+    def test_stream_ships_order_by_nullable_field(self):
+        data = deepcopy(self.ship_data)
+        for index in range(5):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            data['notes'] = 'Notes' if index % 2 else None
+            self.logic.create_ship(**data)
+
+        # Notes may be null, so the pages follow on by offset.
+        expected, __ = self.logic.get_ships(order_by='-notes')
+        self.async_storage.stream_chunk_size = 2
+        try:
+            ships = self.async_logic.stream_ships(order_by='-notes')
+            self.assertEqual(self.collect(ships), expected)
+        finally:
+            del self.async_storage.stream_chunk_size
+
+    def test_calls_run_concurrently(self):
+        self.logic.create_ship(**deepcopy(self.ship_data))
+
+        async def gather():
+            return await asyncio.gather(*[
+                self.async_logic.get_ships(user_ids=[1]) for __ in range(20)
+            ])
+
+        results = self.loop.run_until_complete(gather())
+        self.assertEqual([count for __, count in results], [1] * 20)
+
+
+class TestAsyncShipLogic_PureMemoryStorage(AsyncShipLogicInterface, TestCase):
+
+    async_storage = AsyncShipPureMemoryStorage()
+
+
+class TestAsyncShipLogic_DjangoStorage(AsyncShipLogicInterface, TestCase):
+
+    async_storage = AsyncShipDjangoStorage(max_workers=4)
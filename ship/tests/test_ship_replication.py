@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import TestCase
+
+from ship.replication import SQLiteReplicator
+
+
+class TestSQLiteReplicator(TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.primary = os.path.join(self.data_dir, 'primary.sqlite3')
+        self.replica = os.path.join(self.data_dir, 'replica.sqlite3')
+        self.write('CREATE TABLE ship (name TEXT)')
+
+        self.replicator = SQLiteReplicator(
+            self.primary, [self.replica], lag=1.0, interval=0.5,
+        )
+        self.replicator.sync()
+
+    def tearDown(self):
+        self.replicator.stop()
+        shutil.rmtree(self.data_dir)
+
+    def write(self, sql):
+        with sqlite3.connect(self.primary) as connection:
+            connection.execute(sql)
+
+    def replicated(self, connection):
+        return [row[0] for row in connection.execute('SELECT name FROM ship')]
+
+    def test_writes_show_after_the_lag(self):
+        # Stays open throughout, as a Django connection would.
+        replica = sqlite3.connect(self.replica)
+        self.addCleanup(replica.close)
+
+        self.write("INSERT INTO ship VALUES ('FIRST')")
+        self.replicator.tick(now=0.0)
+        self.assertEqual(self.replicated(replica), [])
+
+        self.write("INSERT INTO ship VALUES ('SECOND')")
+        # Too soon for another snapshot.
+        self.replicator.tick(now=0.2)
+        self.replicator.tick(now=0.5)
+        self.assertEqual(self.replicated(replica), [])
+
+        self.replicator.tick(now=1.0)
+        self.assertEqual(self.replicated(replica), ['FIRST'])
+
+        self.replicator.tick(now=1.5)
+        self.assertEqual(self.replicated(replica), ['FIRST', 'SECOND'])
+
+    def test_late_ticks_apply_the_latest_due_snapshot(self):
+        self.write("INSERT INTO ship VALUES ('FIRST')")
+        self.replicator.tick(now=0.0)
+        self.write("INSERT INTO ship VALUES ('SECOND')")
+        self.replicator.tick(now=0.5)
+
+        self.replicator.tick(now=5.0)
+
+        replica = sqlite3.connect(self.replica)
+        self.addCleanup(replica.close)
+        self.assertEqual(self.replicated(replica), ['FIRST', 'SECOND'])
+        # Only the snapshot taken at 5.0 is still waiting.
+        self.assertEqual(len(self.replicator.pending), 1)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import TestCase
+
+import pytz
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from ship.renderers import ShipJSONRenderer
+from ship.serializers import ShipSerializer
+from ship.storage import ShipPureMemoryStorage
+
+
+class TestShipSerializer(TestCase):
+
+    def setUp(self):
+        self.storage = ShipPureMemoryStorage()
+        self.storage.persist_ship(
+            name='GOODSHIP COTTON', imo_number='1234567', user_id=1,
+        )
+        self.storage.persist_ship(
+            name='SHIP   é', imo_number='7654321', user_id=1,
+            notes='Notes  ',
+        )
+        self.ships, __ = self.storage.retrieve_ships(order_by='id')
+
+    @staticmethod
+    def generic(ship):
+        serializer = ShipSerializer()
+        return serializers.Serializer.to_representation(serializer, ship)
+
+    def test_fast_path_matches_generic(self):
+        for ship in self.ships:
+            data = ShipSerializer(ship).data
+            self.assertEqual(data, self.generic(ship))
+            self.assertEqual(list(data), list(self.generic(ship)))
+            self.assertEqual(
+                JSONRenderer().render(data),
+                JSONRenderer().render(self.generic(ship)),
+            )
+
+        self.assertEqual(
+            ShipSerializer(self.ships, many=True).data,
+            [self.generic(ship) for ship in self.ships],
+        )
+
+    def test_fast_path_missing_keys(self):
+        ship = dict(self.ships[0])
+        del ship['notes']
+        del ship['status']
+        self.assertEqual(
+            ShipSerializer(ship).data,
+            OrderedDict([('name', ship['name']), ('imo_number', '1234567')]),
+        )
+
+        del ship['name']
+        with self.assertRaises(KeyError):
+            ShipSerializer(ship).to_representation(ship)
+
+    def test_fast_path_converts_to_string(self):
+        ship = dict(self.ships[0], imo_number=1234567, notes=None)
+        data = ShipSerializer(ship).data
+        self.assertEqual(data['imo_number'], '1234567')
+        self.assertIsNone(data['notes'])
+        self.assertEqual(data, self.generic(ship))
+
+
+class TestShipJSONRenderer(TestCase):
+
+    def setUp(self):
+        self.storage = ShipPureMemoryStorage()
+        for index in range(5):
+            self.storage.persist_ship(
+                name='SHIP {index}  '.format(index=index),
+                imo_number='{index:07d}'.format(index=index),
+                user_id=1,
+            )
+        self.storage.update_ship(id=1, notes='Updated é')
+
+    def page(self, ships):
+        return OrderedDict([
+            ('count', len(ships)),
+            ('next', None),
+            ('previous', None),
+            ('results', ships),
+        ])
+
+    def assertRendersLikeDRF(self, data, **kwargs):
+        self.assertEqual(
+            ShipJSONRenderer().render(data, **kwargs),
+            JSONRenderer().render(data, **kwargs),
+        )
+
+    def test_render_page(self):
+        ships, __ = self.storage.retrieve_ships(order_by='id')
+        self.assertRendersLikeDRF(self.page(ships))
+        self.assertRendersLikeDRF(
+            self.page(ships), accepted_media_type='application/json; indent=4'
+        )
+
+    def test_render_time_zones(self):
+        ship, = self.storage.retrieve_ships(id=1)[0]
+        now = timezone.now()
+        for created in (
+            now,
+            now.replace(microsecond=0),
+            now.astimezone(dt_timezone.utc),
+            now.astimezone(dt_timezone(timedelta(hours=2))),
+            now.astimezone(pytz.timezone('Europe/London')),
+            datetime(2017, 1, 1, 12, 30),
+        ):
+            self.assertRendersLikeDRF(
+                self.page([dict(ship, created=created)])
+            )
+
+    def test_render_other_data(self):
+        ship, = self.storage.retrieve_ships(id=1)[0]
+        self.assertRendersLikeDRF(ship)
+        self.assertRendersLikeDRF([{'status': 201, 'ship': ship}])
+        self.assertRendersLikeDRF({'results': 'not ships'})
+        self.assertEqual(ShipJSONRenderer().render(None), b'')
+
+    def test_render_leaves_data_unchanged(self):
+        ships, __ = self.storage.retrieve_ships(order_by='id')
+        page = self.page(ships)
+        ShipJSONRenderer().render(page)
+        self.assertIs(page['results'], ships)
+        self.assertIsInstance(ships[0]['created'], datetime)
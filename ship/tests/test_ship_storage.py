@@ -1,9 +1,35 @@
 # -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import threading
+import time
 from copy import deepcopy
-from unittest import TestCase
+from datetime import timedelta
+from unittest import TestCase, mock, skipUnless
 
-from ship.exceptions import DuplicateError, NotFoundException
-from ship.storage import ShipDjangoStorage, ShipPureMemoryStorage
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ship.exceptions import (
+    DuplicateError,
+    NotFoundException,
+    UnknownFieldError,
+)
+from ship.storage import (
+    COUNT_CACHED,
+    COUNT_EXACT,
+    COUNT_PAGE,
+    CachedShipStorage,
+    GroupCommitShipStorage,
+    ReplicatedShipStorage,
+    ShardedShipStorage,
+    ShipDjangoStorage,
+    ShipPureMemoryStorage,
+)
 
 
 class ShipStorageInterface:
@@ -48,13 +74,13 @@ class ShipStorageInterface:
     def test_retrieve_ships(self):
         data = deepcopy(self.ship_data)
 
-        expected = self.storage.persist_ship(**data)
+        self.storage.persist_ship(**data)
 
         # We will create 10 additional ships that we don't expect to see
         # when we retrieve the ships by user_id later on.
         for index in range(9):
             data['imo_number'] = '765432{index}'.format(index=index)
-            self.storage.persist_ship(**data)
+            expected = self.storage.persist_ship(**data)
 
         # Create a ship for a different user that won't be returned when
         # retrieving ships
@@ -70,6 +96,282 @@ class ShipStorageInterface:
         self.assertEqual(len(ships), 10)
         self.assertEqual(ships[0], expected)
 
+    def test_retrieve_ships_filtered_by_status(self):
+        data = deepcopy(self.ship_data)
+        active = self.storage.persist_ship(**data)
+
+        data['imo_number'] = '7654321'
+        deleted = self.storage.persist_ship(**data)
+        self.storage.delete_ship(deleted['id'])
+
+        ships, total_count = self.storage.retrieve_ships(
+            user_ids=[self.ship_data['user_id']],
+            status='ACTIVE',
+        )
+        self.assertEqual(total_count, 1)
+        self.assertEqual(ships[0]['id'], active['id'])
+
+        ships, total_count = self.storage.retrieve_ships(status='DELETED')
+        self.assertEqual(total_count, 1)
+        self.assertEqual(ships[0]['id'], deleted['id'])
+
+    def test_retrieve_ships_by_ids(self):
+        data = deepcopy(self.ship_data)
+        ids = []
+        for index in range(3):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            ids.append(self.storage.persist_ship(**data)['id'])
+
+        ships, total_count = self.storage.retrieve_ships(
+            ids=[str(ship_id) for ship_id in ids[:2]],
+            order_by='id',
+        )
+        self.assertEqual(total_count, 2)
+        self.assertEqual([ship['id'] for ship in ships], ids[:2])
+
+    def test_retrieve_ships_search(self):
+        data = deepcopy(self.ship_data)
+        ids = {}
+        for name, imo_number, user_id in (
+                ('GOODSHIP COTTON', '7654320', 1),
+                ('Sea Breeze', '7654321', 1),
+                ('Northern Star', '1234567', 2),
+        ):
+            data.update(name=name, imo_number=imo_number, user_id=user_id)
+            ids[name] = self.storage.persist_ship(**data)['id']
+
+        def search(text, **kwargs):
+            ships, count = self.storage.retrieve_ships(
+                search=text, order_by='id', **kwargs
+            )
+            self.assertEqual(count, len(ships))
+            return [ship['id'] for ship in ships]
+
+        self.assertEqual(search('cotton'), [ids['GOODSHIP COTTON']])
+        self.assertEqual(search('sea b'), [ids['Sea Breeze']])
+        self.assertEqual(
+            search('765432'), [ids['GOODSHIP COTTON'], ids['Sea Breeze']],
+        )
+        self.assertEqual(search('4567'), [ids['Northern Star']])
+        self.assertEqual(search('S'), sorted(ids.values()))
+        self.assertEqual(search('ar', user_ids=[1]), [])
+        self.assertEqual(search('OODSHIP COTTON!'), [])
+        self.assertEqual(
+            search('e', user_ids=[1], status='ACTIVE'), [ids['Sea Breeze']],
+        )
+        self.assertEqual(
+            [
+                ship['id'] for ship in self.storage.stream_ships(
+                    search='star', fields=['id'],
+                )
+            ],
+            [ids['Northern Star']],
+        )
+
+        self.storage.update_ship(ids['Sea Breeze'], name='Sea Wind')
+        self.assertEqual(search('breeze'), [])
+        self.assertEqual(search('wind'), [ids['Sea Breeze']])
+
+    def test_retrieve_ships_limit_and_offset(self):
+        data = deepcopy(self.ship_data)
+        ids = []
+        for index in range(5):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            ids.append(self.storage.persist_ship(**data)['id'])
+
+        ships, total_count = self.storage.retrieve_ships(
+            user_ids=[self.ship_data['user_id']],
+            order_by='-id',
+            limit=2,
+            offset=1,
+        )
+        self.assertEqual(total_count, 5)
+        self.assertEqual([ship['id'] for ship in ships], ids[3:1:-1])
+
+    def test_retrieve_ships_include_count(self):
+        data = deepcopy(self.ship_data)
+        ids = []
+        for index in range(5):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            ids.append(self.storage.persist_ship(**data)['id'])
+
+        for page in (
+                {'limit': 2},
+                {'limit': 2, 'offset': 4},
+                {'limit': 2, 'offset': 6},
+                {'limit': 2, 'cursor': (ids[3], ids[3])},
+                {},
+        ):
+            for include_count in (
+                    True, COUNT_EXACT, COUNT_PAGE, COUNT_CACHED,
+            ):
+                __, total_count = self.storage.retrieve_ships(
+                    user_ids=[1], include_count=include_count, **page
+                )
+                self.assertEqual(total_count, 5, (page, include_count))
+
+            ships, total_count = self.storage.retrieve_ships(
+                user_ids=[1], include_count=False, **page
+            )
+            self.assertIsNone(total_count)
+        self.assertEqual([ship['id'] for ship in ships], ids)
+
+        # Counts follow the writes.
+        self.storage.delete_ship(ids[0])
+        self.storage.update_ship(ids[1], name='OTHER SHIP')
+        for include_count in (COUNT_EXACT, COUNT_CACHED):
+            __, total_count = self.storage.retrieve_ships(
+                user_ids=[1], status='ACTIVE', search='goodship', limit=2,
+                include_count=include_count,
+            )
+            self.assertEqual(total_count, 3)
+
+        data['imo_number'] = '7654329'
+        self.storage.persist_ship(**data)
+        __, total_count = self.storage.retrieve_ships(
+            user_ids=[1], status='ACTIVE', search='goodship', limit=2,
+            include_count=COUNT_CACHED,
+        )
+        self.assertEqual(total_count, 4)
+
+    def test_retrieve_ships_with_cursor(self):
+        data = deepcopy(self.ship_data)
+        for index in range(5):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            self.storage.persist_ship(**data)
+
+        for order_by in ('created', '-created', 'id', '-name'):
+            expected, __ = self.storage.retrieve_ships(order_by=order_by)
+
+            field = order_by.lstrip('-')
+            actual = []
+            cursor = None
+            while True:
+                ships, total_count = self.storage.retrieve_ships(
+                    order_by=order_by, limit=2, cursor=cursor,
+                )
+                self.assertEqual(total_count, 5)
+                if not ships:
+                    break
+
+                actual.extend(ships)
+                cursor = (ships[-1][field], ships[-1]['id'])
+
+            self.assertEqual(actual, expected)
+
+    def test_stream_ships(self):
+        data = deepcopy(self.ship_data)
+        for index in range(5):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            self.storage.persist_ship(**data)
+
+        data['user_id'] = 666
+        self.storage.persist_ship(**data)
+
+        expected, __ = self.storage.retrieve_ships(
+            user_ids=[self.ship_data['user_id']],
+            order_by='-created',
+        )
+        ships = self.storage.stream_ships(
+            user_ids=[self.ship_data['user_id']],
+            order_by='-created',
+        )
+
+        self.assertFalse(isinstance(ships, list))
+        self.assertEqual(list(ships), expected)
+
+    def test_retrieve_ships_only_fields(self):
+        data = deepcopy(self.ship_data)
+        data['notes'] = 'Long notes'
+        for index in range(3):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            self.storage.persist_ship(**data)
+
+        expected, __ = self.storage.retrieve_ships(order_by='-id')
+        ships, count = self.storage.retrieve_ships(
+            order_by='-id', limit=2, fields=['name', 'id', 'status'],
+        )
+
+        self.assertEqual(count, 3)
+        self.assertEqual(ships, [
+            {'id': ship['id'], 'name': ship['name'], 'status': 'ACTIVE'}
+            for ship in expected[:2]
+        ])
+
+        streamed = self.storage.stream_ships(
+            order_by='-id', fields=['imo_number'],
+        )
+        self.assertEqual(
+            list(streamed),
+            [{'imo_number': ship['imo_number']} for ship in expected],
+        )
+
+    def test_retrieve_ships_unknown_fields(self):
+        with self.assertRaises(UnknownFieldError):
+            self.storage.retrieve_ships(fields=['name', 'password'])
+
+        with self.assertRaises(UnknownFieldError):
+            self.storage.stream_ships(fields=['password'])
+
+    def test_retrieve_ships_unknown_order_by(self):
+        with self.assertRaises(UnknownFieldError):
+            self.storage.retrieve_ships(order_by='-password')
+
+        with self.assertRaises(UnknownFieldError):
+            self.storage.stream_ships(order_by='password')
+
+    def test_retrieve_ships_order_by_nullable_field(self):
+        data = deepcopy(self.ship_data)
+        ids = []
+        for index, notes in enumerate(('b', None, 'a', None)):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            data['notes'] = notes
+            ids.append(self.storage.persist_ship(**data)['id'])
+
+        # Ships without notes come first, as SQLite sorts them.
+        expected = [ids[1], ids[3], ids[2], ids[0]]
+        ships, __ = self.storage.retrieve_ships(order_by='notes', limit=4)
+        self.assertEqual([ship['id'] for ship in ships], expected)
+
+        ships = self.storage.stream_ships(order_by='-notes')
+        self.assertEqual(
+            [ship['id'] for ship in ships], list(reversed(expected)),
+        )
+
+        with self.assertRaises(UnknownFieldError):
+            self.storage.retrieve_ships(
+                order_by='notes', limit=2, cursor=(None, ids[1]),
+            )
+
+    def test_persist_ships(self):
+        data = deepcopy(self.ship_data)
+        existing = self.storage.persist_ship(**data)
+
+        batch = []
+        for index in range(3):
+            row = deepcopy(self.ship_data)
+            row['imo_number'] = '765432{index}'.format(index=index)
+            batch.append(row)
+
+        # One duplicate of a stored ship and one within the batch itself.
+        batch.insert(1, deepcopy(self.ship_data))
+        batch.append(deepcopy(batch[0]))
+
+        results = self.storage.persist_ships(batch)
+
+        self.assertEqual(len(results), 5)
+        self.assertIsInstance(results[1], DuplicateError)
+        self.assertIsInstance(results[4], DuplicateError)
+
+        created = [results[0], results[2], results[3]]
+        for ship, row in zip(created, [batch[0], batch[2], batch[3]]):
+            self.assertEqual(ship['imo_number'], row['imo_number'])
+            self.assertEqual(ship['status'], 'ACTIVE')
+
+        ships, count = self.storage.retrieve_ships(order_by='id')
+        self.assertEqual(count, 4)
+        self.assertEqual(ships, [existing] + created)
+
     def test_update_ship(self):
         data = deepcopy(self.ship_data)
         ship = self.storage.persist_ship(**data)
@@ -103,6 +405,79 @@ class ShipStorageInterface:
 
         self.assertEqual(actual['user_id'], expected['user_id'])
 
+    def test_update_ship_read_only_fields(self):
+        data = deepcopy(self.ship_data)
+        ship = self.storage.persist_ship(**data)
+
+        actual = self.storage.update_ship(
+            id=ship['id'],
+            name='NEW NAME',
+            created=timezone.now() + timedelta(days=1),
+            modified=timezone.now() - timedelta(days=1),
+        )
+
+        # Only the changes which were written show up in the result.
+        ships, __ = self.storage.retrieve_ships(id=ship['id'])
+        self.assertEqual(actual, ships[0])
+        self.assertEqual(actual['name'], 'NEW NAME')
+        self.assertEqual(actual['created'], ship['created'])
+        self.assertGreaterEqual(actual['modified'], ship['modified'])
+
+    def test_update_ships(self):
+        data = deepcopy(self.ship_data)
+        ids = []
+        for index in range(3):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            ids.append(self.storage.persist_ship(**data)['id'])
+
+        data['user_id'] = 666
+        other = self.storage.persist_ship(**data)
+
+        updated = self.storage.update_ships(
+            ids[:2] + [other['id'], 1234567889999],
+            user_ids=[self.ship_data['user_id']],
+            notes='Bulk notes',
+            user_id=666,
+        )
+        self.assertEqual(updated, 2)
+
+        ships, __ = self.storage.retrieve_ships(order_by='id')
+        self.assertEqual(
+            [(ship['notes'], ship['user_id']) for ship in ships],
+            [('Bulk notes', 1), ('Bulk notes', 1), (None, 1), (None, 666)],
+        )
+
+    def test_update_ships_raises_duplicate_error(self):
+        data = deepcopy(self.ship_data)
+        ids = []
+        for index in range(2):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            ids.append(self.storage.persist_ship(**data)['id'])
+
+        with self.assertRaises(DuplicateError):
+            self.storage.update_ships(ids, imo_number='7777777')
+
+        ships, __ = self.storage.retrieve_ships(order_by='id')
+        self.assertEqual(
+            [ship['imo_number'] for ship in ships], ['7654320', '7654321']
+        )
+
+    def test_delete_ships(self):
+        data = deepcopy(self.ship_data)
+        ids = []
+        for index in range(3):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            ids.append(self.storage.persist_ship(**data)['id'])
+
+        deleted = self.storage.delete_ships(ids[1:])
+        self.assertEqual(deleted, 2)
+
+        ships, count = self.storage.retrieve_ships(
+            status='DELETED', order_by='id',
+        )
+        self.assertEqual(count, 2)
+        self.assertEqual([ship['id'] for ship in ships], ids[1:])
+
     def test_delete_ship(self):
         data = deepcopy(self.ship_data)
         ship = self.storage.persist_ship(**data)
@@ -114,12 +489,871 @@ class ShipStorageInterface:
         self.assertEqual(count, 1)
         self.assertEqual(ships[0]['status'], 'DELETED')
 
+    def test_retrieve_version(self):
+        empty_version, last_modified = self.storage.retrieve_version(
+            user_ids=[1],
+        )
+        self.assertIsNone(last_modified)
+
+        ship = self.storage.persist_ship(**self.ship_data)
+        version, last_modified = self.storage.retrieve_version(user_ids=[1])
+        self.assertNotEqual(version, empty_version)
+        self.assertEqual(last_modified, ship['modified'])
+        self.assertEqual(
+            self.storage.retrieve_version(user_ids=[1]),
+            (version, last_modified),
+        )
+
+        other_version = self.storage.retrieve_version(user_ids=[2])
+        ship_version = self.storage.retrieve_version(id=ship['id'])
+        self.assertEqual(ship_version[1], ship['modified'])
+
+        updated = self.storage.update_ship(ship['id'], notes='Changed')
+        changed_version, last_modified = self.storage.retrieve_version(
+            user_ids=[1],
+        )
+        self.assertNotEqual(changed_version, version)
+        self.assertEqual(last_modified, updated['modified'])
+        self.assertNotEqual(
+            self.storage.retrieve_version(id=ship['id']), ship_version,
+        )
+        # Ships of other users are left alone.
+        self.assertEqual(
+            self.storage.retrieve_version(user_ids=[2]), other_version,
+        )
+
+        self.storage.delete_ships([ship['id']], user_ids=[1])
+        self.assertNotEqual(
+            self.storage.retrieve_version(user_ids=[1])[0], changed_version,
+        )
+
+    def test_retrieve_changes(self):
+        data = deepcopy(self.ship_data)
+        ships = []
+        for index, user_id in enumerate((1, 2, 1)):
+            data.update(
+                imo_number='765432{index}'.format(index=index),
+                user_id=user_id,
+            )
+            ships.append(self.storage.persist_ship(**data))
+        ids = [ship['id'] for ship in ships]
+
+        deleted = self.storage.delete_ship(ids[0])
+        changes = self.storage.retrieve_changes()
+        self.assertEqual(
+            [ship['id'] for ship in changes], [ids[1], ids[2], ids[0]],
+        )
+        self.assertEqual(changes[-1], deleted)
+
+        since = (changes[0]['modified'], changes[0]['id'])
+        self.assertEqual(
+            [
+                ship['id']
+                for ship in self.storage.retrieve_changes(since=since)
+            ],
+            [ids[2], ids[0]],
+        )
+        self.assertEqual(
+            self.storage.retrieve_changes(
+                since=since, user_ids=[1], limit=1, fields=['name'],
+            ),
+            [{'name': ships[2]['name']}],
+        )
+
+        since = (changes[-1]['modified'], changes[-1]['id'])
+        self.assertEqual(self.storage.retrieve_changes(since=since), [])
+
+    def test_retrieve_version_of_every_ship(self):
+        version = self.storage.retrieve_version()
+        self.storage.persist_ship(**self.ship_data)
+        self.assertNotEqual(self.storage.retrieve_version(), version)
+
+    def test_retrieve_fleet_stats(self):
+        self.assertEqual(self.storage.retrieve_fleet_stats(), {})
+
+        data = deepcopy(self.ship_data)
+        ships = []
+        for index, user_id in enumerate((1, 1, 1, 2)):
+            data.update(
+                imo_number='765432{index}'.format(index=index),
+                user_id=user_id,
+            )
+            ships.append(self.storage.persist_ship(**data))
+        self.storage.persist_ships([
+            dict(data, imo_number='7654329', user_id=1, status='DELETED'),
+            dict(data, imo_number='7654320', user_id=1),
+        ])
+        ids = [ship['id'] for ship in ships]
+
+        self.assertEqual(self.storage.retrieve_fleet_stats(), {
+            1: {'ACTIVE': 3, 'DELETED': 1},
+            2: {'ACTIVE': 1},
+        })
+
+        self.storage.delete_ship(ids[0])
+        self.storage.update_ship(ids[1], notes='Not a move')
+        self.storage.delete_ships(ids, user_ids=[1])
+        self.storage.update_ships(ids[2:], status='ACTIVE')
+        with self.assertRaises(DuplicateError):
+            self.storage.update_ships(ids[:2], status='ACTIVE', imo_number='7')
+
+        self.assertEqual(self.storage.retrieve_fleet_stats(user_ids=[1, 3]), {
+            1: {'ACTIVE': 1, 'DELETED': 3},
+            3: {},
+        })
+
+        self.storage.wipe()
+        self.assertEqual(self.storage.retrieve_fleet_stats(user_ids=[1]), {
+            1: {},
+        })
+
 
 class TestShipPureMemoryStorage(ShipStorageInterface, TestCase):
 
     storage = ShipPureMemoryStorage()
 
+    def test_update_ship_imo_number_raises_duplicate_error(self):
+        data = deepcopy(self.ship_data)
+        self.storage.persist_ship(**data)
+
+        data['imo_number'] = '7654321'
+        ship = self.storage.persist_ship(**data)
+
+        with self.assertRaises(DuplicateError):
+            self.storage.update_ship(
+                id=ship['id'],
+                imo_number=self.ship_data['imo_number'],
+            )
+
+    def test_repeated_values_are_interned(self):
+        data = deepcopy(self.ship_data)
+        first = self.storage.persist_ship(**data)
+
+        data['imo_number'] = '7654321'
+        data['user_id'] = str(data['user_id'])
+        data['status'] = ''.join(['ACT', 'IVE'])
+        second = self.storage.persist_ship(**data)
+
+        self.assertIs(first['user_id'], second['user_id'])
+        self.assertIs(first['status'], second['status'])
+
+    def test_versions_differ_across_wipes(self):
+        self.storage.persist_ship(**self.ship_data)
+        version = self.storage.retrieve_version(user_ids=[1])
+
+        self.storage.wipe()
+        ship = self.storage.persist_ship(**self.ship_data)
+        self.storage.update_ship(ship['id'], notes=None)
+        self.assertNotEqual(
+            self.storage.retrieve_version(user_ids=[1])[0], version[0],
+        )
+
+    def test_search_index_follows_writes(self):
+        ship = self.storage.persist_ship(**self.ship_data)
+        self.assertIn(ship['id'], self.storage._search_index['cot'])
+
+        self.storage.update_ship(ship['id'], name='GOODSHIP LINEN')
+        self.assertNotIn('cot', self.storage._search_index)
+        self.assertIn(ship['id'], self.storage._search_index['lin'])
+        # Trigrams of the IMO number are kept.
+        self.assertIn(ship['id'], self.storage._search_index['123'])
+
+    def test_change_log_is_compacted(self):
+        ship = self.storage.persist_ship(**self.ship_data)
+        for index in range(2000):
+            self.storage.update_ship(ship['id'], notes=str(index))
+
+        self.assertLess(len(self.storage._changes), 1100)
+        changes = self.storage.retrieve_changes()
+        self.assertEqual([ship['notes'] for ship in changes], ['1999'])
+
+    def test_update_ship_imo_number_frees_unique_index(self):
+        data = deepcopy(self.ship_data)
+        ship = self.storage.persist_ship(**data)
+
+        self.storage.update_ship(id=ship['id'], imo_number='7654321')
+
+        # The old IMO number is now free to be used again.
+        self.storage.persist_ship(**data)
+
+
+class TestShipPureMemoryStorage_Durable(ShipStorageInterface, TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.data_dir = tempfile.mkdtemp()
+        cls.storage = ShipPureMemoryStorage(
+            data_dir=cls.data_dir, snapshot_every=3,
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.storage.close()
+        shutil.rmtree(cls.data_dir)
+
+    def reopen(self):
+        """ Simulate a crash by abandoning the storage and starting anew. """
+        type(self).storage = ShipPureMemoryStorage(
+            data_dir=self.data_dir, snapshot_every=3,
+        )
+        return self.storage
+
+    def test_recovers_after_crash(self):
+        data = deepcopy(self.ship_data)
+        ships = []
+        for index in range(5):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            ships.append(self.storage.persist_ship(**data))
+
+        self.storage.update_ship(id=ships[0]['id'], notes='Some notes')
+        self.storage.delete_ship(ships[1]['id'])
+        expected, __ = self.storage.retrieve_ships(order_by='id')
+
+        # A crash in the middle of a write leaves a torn log entry behind.
+        with open(os.path.join(self.data_dir, 'ships.log'), 'ab') as log:
+            log.write(b'{"sequence": 99, "ship": [')
+
+        storage = self.reopen()
+        actual, __ = storage.retrieve_ships(order_by='id')
+        self.assertEqual(actual, expected)
+
+        # IDs and the unique index carry on from where they were.
+        with self.assertRaises(DuplicateError):
+            storage.persist_ship(**data)
+
+        data['imo_number'] = '7654329'
+        ship = storage.persist_ship(**data)
+        self.assertEqual(ship['id'], ships[-1]['id'] + 1)
+
+        ships, __ = self.reopen().retrieve_ships(order_by='id')
+        self.assertEqual(ships, actual + [ship])
+        self.assertEqual(self.storage.retrieve_fleet_stats(), {
+            1: {'ACTIVE': 5, 'DELETED': 1},
+        })
+
+    def test_recovers_from_snapshot_and_log_tail(self):
+        data = deepcopy(self.ship_data)
+        ship = self.storage.persist_ship(**data)
+        self.storage.snapshot()
+
+        # Only the writes after the snapshot should be left in the log.
+        self.storage.update_ship(id=ship['id'], name='NEW NAME')
+        with open(os.path.join(self.data_dir, 'ships.log'), 'rb') as log:
+            self.assertEqual(len(log.readlines()), 1)
+
+        ships, count = self.reopen().retrieve_ships(id=ship['id'])
+        self.assertEqual(count, 1)
+        self.assertEqual(ships[0]['name'], 'NEW NAME')
+        self.assertEqual(ships[0]['created'], ship['created'])
+
+    def test_writes_carry_on_while_a_snapshot_is_written(self):
+        data = deepcopy(self.ship_data)
+        ship = self.storage.persist_ship(**data)
+        journal = self.storage._journal
+        write_snapshot = journal.write_snapshot
+
+        def write_during_snapshot(ships, sequence):
+            # A write of another thread isn't held up by the snapshot.
+            writer = threading.Thread(
+                target=self.storage.update_ship,
+                args=(ship['id'],),
+                kwargs={'name': 'NEW NAME'},
+            )
+            writer.start()
+            writer.join(5)
+            self.assertFalse(writer.is_alive())
+            write_snapshot(ships, sequence)
+
+        with mock.patch.object(
+                journal, 'write_snapshot', side_effect=write_during_snapshot,
+        ):
+            self.storage.snapshot()
+
+        # The write made meanwhile isn't in the snapshot, so it stays logged.
+        with open(os.path.join(self.data_dir, 'ships.log'), 'rb') as log:
+            self.assertEqual(len(log.readlines()), 1)
+
+        ships, __ = self.reopen().retrieve_ships(id=ship['id'])
+        self.assertEqual(ships[0]['name'], 'NEW NAME')
+
+    def test_failed_log_write_leaves_indexes_alone(self):
+        data = deepcopy(self.ship_data)
+        ship = self.storage.persist_ship(**data)
+
+        with mock.patch.object(
+                self.storage._journal, 'append', side_effect=OSError,
+        ):
+            with self.assertRaises(OSError):
+                self.storage.update_ship(
+                    id=ship['id'], imo_number='7654321', status='DELETED',
+                )
+
+        __, count = self.storage.retrieve_ships(status='DELETED')
+        self.assertEqual(count, 0)
+        with self.assertRaises(DuplicateError):
+            self.storage.persist_ship(**data)
+
 
 class TestShipDjangoStorage(ShipStorageInterface, TestCase):
 
     storage = ShipDjangoStorage()
+
+    def test_search_uses_the_search_table(self):
+        if not self.storage._has_search_table(DEFAULT_DB_ALIAS):
+            self.skipTest('SQLite has no FTS5 trigram tokenizer')
+
+        ship = self.storage.persist_ship(**self.ship_data)
+        with CaptureQueriesContext(connection) as queries:
+            ships, __ = self.storage.retrieve_ships(search='cotton')
+        self.assertEqual([ship['id'] for ship in ships], [ship['id']])
+        self.assertTrue(
+            all('MATCH' in query['sql'] for query in queries.captured_queries)
+        )
+
+        # The API always filters on users, which must not skip the index.
+        with CaptureQueriesContext(connection) as queries:
+            ships, __ = self.storage.retrieve_ships(
+                search='cotton', user_ids=[1],
+            )
+        self.assertEqual([ship['id'] for ship in ships], [ship['id']])
+        self.assertTrue(
+            all('MATCH' in query['sql'] and 'user_id' in query['sql']
+                for query in queries.captured_queries)
+        )
+        self.assertEqual(
+            self.storage.retrieve_ships(search='cotton', user_ids=[2])[1], 0,
+        )
+        # The ships found are looked up, not those of the user or status.
+        plan = self.storage._filter_queryset(
+            user_ids=[1], status='ACTIVE', search='cotton',
+        ).explain()
+        self.assertIn('PRIMARY KEY', plan)
+        self.assertNotIn('_idx', plan)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.storage.retrieve_ships(search='co', user_ids=[1])
+        self.assertTrue(
+            all('MATCH' not in query['sql']
+                for query in queries.captured_queries)
+        )
+
+        self.storage.update_ship(ship['id'], imo_number='7654321')
+        self.assertEqual(self.storage.retrieve_ships(search='1234')[1], 0)
+        self.assertEqual(self.storage.retrieve_ships(search='6543')[1], 1)
+
+        self.storage.wipe()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO ship_ship_search(ship_ship_search) "
+                "VALUES ('integrity-check')"
+            )
+
+    def test_concurrent_moves_are_counted_once(self):
+        ship = self.storage.persist_ship(**self.ship_data)
+        now = timezone.now
+        raced = []
+
+        def race():
+            # Another writer deletes the ship between this writer's read
+            # and its write.
+            if not raced:
+                raced.append(True)
+                self.storage.delete_ship(ship['id'])
+            return now()
+
+        with mock.patch('ship.storage.timezone.now', side_effect=race):
+            deleted = self.storage.delete_ship(ship['id'])
+
+        self.assertEqual(deleted['status'], 'DELETED')
+        self.assertEqual(
+            self.storage.retrieve_fleet_stats(), {1: {'DELETED': 1}},
+        )
+
+    def test_fleet_stats_count_no_ships(self):
+        self.storage.persist_ship(**self.ship_data)
+
+        with CaptureQueriesContext(connection) as queries:
+            stats = self.storage.retrieve_fleet_stats(user_ids=[1])
+        self.assertEqual(stats, {1: {'ACTIVE': 1}})
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertNotIn('ship_ship"', queries.captured_queries[0]['sql'])
+
+    def test_count_strategies(self):
+        data = deepcopy(self.ship_data)
+        ids = []
+        for index in range(3):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            ids.append(self.storage.persist_ship(**data)['id'])
+
+        def queries(**kwargs):
+            with CaptureQueriesContext(connection) as captured:
+                self.storage.retrieve_ships(user_ids=[1], **kwargs)
+            return len(captured.captured_queries)
+
+        self.assertEqual(queries(limit=2), 2)
+        self.assertEqual(queries(limit=2, include_count=False), 1)
+        # The last page tells the count.
+        self.assertEqual(
+            queries(limit=2, offset=2, include_count=COUNT_PAGE), 1,
+        )
+        self.assertEqual(queries(limit=2, include_count=COUNT_PAGE), 2)
+
+        # Every page of a query shares its count.
+        self.assertEqual(queries(limit=1, include_count=COUNT_CACHED), 2)
+        self.assertEqual(
+            queries(limit=1, offset=1, include_count=COUNT_CACHED), 1,
+        )
+
+        # Only writes which may change the count drop it.
+        self.storage.update_ship(ids[0], notes='Some notes')
+        self.assertEqual(queries(limit=1, include_count=COUNT_CACHED), 1)
+        self.storage.delete_ships(ids[:1], user_ids=[2])
+        self.assertEqual(queries(limit=1, include_count=COUNT_CACHED), 1)
+        self.storage.delete_ships(ids[:1], user_ids=[1])
+        self.assertEqual(queries(limit=1, include_count=COUNT_CACHED), 2)
+
+    def test_counts_taken_during_a_write_are_not_cached(self):
+        counts = self.storage.counts
+        key, tags = counts.key(user_ids=[1])
+
+        generation = counts.generation
+        counts.invalidate([2])
+        counts.set(key, tags, 5, generation)
+        self.assertIsNone(counts.get(key))
+
+        counts.set(key, tags, 5, counts.generation)
+        self.assertEqual(counts.get(key), 5)
+        counts.invalidate([1])
+        self.assertIsNone(counts.get(key))
+
+    def test_retrieve_ships_only_reads_fields(self):
+        self.storage.persist_ship(**self.ship_data)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.storage.retrieve_ships(fields=['id', 'name'])
+            list(self.storage.stream_ships(fields=['id', 'name']))
+
+        for query in queries.captured_queries:
+            self.assertNotIn('notes', query['sql'])
+
+
+@skipUnless(
+    len(settings.SHIP_SHARDS) == 2, 'Run with SHIP_SHARDS=2 to test sharding.'
+)
+class TestShardedShipStorage(ShipStorageInterface, TransactionTestCase):
+
+    # The test runner only creates the test databases of the shards for test
+    # cases which ask for them.
+    databases = {DEFAULT_DB_ALIAS}.union(settings.SHIP_SHARDS)
+    multi_db = True
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.storage = ShardedShipStorage()
+
+    def persist_ships(self, user_ids):
+        data = deepcopy(self.ship_data)
+        ships = []
+        for index, user_id in enumerate(user_ids):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            data['user_id'] = user_id
+            ships.append(self.storage.persist_ship(**data))
+        return ships
+
+    def shard_counts(self):
+        return [
+            storage.retrieve_ships()[1] for storage in self.storage.storages
+        ]
+
+    def test_shards_are_migrated(self):
+        # Every interface test depends on it, check it once and clearly.
+        for alias in self.storage.shards:
+            tables = connections[alias].introspection.table_names()
+            for model in (
+                    self.storage.ship_model, ShipDjangoStorage.stats_model,
+            ):
+                self.assertIn(model._meta.db_table, tables, alias)
+
+    def test_ships_are_partitioned_by_user(self):
+        ships = self.persist_ships([1, 1, 2, 3, 4, 4, 4])
+
+        self.assertEqual(self.shard_counts(), [4, 3])
+        self.assertEqual(len({ship['id'] for ship in ships}), 7)
+        for ship in ships:
+            self.assertEqual(
+                self.storage.retrieve_ships(id=ship['id'])[0], [ship]
+            )
+
+    def test_ids_taken_by_another_writer_are_skipped(self):
+        ship, = self.persist_ships([2])
+
+        # Another process takes the next IDs on the shard of user 2.
+        data = dict(self.ship_data, user_id=4, imo_number='1111111')
+        taken = self.storage.storages[0].persist_ship(
+            id=ship['id'] + 2, **data
+        )
+
+        other = self.storage.persist_ship(
+            **dict(self.ship_data, user_id=2, imo_number='2222222')
+        )
+        self.assertGreater(other['id'], taken['id'])
+        self.assertEqual(other['id'] % 2, 0)
+
+    def test_single_user_queries_go_to_one_shard(self):
+        self.persist_ships([1, 2])
+
+        self.assertEqual(
+            list(self.storage._route(user_ids=[2])), [0]
+        )
+        self.assertEqual(
+            list(self.storage._route(user_ids=[1, 3])), [1]
+        )
+        self.assertEqual(
+            list(self.storage._route(user_ids=[1, 2])), [0, 1]
+        )
+
+    def test_fan_out_merges_pages(self):
+        ships = self.persist_ships([1, 2, 3, 4, 5, 6, 7, 8])
+        user_ids = list(range(1, 9))
+
+        for order_by in ('id', '-id', 'created', '-modified', 'imo_number'):
+            descending = order_by.startswith('-')
+            field = order_by.lstrip('-')
+            expected = sorted(
+                ships,
+                key=lambda ship: (ship[field], ship['id']),
+                reverse=descending,
+            )
+
+            page, count = self.storage.retrieve_ships(
+                user_ids=user_ids, order_by=order_by, limit=3, offset=2,
+            )
+            self.assertEqual(count, 8)
+            self.assertEqual(page, expected[2:5])
+
+            seen, cursor = [], None
+            while True:
+                page, __ = self.storage.retrieve_ships(
+                    user_ids=user_ids, order_by=order_by, limit=3,
+                    cursor=cursor, fields=['name'],
+                )
+                seen.extend(page)
+                if len(page) < 3:
+                    break
+                cursor = (
+                    expected[len(seen) - 1][field],
+                    expected[len(seen) - 1]['id'],
+                )
+
+            self.assertEqual(
+                seen, [{'name': ship['name']} for ship in expected]
+            )
+            self.assertEqual(
+                list(self.storage.stream_ships(
+                    user_ids=user_ids, order_by=order_by,
+                )),
+                expected,
+            )
+
+
+@skipUnless(
+    len(settings.SHIP_REPLICAS) == 1,
+    'Run with SHIP_REPLICAS=1 to test read replicas.',
+)
+class TestReplicatedShipStorage(ShipStorageInterface, TestCase):
+
+    storage = ReplicatedShipStorage()
+
+    def reads_from(self, user_ids=None):
+        return self.storage._reader(user_ids).using
+
+    def test_reads_go_to_replicas(self):
+        self.assertEqual(self.reads_from([1]), 'replica_0')
+        self.assertEqual(self.reads_from(), 'replica_0')
+
+    def test_writers_read_their_writes_from_the_primary(self):
+        ship = self.storage.persist_ship(**self.ship_data)
+
+        self.assertEqual(self.reads_from([1]), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.reads_from([1, 2]), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.reads_from([2]), 'replica_0')
+        # Any recent write may be missing from a read of every user.
+        self.assertEqual(self.reads_from(), DEFAULT_DB_ALIAS)
+
+        self.storage.wipe()
+        self.storage.delete_ships([ship['id']], user_ids=[2])
+        self.assertEqual(self.reads_from([2]), 'replica_0')
+
+    def test_writers_read_from_the_primary_of_the_storage(self):
+        storage = ReplicatedShipStorage(using='ships_0')
+        self.storage.persist_ship(**self.ship_data)
+
+        self.assertEqual(storage._reader([1]).using, 'ships_0')
+        self.assertEqual(storage._reader([2]).using, 'replica_0')
+
+    def test_writes_of_unknown_owners_pin_every_user(self):
+        with override_settings(SHIP_REPLICA_STICKY_SECONDS=0):
+            ship = self.storage.persist_ship(**self.ship_data)
+
+        self.storage.update_ships([ship['id']], notes='Changed')
+        self.assertEqual(self.reads_from([2]), DEFAULT_DB_ALIAS)
+
+    def test_stickiness_expires(self):
+        with override_settings(SHIP_REPLICA_STICKY_SECONDS=0):
+            ship = self.storage.persist_ship(**self.ship_data)
+
+        self.assertEqual(self.reads_from([1]), 'replica_0')
+        # The test replica mirrors the primary, so has no lag.
+        self.assertEqual(
+            self.storage.retrieve_ships(user_ids=[1]), ([ship], 1)
+        )
+
+
+class TestCachedShipPureMemoryStorage(ShipStorageInterface, TestCase):
+
+    storage = CachedShipStorage(ShipPureMemoryStorage())
+
+    def persist_ships(self, count, user_id=1):
+        data = deepcopy(self.ship_data)
+        data['user_id'] = user_id
+        ships = []
+        for index in range(count):
+            data['imo_number'] = '765432{index}'.format(index=index)
+            ships.append(self.storage.persist_ship(**data))
+        return ships
+
+    def test_cache_hits_and_misses(self):
+        self.persist_ships(2)
+
+        first = self.storage.retrieve_ships(user_ids=[1], order_by='id')
+        second = self.storage.retrieve_ships(user_ids=['1'], order_by='id')
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.storage.stats()['misses'], 1)
+        self.assertEqual(self.storage.stats()['hits'], 1)
+
+    def test_cached_ships_are_copies(self):
+        self.persist_ships(1)
+
+        ships, __ = self.storage.retrieve_ships(user_ids=[1])
+        ships[0]['name'] = 'CHANGED'
+
+        ships, __ = self.storage.retrieve_ships(user_ids=[1])
+        self.assertEqual(ships[0]['name'], self.ship_data['name'])
+
+    def test_writes_invalidate_by_user_and_id(self):
+        ship, = self.persist_ships(1)
+        other, = self.persist_ships(1, user_id=666)
+
+        self.storage.retrieve_ships(user_ids=[1])
+        self.storage.retrieve_ships(user_ids=[666])
+        self.storage.retrieve_ships(id=ship['id'])
+        self.storage.retrieve_ships(id=other['id'])
+
+        self.storage.update_ship(id=ship['id'], notes='Changed')
+
+        # Only the entries for the ship and its owner were dropped.
+        self.assertEqual(self.storage.stats()['invalidations'], 2)
+
+        ships, __ = self.storage.retrieve_ships(id=ship['id'])
+        self.assertEqual(ships[0]['notes'], 'Changed')
+
+        self.storage.retrieve_ships(user_ids=[666])
+        self.assertEqual(self.storage.stats()['hits'], 1)
+
+    def test_writes_during_a_miss_are_not_cached(self):
+        ship, = self.persist_ships(1)
+        retrieve_ships = self.storage.storage.retrieve_ships
+
+        def read_then_write(write):
+            def read(**kwargs):
+                # The write lands after the read, before it is cached.
+                result = retrieve_ships(**kwargs)
+                write()
+                return result
+            return read
+
+        for write in (
+                # Invalidates the entries of the ship and its owner.
+                lambda: self.storage.update_ship(ship['id'], notes='Noted'),
+                # Has no owners, so clears the cache.
+                lambda: self.storage.delete_ships([ship['id']]),
+        ):
+            with mock.patch.object(
+                    self.storage.storage, 'retrieve_ships',
+                    side_effect=read_then_write(write),
+            ):
+                self.storage.retrieve_ships(user_ids=[1])
+
+            self.assertEqual(self.storage.stats()['entries'], 0)
+
+        ships, __ = self.storage.retrieve_ships(user_ids=[1])
+        self.assertEqual(
+            (ships[0]['notes'], ships[0]['status']), ('Noted', 'DELETED'),
+        )
+
+    def test_bulk_writes_without_owner_clear_the_cache(self):
+        ship, = self.persist_ships(1)
+        self.storage.retrieve_ships(user_ids=[666])
+
+        self.storage.delete_ships([ship['id']])
+
+        self.assertEqual(self.storage.stats()['entries'], 0)
+
+    def test_lru_eviction(self):
+        storage = CachedShipStorage(ShipPureMemoryStorage(), max_entries=2)
+
+        storage.retrieve_ships(user_ids=[1])
+        storage.retrieve_ships(user_ids=[2])
+        storage.retrieve_ships(user_ids=[1])
+        storage.retrieve_ships(user_ids=[3])
+
+        self.assertEqual(storage.stats()['evictions'], 1)
+
+        # User 2 was the least recently used, so it was evicted.
+        storage.retrieve_ships(user_ids=[1])
+        storage.retrieve_ships(user_ids=[2])
+        self.assertEqual(storage.stats()['hits'], 2)
+
+    def test_max_rows_eviction(self):
+        self.persist_ships(3)
+        self.persist_ships(3, user_id=666)
+        storage = CachedShipStorage(self.storage.storage, max_rows=4)
+
+        storage.retrieve_ships(user_ids=[1])
+        storage.retrieve_ships(user_ids=[666])
+
+        self.assertEqual(storage.stats()['evictions'], 1)
+        self.assertEqual(storage.stats()['rows'], 3)
+
+    def test_ttl_expiry(self):
+        storage = CachedShipStorage(ShipPureMemoryStorage(), ttl=0)
+
+        storage.retrieve_ships(user_ids=[1])
+        storage.retrieve_ships(user_ids=[1])
+
+        self.assertEqual(storage.stats()['expirations'], 1)
+        self.assertEqual(storage.stats()['hits'], 0)
+
+
+class TestCachedShipDjangoStorage(ShipStorageInterface, TestCase):
+
+    storage = CachedShipStorage(ShipDjangoStorage())
+
+
+class TestGroupCommitShipStorage(ShipStorageInterface, TestCase):
+
+    storage = GroupCommitShipStorage(ShipDjangoStorage())
+
+    def run_writers(self, storage, writes):
+        """ Make each write in a thread of its own, at once.
+
+        Returns:
+            list: The result or error of every write, in order.
+        """
+        outcomes = [None] * len(writes)
+
+        def write(index, method, kwargs):
+            try:
+                outcomes[index] = getattr(storage, method)(**kwargs)
+            # Interrupted writers included.
+            except BaseException as err:  # pylint: disable=broad-except
+                outcomes[index] = err
+
+        threads = [
+            threading.Thread(target=write, args=(index,) + writes[index])
+            for index in range(len(writes))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_concurrent_writes_share_a_commit(self):
+        ship = self.storage.persist_ship(**self.ship_data)
+        # Only full batches are committed, the writes all join the first.
+        storage = GroupCommitShipStorage(
+            self.storage.storage, max_delay=10, max_batch=5,
+            commit_siblings=0,
+        )
+
+        outcomes = self.run_writers(storage, [
+            ('persist_ship', dict(self.ship_data, imo_number='7654320')),
+            ('persist_ship', dict(self.ship_data, imo_number='7654321')),
+            ('persist_ship', self.ship_data),
+            ('update_ship', {'id': ship['id'], 'notes': 'Grouped'}),
+            ('delete_ship', {'id': 1234567889999}),
+        ])
+
+        self.assertEqual(storage.stats(), {'batches': 1, 'writes': 5})
+        self.assertEqual(
+            sorted(outcome['imo_number'] for outcome in outcomes[:2]),
+            ['7654320', '7654321'],
+        )
+        self.assertIsInstance(outcomes[2], DuplicateError)
+        self.assertEqual(outcomes[3]['notes'], 'Grouped')
+        self.assertIsInstance(outcomes[4], NotFoundException)
+
+        __, count = self.storage.retrieve_ships(user_ids=[1])
+        self.assertEqual(count, 3)
+
+    def test_lone_writes_do_not_wait(self):
+        storage = GroupCommitShipStorage(self.storage.storage, max_delay=10)
+        storage.persist_ship(**self.ship_data)
+        self.assertEqual(storage.stats(), {'batches': 1, 'writes': 1})
+
+    def test_interrupted_leader_hands_every_write_an_outcome(self):
+        class Interrupted(BaseException):
+            pass
+
+        storage = GroupCommitShipStorage(
+            self.storage.storage, max_delay=10, max_batch=2,
+            commit_siblings=0,
+        )
+
+        with mock.patch.object(
+                storage.storage, 'persist_ship', side_effect=Interrupted,
+        ):
+            outcomes = self.run_writers(storage, [
+                ('persist_ship', dict(self.ship_data, imo_number='7654320')),
+                ('persist_ship', dict(self.ship_data, imo_number='7654321')),
+            ])
+
+        self.assertEqual(
+            sorted(type(outcome).__name__ for outcome in outcomes),
+            ['Interrupted', 'RuntimeError'],
+        )
+
+        # The batch was closed, later writes don't join it.
+        self.assertIsNone(storage._batch)
+        self.assertEqual(storage._pending, 0)
+
+    def test_writes_stop_waiting_on_a_stuck_batch(self):
+        storage = GroupCommitShipStorage(
+            self.storage.storage, max_delay=10, max_batch=2,
+            commit_siblings=0, timeout=0.05,
+        )
+        persist_ship = storage.storage.persist_ship
+
+        def slow_persist_ship(**kwargs):
+            time.sleep(0.2)
+            return persist_ship(**kwargs)
+
+        with mock.patch.object(
+                storage.storage, 'persist_ship',
+                side_effect=slow_persist_ship,
+        ):
+            outcomes = self.run_writers(storage, [
+                ('persist_ship', dict(self.ship_data, imo_number='7654320')),
+                ('persist_ship', dict(self.ship_data, imo_number='7654321')),
+            ])
+
+        self.assertEqual(
+            sorted(type(outcome).__name__ for outcome in outcomes),
+            ['TimeoutError', 'dict'],
+        )
+        # The batch still committed the write which gave up.
+        __, count = self.storage.retrieve_ships(user_ids=[1])
+        self.assertEqual(count, 2)